@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+
+"""An asyncio client for the Challonge calls this project makes.
+
+Seeding a tournament or creating an amateur bracket makes a chain of blocking
+Challonge calls, many of which don't depend on each other. The
+AsyncChallongeClient wraps a util_challonge.ChallongeClient so those calls can
+be awaited and made at the same time, e.g.
+
+  client = AsyncChallongeClient()
+  tourney_info, matches = await asyncio.gather(
+      client.tournaments.show("mtvmelee72"),
+      client.matches.index("mtvmelee72"),
+  )
+
+Calls run on a pool of threads, so they share the wrapped client's
+connection pool, response cache and rate limiting, and a semaphore bounds how
+many are in flight at once.
+"""
+
+
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+
+import requests.exceptions
+
+import defaults
+import util_challonge
+
+
+class _AsyncCalls(object):
+    """Groups calls the same way as a ChallongeClient, e.g.
+    client.participants.index, but returns coroutines."""
+
+    def __init__(self, client, group):
+        self._client = client
+        self._group = group
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            group = getattr(self._client.client, self._group)
+            return await self._client.run(getattr(group, name), *args, **kwargs)
+
+        return call
+
+
+class AsyncChallongeClient(object):
+    """Makes Challonge API calls from asyncio code.
+
+    Args:
+      client: The util_challonge.ChallongeClient (or a stand-in for one) to
+              make calls with. Defaults to the shared client.
+      max_concurrency: The most calls to have in flight at once.
+    """
+
+    def __init__(self, client=None,
+                 max_concurrency=defaults.DEFAULT_CHALLONGE_POOL_SIZE):
+        self.client = client or util_challonge.get_client()
+        self.max_concurrency = max_concurrency
+        self.tournaments = _AsyncCalls(self, "tournaments")
+        self.participants = _AsyncCalls(self, "participants")
+        self.matches = _AsyncCalls(self, "matches")
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_concurrency)
+
+        # Semaphores belong to the event loop they're made in, so this is
+        # made on the first call in each loop.
+        self._semaphore = None
+        self._loop = None
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs a blocking function on the client's threads.
+
+        Returns:
+          Whatever the function returns.
+        """
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        async with self._semaphore:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(fn, *args, **kwargs)
+            )
+
+    async def get_tourney_info(self, name):
+        """The same as util_challonge.get_tourney_info."""
+        try:
+            return await self.tournaments.show(name)
+        except requests.exceptions.HTTPError as err:
+            if err.response.status_code != 404:
+                raise err
+        return None
+
+    def close(self):
+        """Stops the client's threads once their calls finish."""
+        self._executor.shutdown()
+
+
+@contextlib.contextmanager
+def client_or_default(client=None):
+    """Gets a client to make calls with, closing it afterwards if it's new.
+
+    e.g.
+
+      with client_or_default(client) as client:
+          await client.matches.index("mtvmelee72")
+
+    Args:
+      client: An AsyncChallongeClient to use. If None, a new one wrapping the
+              shared client is made, and closed when the block is done.
+
+    Returns:
+      A context manager giving |client| or the new client.
+    """
+    if client is not None:
+        yield client
+        return
+    client = AsyncChallongeClient()
+    try:
+        yield client
+    finally:
+        client.close()
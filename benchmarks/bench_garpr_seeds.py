@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+
+"""Benchmarks matching participant names against gaR PR rankings.
+
+Compares the old approach of scanning every ranking for each participant
+against looking participants up in an alias index.
+
+Usage:
+
+  python benchmarks/bench_garpr_seeds.py --num_participants=512 \
+      --num_rankings=5000
+"""
+
+
+import argparse
+import json
+import os
+from os.path import dirname, abspath
+import sys
+import timeit
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import garpr_seeds
+
+
+TEST_DATA_DIR = os.path.join(dirname(CWD), "tests", "test_data")
+
+
+def load_rankings(region):
+    """Loads the rankings for a region from the test data."""
+    test_file = os.path.join(TEST_DATA_DIR, "{}_rankings.json".format(region))
+    with open(test_file) as data:
+        return json.load(data)["ranking"]
+
+
+def scale_rankings(rankings, num_rankings):
+    """Copies rankings with renamed players until there are num_rankings."""
+    scaled = []
+    for i in range(num_rankings):
+        ranking = dict(rankings[i % len(rankings)])
+        copy_num = i // len(rankings)
+        if copy_num:
+            # Keep multi-tag names intact so they still go through the
+            # "/" and "()" parsing paths.
+            ranking["name"] = "{}{} ".format(copy_num, ranking["name"]).strip()
+        ranking["rank"] = i + 1
+        scaled.append(ranking)
+    return scaled
+
+
+def participant_names(rankings, num_participants):
+    """Picks names to seed, including some that aren't on the rankings."""
+    names = []
+    for i in range(num_participants):
+        if i % 10 == 9:
+            names.append("NotOnGaRPR{}".format(i))
+        else:
+            # Pick from the bottom of the rankings, the worst case for a scan.
+            ranking = rankings[-(i % len(rankings)) - 1]
+            names.append(ranking["name"].split(" / ")[0].split(" (")[0])
+    return names
+
+
+def scan_ranks(names, rankings):
+    """Gets ranks by scanning all the rankings for each name."""
+    return [
+        garpr_seeds._get_rank(garpr_seeds._find_ranking_for_name(name, rankings))
+        for name in names
+    ]
+
+
+def indexed_ranks(names, rankings):
+    """Gets ranks by building an alias index and looking each name up."""
+    alias_index = garpr_seeds._build_alias_index(rankings)
+    return [garpr_seeds._get_rank(alias_index.get(name.lower())) for name in names]
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Benchmarks matching names against gaR PR rankings.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    argparser.add_argument(
+        "--num_participants", type=int, default=512, help="the number of names to rank"
+    )
+    argparser.add_argument(
+        "--num_rankings",
+        type=int,
+        default=5000,
+        help="the number of players on the scaled-up rankings",
+    )
+    argparser.add_argument(
+        "--repeat", type=int, default=3, help="the number of times to time each run"
+    )
+    args = argparser.parse_args()
+
+    rankings = scale_rankings(load_rankings("norcal"), args.num_rankings)
+    names = participant_names(rankings, args.num_participants)
+    assert scan_ranks(names, rankings) == indexed_ranks(names, rankings)
+
+    scan_time = min(
+        timeit.repeat(lambda: scan_ranks(names, rankings), number=1, repeat=args.repeat)
+    )
+    index_time = min(
+        timeit.repeat(
+            lambda: indexed_ranks(names, rankings), number=1, repeat=args.repeat
+        )
+    )
+
+    print("{} participants, {} rankings".format(len(names), len(rankings)))
+    print("scan:  {:.4f}s".format(scan_time))
+    print("index: {:.4f}s ({:.1f}x faster)".format(index_time, scan_time / index_time))
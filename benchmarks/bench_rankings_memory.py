@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+
+"""Benchmarks the memory used to load a very large gaR PR rankings payload.
+
+Compares loading the whole payload with json.loads against streaming it
+through rankings_stream, using the test data scaled up to a national-sized
+ranking.
+
+Usage:
+
+  python benchmarks/bench_rankings_memory.py --num_rankings=50000
+"""
+
+
+import argparse
+import json
+import os
+from os.path import dirname, abspath
+import sys
+import tracemalloc
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import rankings_stream
+
+
+TEST_DATA_DIR = os.path.join(dirname(CWD), "tests", "test_data")
+
+
+def scaled_payload(region, num_rankings):
+    """Builds a rankings payload for a region with num_rankings players."""
+    test_file = os.path.join(TEST_DATA_DIR, "{}_rankings.json".format(region))
+    with open(test_file) as data:
+        payload = json.load(data)
+
+    rankings = payload["ranking"]
+    scaled_rankings = []
+    for i in range(num_rankings):
+        ranking = dict(rankings[i % len(rankings)])
+        ranking["name"] = "{}{}".format(ranking["name"], i // len(rankings))
+        ranking["id"] = "{:024x}".format(i)
+        ranking["rank"] = i + 1
+        scaled_rankings.append(ranking)
+    payload["ranking"] = scaled_rankings
+    return json.dumps(payload).encode()
+
+
+def iter_chunks(content):
+    """Splits content into chunks the way a streamed response would."""
+    for i in range(0, len(content), rankings_stream.CHUNK_SIZE):
+        yield content[i:i + rankings_stream.CHUNK_SIZE]
+
+
+def load_all(content):
+    """Loads every ranking in full, the way we used to."""
+    return json.loads(content.decode())["ranking"]
+
+
+def load_streamed(content):
+    """Loads compact rankings by streaming the payload."""
+    return list(rankings_stream.iter_compact_rankings(iter_chunks(content)))
+
+
+def measure_peak_memory(load, content):
+    """Measures the peak memory used by load(content), in bytes.
+
+    The memory for the payload itself isn't counted, since it's allocated
+    before we start tracing.
+    """
+    tracemalloc.start()
+    rankings = load(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, len(rankings)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Benchmarks memory used to load large gaR PR rankings.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    argparser.add_argument(
+        "--num_rankings",
+        type=int,
+        default=50000,
+        help="the number of players on the scaled-up rankings",
+    )
+    args = argparser.parse_args()
+
+    content = scaled_payload("norcal", args.num_rankings)
+    print(
+        "{} rankings, {:.1f} MiB payload".format(
+            args.num_rankings, len(content) / 2 ** 20
+        )
+    )
+    for name, load in [("json.loads", load_all), ("streamed", load_streamed)]:
+        peak, num_rankings = measure_peak_memory(load, content)
+        assert num_rankings == args.num_rankings
+        print("{}: {:.1f} MiB peak".format(name, peak / 2 ** 20))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+
+"""Benchmarks computing seed buckets for every tourney size up to a maximum.
+
+Compares recomputing the buckets by eliminating one loser's round at a time
+against the memoized bucket table in shuffle_seeds, both for the buckets
+themselves and for counting amateurs. Also compares generating a batch of
+shuffled seedings one at a time against get_shuffled_seeds_batch.
+
+Usage:
+
+  python benchmarks/bench_shuffle_seeds.py --max_participants=100000
+"""
+
+
+import argparse
+from os.path import dirname, abspath
+import sys
+import time
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import create_amateur_bracket
+import shuffle_seeds
+
+
+def uncached_bucket_sizes(num_participants):
+    """Computes bucket sizes the way shuffle_seeds used to."""
+    sizes = []
+    while num_participants > 0:
+        bucket_size = shuffle_seeds.get_num_participants_placing_last(num_participants)
+        sizes.append(bucket_size)
+        num_participants -= bucket_size
+    return sizes
+
+
+def uncached_num_amateurs(num_participants, cutoff):
+    """Counts amateurs the way create_amateur_bracket used to."""
+    num_amateurs = 0
+    for _ in range(cutoff):
+        num_eliminated = shuffle_seeds.get_num_participants_placing_last(
+            num_participants
+        )
+        num_amateurs += num_eliminated
+        num_participants -= num_eliminated
+    return num_amateurs
+
+
+def time_per_size(fn, max_participants):
+    """Times calling fn for every tourney size up to max_participants."""
+    start = time.perf_counter()
+    for num_participants in range(1, max_participants + 1):
+        fn(num_participants)
+    return time.perf_counter() - start
+
+
+def report(name, max_participants, old_time, new_time):
+    print(
+        "{}: {:.3f}s -> {:.3f}s ({:.0f} sizes/s, {:.1f}x faster)".format(
+            name,
+            old_time,
+            new_time,
+            max_participants / new_time,
+            old_time / new_time,
+        )
+    )
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Benchmarks computing seed buckets for many tourney sizes.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    argparser.add_argument(
+        "--max_participants",
+        type=int,
+        default=100000,
+        help="compute buckets for every tourney size from 1 to this",
+    )
+    argparser.add_argument(
+        "--cutoff", type=int, default=2, help="the loser's round cutoff for amateurs"
+    )
+    argparser.add_argument(
+        "--batch_participants",
+        type=int,
+        default=256,
+        help="the tourney size to generate a batch of seedings for",
+    )
+    argparser.add_argument(
+        "--num_seedings",
+        type=int,
+        default=10000,
+        help="the number of seedings to generate in a batch",
+    )
+    args = argparser.parse_args()
+    max_participants = args.max_participants
+
+    # Make sure the table agrees with the old approach before timing it. The
+    # old amateur count went wrong when the cutoff was past the last bucket,
+    # so those sizes are skipped.
+    for num_participants in range(1, min(max_participants, 2000) + 1):
+        bucket_sizes = uncached_bucket_sizes(num_participants)
+        assert list(shuffle_seeds._get_bucket_sizes(num_participants)) == (
+            bucket_sizes
+        )
+        if args.cutoff <= len(bucket_sizes):
+            assert create_amateur_bracket._get_num_amateurs(
+                num_participants, args.cutoff
+            ) == uncached_num_amateurs(num_participants, args.cutoff)
+    shuffle_seeds.get_bucket_boundaries.cache_clear()
+
+    old_time = time_per_size(uncached_bucket_sizes, max_participants)
+    new_time = time_per_size(shuffle_seeds.get_bucket_boundaries, max_participants)
+    report("bucket table", max_participants, old_time, new_time)
+
+    # The table is warm now, which is the common case when seeding.
+    old_time = time_per_size(
+        lambda n: uncached_num_amateurs(n, args.cutoff), max_participants
+    )
+    new_time = time_per_size(
+        lambda n: create_amateur_bracket._get_num_amateurs(n, args.cutoff),
+        max_participants,
+    )
+    report("amateur count", max_participants, old_time, new_time)
+
+    start = time.perf_counter()
+    for num_participants in range(1, max_participants + 1):
+        shuffle_seeds.get_bucket_index(num_participants, num_participants)
+    lookup_time = time.perf_counter() - start
+    print(
+        "bucket lookups: {:.0f} lookups/s".format(max_participants / lookup_time)
+    )
+
+    start = time.perf_counter()
+    for _ in range(args.num_seedings):
+        shuffle_seeds.get_shuffled_seeds(args.batch_participants)
+    old_time = time.perf_counter() - start
+    start = time.perf_counter()
+    shuffle_seeds.get_shuffled_seeds_batch(args.batch_participants, args.num_seedings)
+    new_time = time.perf_counter() - start
+    print(
+        "{} seedings of {} ({}): {:.3f}s -> {:.3f}s ({:.1f}x faster)".format(
+            args.num_seedings,
+            args.batch_participants,
+            "numpy" if shuffle_seeds.np else "pure python",
+            old_time,
+            new_time,
+            old_time / new_time,
+        )
+    )
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+
+"""An in-memory stand-in for the Challonge API.
+
+Lets the benchmarks run whole flows like seeding a tournament or creating an
+amateur bracket without touching challonge.com. The fake keeps its own
+tournaments, participants and matches, and counts every API call made, so
+benchmarks can report how many round trips a flow would have taken.
+
+Usage:
+
+  fake = FakeChallonge()
+  fake.add_tournament("mtvmelee72", ["Neal", "Bryan", "Paragon"])
+  with fake.installed():
+      garpr_seeds_challonge.seed_tournament(...)
+
+Or pass it anywhere a util_challonge.ChallongeClient is expected.
+"""
+
+
+import collections
+import contextlib
+from os.path import dirname, abspath
+import sys
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import requests.exceptions
+
+import bracket
+import util_challonge
+
+
+class _FakeHttpResponse(object):
+    """Just enough of a requests.Response for error handling."""
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class _FakeCalls(object):
+    """Groups the fake's API calls the same way as a ChallongeClient, e.g.
+    fake.participants.index is fake.participants_index."""
+
+    def __init__(self, fake, group):
+        self._fake = fake
+        self._group = group
+
+    def __getattr__(self, name):
+        return getattr(self._fake, "{0}_{1}".format(self._group, name))
+
+
+class FakeChallonge(object):
+    """Fake Challonge tournaments, participants and matches.
+
+    Tournaments are keyed by the same names that the tools use, e.g.
+    "mtvmelee72" or "subdomain-mtvmelee72". The fake can stand in for a
+    util_challonge.ChallongeClient.
+    """
+
+    def __init__(self):
+        self.tournaments = _FakeCalls(self, "tournaments")
+        self.participants = _FakeCalls(self, "participants")
+        self.matches = _FakeCalls(self, "matches")
+        self.calls = collections.Counter()
+        # Whether participants.bulk_add works, to test falling back to adding
+        # participants one at a time.
+        self.supports_bulk_add = True
+        self._next_id = 1
+        self._tournaments = {}
+        self._matches = {}
+
+        # Participants are kept by ID, along with the order of each
+        # tournament's participant IDs from 1st seed to last. Seeds are filled
+        # in when participants are read, so reseeding a big tournament one
+        # participant at a time doesn't renumber everybody every time.
+        self._participants = {}
+        self._seed_orders = {}
+
+    @property
+    def num_calls(self):
+        return sum(self.calls.values())
+
+    def _get_id(self):
+        next_id = self._next_id
+        self._next_id += 1
+        return next_id
+
+    def _get_tournament(self, tournament):
+        if tournament not in self._tournaments:
+            raise requests.exceptions.HTTPError(
+                "404 Client Error: Not Found", response=_FakeHttpResponse(404)
+            )
+        return self._tournaments[tournament]
+
+    def _get_participant(self, tournament, participant_id):
+        try:
+            seed = self._seed_orders[tournament].index(participant_id) + 1
+        except ValueError:
+            raise requests.exceptions.HTTPError(
+                "404 Client Error: Not Found", response=_FakeHttpResponse(404)
+            )
+        participant = self._participants[participant_id]
+        participant["seed"] = seed
+        return participant
+
+    def get_participants(self, tournament):
+        """Gets a tournament's participants, sorted by seed."""
+        participants = []
+        for seed, participant_id in enumerate(self._seed_orders[tournament], 1):
+            participant = self._participants[participant_id]
+            participant["seed"] = seed
+            participants.append(participant)
+        return participants
+
+    def add_tournament(self, name, participant_names, completed_losers_rounds=0):
+        """Adds a tournament with participants seeded in the given order.
+
+        Args:
+          name: The name of the tournament.
+          participant_names: The names of the participants, from 1st seed to
+                             last.
+          completed_losers_rounds: If this is more than 0, the tournament is
+                                   underway, with every match up to this
+                                   loser's round played and won by the better
+                                   seed.
+        """
+        tourney, subdomain = util_challonge.tourney_name_to_parts(name)
+        self._tournaments[name] = {
+            "id": self._get_id(),
+            "name": name.title(),
+            "url": tourney,
+            "subdomain": subdomain,
+            "tournament_type": "double elimination",
+            "state": "underway" if completed_losers_rounds else "pending",
+            "participants_count": 0,
+        }
+        self._seed_orders[name] = []
+        self._matches[name] = []
+        for participant_name in participant_names:
+            self._create_participant(name, participant_name)
+
+        if completed_losers_rounds and participant_names:
+            self._add_matches(name, completed_losers_rounds)
+
+    def _add_matches(self, tournament, completed_losers_rounds):
+        """Adds the matches of a bracket where the better seed always wins.
+
+        Loser's rounds made up entirely of byes are skipped when numbering
+        rounds, the same as on Challonge.
+        """
+        ids = [None] + self._seed_orders[tournament]
+        model = bracket.DoubleEliminationBracket(len(ids) - 1)
+
+        played = [
+            x for x in range(model.num_matches)
+            if all(model.projected_players[2 * x:2 * x + 2])
+        ]
+        losers_rounds = sorted(
+            {model.match_rounds[x] for x in played if model.match_rounds[x] < 0},
+            reverse=True,
+        )
+        round_numbers = {x: -i for i, x in enumerate(losers_rounds, 1)}
+
+        for match in played:
+            player1, player2 = sorted(model.projected_players[2 * match:2 * match + 2])
+            round_num = round_numbers.get(model.match_rounds[match],
+                                          model.match_rounds[match])
+            complete = -completed_losers_rounds <= round_num < 0
+            self._matches[tournament].append({
+                "id": self._get_id(),
+                "round": round_num,
+                "state": "complete" if complete else "pending",
+                "player1_id": ids[player1],
+                "player2_id": ids[player2],
+                "winner_id": ids[player1] if complete else None,
+                "loser_id": ids[player2] if complete else None,
+            })
+
+    def _create_participant(self, tournament, name, **params):
+        participant = {
+            "id": self._get_id(),
+            "name": name,
+            "display_name": name,
+            "challonge_username": (params.get("challonge_username") or
+                                   params.get("invite_name_or_email")),
+            "seed": None,
+        }
+        self._participants[participant["id"]] = participant
+
+        seed_order = self._seed_orders[tournament]
+        seed = params.get("seed") or len(seed_order) + 1
+        seed_order.insert(min(seed, len(seed_order) + 1) - 1, participant["id"])
+        self._tournaments[tournament]["participants_count"] = len(seed_order)
+        return dict(self._get_participant(tournament, participant["id"]))
+
+    # The fake API calls, named after their challonge module functions.
+
+    def tournaments_show(self, tournament, **params):
+        self.calls["tournaments.show"] += 1
+        return dict(self._get_tournament(tournament))
+
+    def tournaments_create(self, name, url, tournament_type="single elimination",
+                           **params):
+        self.calls["tournaments.create"] += 1
+        subdomain = params.get("subdomain")
+        key = "{0}-{1}".format(subdomain, url) if subdomain else url
+        self.add_tournament(key, [])
+        self._tournaments[key].update(name=name, tournament_type=tournament_type)
+        return dict(self._tournaments[key])
+
+    def participants_index(self, tournament, **params):
+        self.calls["participants.index"] += 1
+        self._get_tournament(tournament)
+        return [dict(x) for x in self.get_participants(tournament)]
+
+    def participants_show(self, tournament, participant_id, **params):
+        self.calls["participants.show"] += 1
+        self._get_tournament(tournament)
+        return dict(self._get_participant(tournament, participant_id))
+
+    def participants_create(self, tournament, name, **params):
+        self.calls["participants.create"] += 1
+        self._get_tournament(tournament)
+        return self._create_participant(tournament, name, **params)
+
+    def participants_bulk_add(self, tournament, participants):
+        self.calls["participants.bulk_add"] += 1
+        self._get_tournament(tournament)
+        if not self.supports_bulk_add:
+            raise requests.exceptions.HTTPError(
+                "404 Client Error: Not Found", response=_FakeHttpResponse(404)
+            )
+        return [self._create_participant(tournament, **x) for x in participants]
+
+    def participants_update(self, tournament, participant_id, **params):
+        """Updates a participant. Like on Challonge, changing someone's seed
+        moves them to that seed and shifts everybody in between over by one."""
+        self.calls["participants.update"] += 1
+        self._get_tournament(tournament)
+        participant = self._get_participant(tournament, participant_id)
+
+        if "seed" in params:
+            seed_order = self._seed_orders[tournament]
+            seed_order.remove(participant_id)
+            seed_order.insert(min(params["seed"], len(seed_order) + 1) - 1,
+                              participant_id)
+        participant.update((k, v) for k, v in params.items() if k != "seed")
+        return dict(self._get_participant(tournament, participant_id))
+
+    def matches_index(self, tournament, **params):
+        self.calls["matches.index"] += 1
+        self._get_tournament(tournament)
+        return [dict(x) for x in self._matches[tournament]]
+
+    @contextlib.contextmanager
+    def installed(self):
+        """Makes this fake the shared Challonge client while in the with
+        block."""
+        previous_client = util_challonge.set_client(self)
+        try:
+            yield self
+        finally:
+            util_challonge.set_client(previous_client)
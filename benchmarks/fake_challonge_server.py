@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+
+"""Serves the fake Challonge API in fake_challonge.py over HTTP.
+
+The in-memory fake only stands in for the shared client, so it can't show what
+our API calls cost over a real connection. This serves the part of the
+Challonge v1 API that we use on localhost instead, with optional latency on
+every request and a rate limit that answers 429s like Challonge does, so whole
+flows can be load tested through a real util_challonge.ChallongeClient.
+
+Point the tools at it by setting the CHALLONGE_API_URL environment variable,
+or by passing api_url to a ChallongeClient.
+
+Examples:
+
+  1. python benchmarks/fake_challonge_server.py --port=8000 \
+         --tournament=mtvmelee72:64 --latency=0.1 --requests_per_second=5
+
+Serves a tournament called mtvmelee72 with 64 participants, taking 100ms to
+answer each request and rate limiting anything over 5 requests a second.
+Then in another terminal:
+
+  CHALLONGE_API_URL=http://127.0.0.1:8000/v1 \
+      python garpr_seeds_challonge.py challonge.com/mtvmelee72 --shuffle
+
+  2. In Python:
+
+  with FakeChallongeServer(latency=0.05) as server:
+      server.fake.add_tournament("mtvmelee72", ["Neal", "Bryan"])
+      client = util_challonge.ChallongeClient(api_url=server.api_url)
+      ...
+"""
+
+
+import argparse
+import http.server
+import json
+import re
+import socketserver
+import sys
+import threading
+import time
+from os.path import dirname, abspath
+from urllib.parse import parse_qsl, urlsplit
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import requests.exceptions
+
+import fake_challonge
+
+
+# The API paths we serve, relative to /v1, with the fake call that handles
+# each one.
+_ROUTES = [
+    ("GET", r"tournaments/(?P<tournament>[^/]+)", "tournaments_show"),
+    ("POST", r"tournaments", "tournaments_create"),
+    ("GET", r"tournaments/(?P<tournament>[^/]+)/participants",
+     "participants_index"),
+    ("POST", r"tournaments/(?P<tournament>[^/]+)/participants/bulk_add",
+     "participants_bulk_add"),
+    ("GET", r"tournaments/(?P<tournament>[^/]+)/participants/(?P<participant_id>\d+)",
+     "participants_show"),
+    ("POST", r"tournaments/(?P<tournament>[^/]+)/participants",
+     "participants_create"),
+    ("PUT", r"tournaments/(?P<tournament>[^/]+)/participants/(?P<participant_id>\d+)",
+     "participants_update"),
+    ("GET", r"tournaments/(?P<tournament>[^/]+)/matches", "matches_index"),
+]
+_ROUTES = [
+    (method, re.compile(r"^/v1/{0}\.json$".format(pattern)), call)
+    for method, pattern, call in _ROUTES
+]
+
+# The type each kind of response is wrapped in, like Challonge does.
+_RESPONSE_TYPES = {
+    "tournaments": "tournament",
+    "participants": "participant",
+    "matches": "match",
+}
+
+# Parameters that Challonge sends and takes as strings even if they look like
+# numbers.
+_STRING_PARAMS = frozenset(("name", "url", "subdomain", "misc",
+                            "challonge_username", "invite_name_or_email"))
+
+
+def _parse_value(key, value):
+    """Converts a form value back into what the client passed in."""
+    if key in _STRING_PARAMS:
+        return value
+    if value in ("true", "false"):
+        return value == "true"
+    if re.match(r"^-?\d+$", value):
+        return int(value)
+    return value
+
+
+def _parse_params(pairs):
+    """Converts form parameters into the arguments for a fake call.
+
+    e.g. [("participant[seed]", "3"), ("participant[name]", "Neal")] =>
+         {"seed": 3, "name": "Neal"}
+
+    Parameters for a list of objects, like "participants[][name]" for bulk
+    adds, are returned as {"participants": [{...}, {...}]}, starting a new
+    object whenever a key repeats.
+
+    Args:
+      pairs: A list of (key, value) tuples from the query string or body.
+
+    Returns:
+      A dictionary of arguments.
+    """
+    params = {}
+    for key, value in pairs:
+        match = re.match(r"^(\w+)\[\]\[(\w+)\]$", key)
+        if match:
+            objects = params.setdefault(match.group(1), [])
+            if not objects or match.group(2) in objects[-1]:
+                objects.append({})
+            objects[-1][match.group(2)] = _parse_value(match.group(2), value)
+            continue
+
+        match = re.match(r"^\w+\[(\w+)\]$", key)
+        if match:
+            key = match.group(1)
+        params[key] = _parse_value(key, value)
+    return params
+
+
+class _RateLimiter(object):
+    """A token bucket that says how long to wait once it runs dry."""
+
+    def __init__(self, requests_per_second, burst):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Counts a request against the limit.
+
+        Returns:
+          0 if the request is allowed, or else the number of seconds until
+          it would be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated_at) * self.requests_per_second,
+            )
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.requests_per_second
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Answers API requests from the server's fake."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if self.server.rate_limiter:
+            wait = self.server.rate_limiter.take()
+            if wait:
+                with self.server.lock:
+                    self.server.num_rate_limited += 1
+                self._send_json(429, {"errors": ["Rate limit exceeded"]},
+                                {"Retry-After": "{0:.3f}".format(wait)})
+                return
+
+        for method, pattern, call in _ROUTES:
+            match = pattern.match(url.path)
+            if method == self.command and match:
+                break
+        else:
+            self._send_json(404, {"errors": ["Not Found"]})
+            return
+
+        args = match.groupdict()
+        if "participant_id" in args:
+            args["participant_id"] = int(args["participant_id"])
+        args.update(_parse_params(parse_qsl(url.query) + parse_qsl(body)))
+
+        try:
+            with self.server.lock:
+                result = getattr(self.server.fake, call)(**args)
+        except requests.exceptions.HTTPError as err:
+            self._send_json(err.response.status_code, {"errors": [str(err)]})
+            return
+        except TypeError as err:
+            # Missing or unexpected parameters.
+            self._send_json(422, {"errors": [str(err)]})
+            return
+
+        response_type = _RESPONSE_TYPES[call.split("_")[0]]
+        if isinstance(result, list):
+            payload = [{response_type: x} for x in result]
+        else:
+            payload = {response_type: result}
+        self._send_json(200, payload)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class FakeChallongeServer(object):
+    """Serves a FakeChallonge on localhost in a background thread.
+
+    Args:
+      fake: The fake_challonge.FakeChallonge to serve. Defaults to an empty
+            one.
+      latency: The seconds to wait before answering each request.
+      requests_per_second: If given, requests over this rate get a 429 with a
+                           Retry-After header, like Challonge's rate limit.
+      burst: The most requests that can be made back to back under the rate
+             limit.
+      host: The address to listen on.
+      port: The port to listen on. Defaults to any free port.
+      verbose: Whether to log every request to stderr.
+    """
+
+    def __init__(self, fake=None, latency=0, requests_per_second=None, burst=1,
+                 host="127.0.0.1", port=0, verbose=False):
+        self.fake = fake or fake_challonge.FakeChallonge()
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.fake = self.fake
+        self._server.lock = threading.Lock()
+        self._server.latency = latency
+        self._server.rate_limiter = None
+        if requests_per_second:
+            self._server.rate_limiter = _RateLimiter(requests_per_second, burst)
+        self._server.num_rate_limited = 0
+        self._server.verbose = verbose
+        self._thread = None
+
+    @property
+    def api_url(self):
+        """The URL to pass as a ChallongeClient's api_url."""
+        host, port = self._server.server_address[:2]
+        return "http://{0}:{1}/v1".format(host, port)
+
+    @property
+    def num_rate_limited(self):
+        """How many requests were answered with a 429."""
+        return self._server.num_rate_limited
+
+    def serve_forever(self):
+        """Serves requests in this thread until stop is called."""
+        self._server.serve_forever()
+
+    def start(self):
+        """Serves requests in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving requests and closes the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Serves a fake Challonge API on localhost.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    argparser.add_argument("--host", default="127.0.0.1",
+                           help="the address to listen on")
+    argparser.add_argument("--port", type=int, default=8000,
+                           help="the port to listen on")
+    argparser.add_argument(
+        "--tournament",
+        action="append",
+        default=[],
+        help="a tournament to serve, as name:number_of_participants, e.g. "
+        "mtvmelee72:64. Add :underway to play the first two loser's rounds. "
+        "Can be given more than once",
+    )
+    argparser.add_argument(
+        "--latency", type=float, default=0,
+        help="the seconds to wait before answering each request"
+    )
+    argparser.add_argument(
+        "--requests_per_second",
+        type=float,
+        default=None,
+        help="answer requests over this rate with 429s. Defaults to no limit",
+    )
+    argparser.add_argument(
+        "--burst", type=int, default=10,
+        help="the most requests that can be made back to back under the "
+        "rate limit"
+    )
+    args = argparser.parse_args()
+
+    fake = fake_challonge.FakeChallonge()
+    for tournament in args.tournament:
+        parts = tournament.split(":")
+        names = ["Player{0}".format(x) for x in range(1, int(parts[1]) + 1)]
+        completed_losers_rounds = 2 if parts[2:] == ["underway"] else 0
+        fake.add_tournament(parts[0], names, completed_losers_rounds)
+
+    server = FakeChallongeServer(fake, args.latency, args.requests_per_second,
+                                 args.burst, args.host, args.port, verbose=True)
+    print("Serving the fake Challonge API at {0}".format(server.api_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
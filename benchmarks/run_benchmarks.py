@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+
+
+"""Benchmarks the seeding and amateur bracket hot paths over many field sizes.
+
+Covers matching names against gaR PR rankings, turning ranks into seeds,
+shuffling seeds, counting amateurs, and the full seed_tournament and
+create_amateur_bracket flows. The flows run against the in-memory Challonge
+API in fake_challonge.py, so nothing touches challonge.com or gaR PR, and
+they also report how many Challonge API calls they made.
+
+Results can be saved as JSON and compared against an earlier run to catch
+regressions between releases.
+
+Examples:
+
+  1. python benchmarks/run_benchmarks.py --output=results.json
+
+Runs every benchmark for fields of 8 to 10,000 people and saves the results.
+
+  2. python benchmarks/run_benchmarks.py --compare=results.json
+
+Runs the benchmarks again and flags anything that got more than 25% slower
+than in results.json, exiting with an error if anything did.
+
+  3. python benchmarks/run_benchmarks.py --sizes=8,64 --only=seed_tournament
+
+Only runs the seed_tournament benchmark for small fields.
+"""
+
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from os.path import dirname, abspath
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import bench_garpr_seeds
+import create_amateur_bracket
+import fake_challonge
+import garpr_seeds
+import garpr_seeds_challonge
+import ranking_sources
+import shuffle_seeds
+import util_challonge
+
+
+DEFAULT_SIZES = (8, 64, 512, 4096, 10000)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 1.25
+
+# Scanning every ranking for every name is quadratic, so it's only timed for
+# fields up to this size by default.
+DEFAULT_MAX_SCAN_SIZE = 1024
+
+_TOURNEY_NAME = "benchmark"
+
+
+class StaticRankingSource(ranking_sources.RankingSource):
+    """Rankings that are already in memory."""
+
+    def __init__(self, rankings):
+        self._rankings = rankings
+
+    def get_rankings(self):
+        return self._rankings
+
+
+def _get_rankings(size):
+    """Gets scaled-up rankings with room for a field of size people."""
+    return bench_garpr_seeds.scale_rankings(
+        bench_garpr_seeds.load_rankings("norcal"), max(2 * size, 1000)
+    )
+
+
+def _get_names(size):
+    return bench_garpr_seeds.participant_names(_get_rankings(size), size)
+
+
+# Each benchmark takes a field size and does its setup, then returns a
+# function to time. The flows' functions return a dictionary of extra numbers
+# to report, like how many API calls were made.
+
+def bench_find_ranking_for_name(size):
+    rankings = _get_rankings(size)
+    names = bench_garpr_seeds.participant_names(rankings, size)
+    return lambda: bench_garpr_seeds.scan_ranks(names, rankings)
+
+
+def bench_get_garpr_ranks(size):
+    rankings = _get_rankings(size)
+    names = bench_garpr_seeds.participant_names(rankings, size)
+    source = StaticRankingSource(rankings)
+    return lambda: garpr_seeds.get_garpr_ranks(names, None, source=source)
+
+
+def bench_ranks_to_seeds(size):
+    rng = random.Random(size)
+    ranks = rng.sample(range(1, 2 * size + 1), size)
+    for i in range(0, size, 10):
+        ranks[i] = garpr_seeds.UNKNOWN_RANK
+    return lambda: garpr_seeds.ranks_to_seeds(ranks)
+
+
+def bench_get_shuffled_seeds(size):
+    rng = random.Random(size)
+    return lambda: shuffle_seeds.get_shuffled_seeds(size, rng)
+
+
+def bench_get_num_amateurs(size):
+    def run():
+        # Time it from a cold bucket table, like the first call in a run.
+        shuffle_seeds.get_bucket_boundaries.cache_clear()
+        create_amateur_bracket._get_num_amateurs(size, 2)
+    return run
+
+
+def bench_seed_tournament(size):
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament(_TOURNEY_NAME, _get_names(size))
+    source = StaticRankingSource(_get_rankings(size))
+    tourney_url = util_challonge.tourney_name_to_url(_TOURNEY_NAME)
+
+    def run():
+        with fake.installed():
+            sorted_participants, _ = garpr_seeds_challonge.seed_tournament(
+                tourney_url, None, True, source=source, rng=random.Random(size)
+            )
+            garpr_seeds_challonge.update_seeds(tourney_url, sorted_participants)
+        return {"api_calls": fake.num_calls}
+    return run
+
+
+def bench_create_amateur_bracket(size):
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament(_TOURNEY_NAME, _get_names(size), completed_losers_rounds=2)
+    tourney_url = util_challonge.tourney_name_to_url(_TOURNEY_NAME)
+
+    def run():
+        with fake.installed():
+            create_amateur_bracket.create_amateur_bracket(
+                tourney_url,
+                single_elimination=False,
+                losers_round_cutoff=2,
+                randomize_seeds=False,
+                interactive=False,
+            )
+        return {"api_calls": fake.num_calls}
+    return run
+
+
+# (name, benchmark, whether the timed function can be run more than once
+# after a single setup).
+BENCHMARKS = [
+    ("find_ranking_for_name", bench_find_ranking_for_name, True),
+    ("get_garpr_ranks", bench_get_garpr_ranks, True),
+    ("ranks_to_seeds", bench_ranks_to_seeds, True),
+    ("get_shuffled_seeds", bench_get_shuffled_seeds, True),
+    ("get_num_amateurs", bench_get_num_amateurs, True),
+    ("seed_tournament", bench_seed_tournament, False),
+    ("create_amateur_bracket", bench_create_amateur_bracket, False),
+]
+
+
+def run_benchmark(setup, repeatable, size, repeat):
+    """Times a benchmark.
+
+    Benchmarks that can be rerun are run in a loop enough times to take a
+    measurable amount of time, like timeit does. The others are set up fresh
+    and run once for every repetition.
+
+    Args:
+      setup: The benchmark function.
+      repeatable: Whether the timed function can be run more than once.
+      size: The field size to run it with.
+      repeat: The number of times to time it.
+
+    Returns:
+      A dictionary with the fastest and median times in seconds for a single
+      run, and any extra numbers that the benchmark reported.
+    """
+    if repeatable:
+        timer = timeit.Timer(setup(size))
+        loops, _ = timer.autorange()
+        times = [x / loops for x in timer.repeat(repeat=repeat, number=loops)]
+        extra = {}
+    else:
+        times = []
+        for _ in range(repeat):
+            run = setup(size)
+            start = time.perf_counter()
+            extra = run()
+            times.append(time.perf_counter() - start)
+    return dict(extra, min_seconds=min(times), median_seconds=statistics.median(times))
+
+
+def get_metadata():
+    """Gets info about where and when the benchmarks were run."""
+    try:
+        revision = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=dirname(CWD),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return {
+        "revision": revision,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": shuffle_seeds.np is not None,
+    }
+
+
+def compare_results(results, baseline):
+    """Compares results to an earlier run.
+
+    Args:
+      results: A list of results from this run.
+      baseline: A list of results from an earlier run.
+
+    Returns:
+      A list of (result, ratio) tuples for each result that's in both runs,
+      where ratio is this run's fastest time divided by the baseline's.
+    """
+    baseline_times = {
+        (x["benchmark"], x["size"]): x["min_seconds"] for x in baseline
+    }
+    comparisons = []
+    for result in results:
+        key = (result["benchmark"], result["size"])
+        if baseline_times.get(key):
+            comparisons.append((result, result["min_seconds"] / baseline_times[key]))
+    return comparisons
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Benchmarks seeding and amateur bracket creation.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    argparser.add_argument(
+        "--sizes",
+        default=",".join(str(x) for x in DEFAULT_SIZES),
+        help="comma-separated field sizes to run each benchmark with",
+    )
+    argparser.add_argument(
+        "--only",
+        default=None,
+        help="comma-separated names of the benchmarks to run. Defaults to all "
+        "of them: {0}".format(", ".join(x[0] for x in BENCHMARKS)),
+    )
+    argparser.add_argument(
+        "--repeat", type=int, default=DEFAULT_REPEAT,
+        help="the number of times to time each benchmark"
+    )
+    argparser.add_argument(
+        "--max_scan_size",
+        type=int,
+        default=DEFAULT_MAX_SCAN_SIZE,
+        help="the biggest field to time find_ranking_for_name with",
+    )
+    argparser.add_argument(
+        "--output", default=None, help="a JSON file to save the results to"
+    )
+    argparser.add_argument(
+        "--compare", default=None,
+        help="a JSON file of earlier results to compare against"
+    )
+    argparser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="how many times slower than --compare a benchmark can get before "
+        "it's flagged",
+    )
+    args = argparser.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",")]
+    names = args.only.split(",") if args.only else [x[0] for x in BENCHMARKS]
+
+    results = []
+    for name, setup, repeatable in BENCHMARKS:
+        if name not in names:
+            continue
+        for size in sizes:
+            if name == "find_ranking_for_name" and size > args.max_scan_size:
+                continue
+            result = dict(
+                run_benchmark(setup, repeatable, size, args.repeat),
+                benchmark=name,
+                size=size,
+            )
+            results.append(result)
+            print(
+                "{0:<24} {1:>6}: {2:.6f}s{3}".format(
+                    name,
+                    size,
+                    result["min_seconds"],
+                    " ({0} API calls)".format(result["api_calls"])
+                    if "api_calls" in result else "",
+                )
+            )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"metadata": get_metadata(), "results": results},
+                      output_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressed = False
+        print()
+        for result, ratio in compare_results(results, baseline):
+            flag = ""
+            if ratio > args.threshold:
+                flag = " REGRESSION"
+                regressed = True
+            print("{0:<24} {1:>6}: {2:.2f}x{3}".format(
+                result["benchmark"], result["size"], ratio, flag
+            ))
+        if regressed:
+            sys.exit(1)
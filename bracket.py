@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+
+
+"""A compact model of a double-elimination bracket.
+
+The rest of the tools reason about brackets with arithmetic, e.g. how many
+people play in the first round. This module builds out every match of a
+double-elimination bracket instead, so we can check that arithmetic and ask
+more detailed questions, like who a seed is projected to play in a given
+round.
+
+The bracket is stored as flat lists with one entry per match. Each match
+knows where its two players come from (a seed, or the winner or loser of an
+earlier match) and where its winner and loser go. Missing seeds in brackets
+that aren't a power of two in size are byes.
+
+Rounds are numbered the same way Challonge does: winner's rounds are 1, 2, 3,
+etc., the grand finals come after the last winner's round, and loser's
+rounds are -1, -2, -3, etc. Rounds are numbered as if the bracket were full,
+so a round where everyone has a bye still counts.
+
+Usage:
+
+  python bracket.py 9
+"""
+
+
+import argparse
+
+
+# Where a player in a match comes from.
+_FROM_SEED = 0
+_FROM_WINNER = 1
+_FROM_LOSER = 2
+
+# Stands in for a missing player, e.g. a bye.
+_NO_PLAYER = 0
+
+# Used in routing lists when a player doesn't go anywhere.
+_NO_MATCH = -1
+
+
+def _get_seed_order(bracket_size):
+    """Gets the order that seeds are placed into the first round.
+
+    e.g. 8 => [1, 8, 4, 5, 2, 7, 3, 6], for matches 1 vs. 8, 4 vs. 5, etc.
+
+    Args:
+      bracket_size: The size of the bracket. Must be a power of two.
+
+    Returns:
+      A list of seeds, where each consecutive pair of seeds plays each other
+      in the first round. The top seeds can only meet as late as possible.
+    """
+    seed_order = [1]
+    while len(seed_order) < bracket_size:
+        num_seeds = len(seed_order) * 2
+        seed_order = [x for seed in seed_order for x in (seed, num_seeds + 1 - seed)]
+    return seed_order
+
+
+class DoubleEliminationBracket(object):
+    """A double-elimination bracket for num_participants seeds.
+
+    Building the bracket and projecting its results (assuming the better seed
+    always wins) takes O(N) time and space. After that, looking up a seed's
+    projected opponent in a round or their projected placement is O(1).
+
+    Args:
+      num_participants: The number of participants in the bracket.
+
+    Raises:
+      ValueError: if num_participants <= 0.
+    """
+
+    def __init__(self, num_participants):
+        if num_participants <= 0:
+            raise ValueError("Invalid number of participants for a tourney.")
+
+        self.num_participants = num_participants
+        self.bracket_size = 1 << (num_participants - 1).bit_length()
+
+        # One entry per match.
+        self.match_rounds = []
+        self.winner_to = []
+        self.loser_to = []
+
+        # Two entries per match, for the match's first and second player.
+        self.source_kinds = []
+        self.source_values = []
+
+        self._build()
+        self._project()
+
+    @property
+    def num_matches(self):
+        return len(self.match_rounds)
+
+    def _add_match(self, round_num, source_a, source_b):
+        """Adds a match to the bracket.
+
+        Args:
+          round_num: The round the match is in.
+          source_a, source_b: (kind, value) tuples for where each player comes
+                              from. value is a seed for _FROM_SEED, or a match
+                              index otherwise.
+
+        Returns:
+          The index of the new match.
+        """
+        match = len(self.match_rounds)
+        self.match_rounds.append(round_num)
+        self.winner_to.append(_NO_MATCH)
+        self.loser_to.append(_NO_MATCH)
+
+        for kind, value in (source_a, source_b):
+            self.source_kinds.append(kind)
+            self.source_values.append(value)
+            if kind == _FROM_WINNER:
+                self.winner_to[value] = match
+            elif kind == _FROM_LOSER:
+                self.loser_to[value] = match
+
+        return match
+
+    def _build(self):
+        """Builds every match in the bracket, in an order where each match
+        comes after the matches that feed into it."""
+        if self.bracket_size == 1:
+            return
+
+        # Winner's bracket.
+        seed_order = _get_seed_order(self.bracket_size)
+        winners_rounds = [
+            [
+                self._add_match(
+                    1, (_FROM_SEED, seed_order[i]), (_FROM_SEED, seed_order[i + 1])
+                )
+                for i in range(0, self.bracket_size, 2)
+            ]
+        ]
+        while len(winners_rounds[-1]) > 1:
+            previous_round = winners_rounds[-1]
+            round_num = len(winners_rounds) + 1
+            winners_rounds.append(
+                [
+                    self._add_match(
+                        round_num,
+                        (_FROM_WINNER, previous_round[i]),
+                        (_FROM_WINNER, previous_round[i + 1]),
+                    )
+                    for i in range(0, len(previous_round), 2)
+                ]
+            )
+        winners_final = winners_rounds[-1][0]
+
+        if len(winners_rounds) == 1:
+            # With two people, the loser of the only winner's match goes
+            # straight to grand finals.
+            self._add_match(
+                2, (_FROM_WINNER, winners_final), (_FROM_LOSER, winners_final)
+            )
+            return
+
+        # Loser's bracket. The first round pairs up the people who lost in the
+        # first winner's round. After that, rounds alternate between people
+        # dropping down from the winner's bracket to play the loser's bracket
+        # survivors, and the survivors playing each other.
+        first_round = winners_rounds[0]
+        losers_round = [
+            self._add_match(
+                -1, (_FROM_LOSER, first_round[i]), (_FROM_LOSER, first_round[i + 1])
+            )
+            for i in range(0, len(first_round), 2)
+        ]
+        round_num = -1
+        for i, winners_round in enumerate(winners_rounds[1:]):
+            # Flip the order people drop down in every other round, to put off
+            # rematches from the winner's bracket.
+            if i % 2 == 0:
+                winners_round = list(reversed(winners_round))
+            round_num -= 1
+            losers_round = [
+                self._add_match(
+                    round_num, (_FROM_WINNER, survivor), (_FROM_LOSER, dropped)
+                )
+                for survivor, dropped in zip(losers_round, winners_round)
+            ]
+            if len(losers_round) > 1:
+                round_num -= 1
+                losers_round = [
+                    self._add_match(
+                        round_num,
+                        (_FROM_WINNER, losers_round[j]),
+                        (_FROM_WINNER, losers_round[j + 1]),
+                    )
+                    for j in range(0, len(losers_round), 2)
+                ]
+        losers_final = losers_round[0]
+
+        self._add_match(
+            len(winners_rounds) + 1,
+            (_FROM_WINNER, winners_final),
+            (_FROM_WINNER, losers_final),
+        )
+
+    def _get_player(self, source, winners, losers):
+        """Gets the projected player for one of a match's sources."""
+        kind = self.source_kinds[source]
+        value = self.source_values[source]
+        if kind == _FROM_SEED:
+            return value if value <= self.num_participants else _NO_PLAYER
+        elif kind == _FROM_WINNER:
+            return winners[value]
+        else:
+            return losers[value]
+
+    def _project(self):
+        """Plays out the bracket with the better seed winning every match."""
+        winners = [_NO_PLAYER] * self.num_matches
+        losers = [_NO_PLAYER] * self.num_matches
+        self.projected_players = [_NO_PLAYER] * (2 * self.num_matches)
+        self._opponents = {}
+
+        # How far each seed gets before being knocked out. Losing later in the
+        # loser's bracket is better, and losing grand finals is better than
+        # any of those. The champion is never knocked out.
+        grand_finals_round = self.match_rounds[-1] if self.match_rounds else 0
+        grand_finals_depth = self.num_matches + 1
+        knocked_out = [None] * (self.num_participants + 1)
+
+        for match in range(self.num_matches):
+            player_a = self._get_player(2 * match, winners, losers)
+            player_b = self._get_player(2 * match + 1, winners, losers)
+            self.projected_players[2 * match] = player_a
+            self.projected_players[2 * match + 1] = player_b
+
+            if player_a and player_b:
+                winner, loser = min(player_a, player_b), max(player_a, player_b)
+                round_num = self.match_rounds[match]
+                self._opponents[player_a, round_num] = player_b
+                self._opponents[player_b, round_num] = player_a
+            else:
+                winner, loser = player_a or player_b, _NO_PLAYER
+            winners[match] = winner
+            losers[match] = loser
+
+            if loser and self.loser_to[match] == _NO_MATCH:
+                round_num = self.match_rounds[match]
+                if round_num == grand_finals_round:
+                    knocked_out[loser] = grand_finals_depth
+                else:
+                    knocked_out[loser] = -round_num
+
+        # Seeds knocked out in the same round tie for placement. Everybody
+        # placing above a seed was knocked out later, or never.
+        knocked_out_order = sorted(
+            range(1, self.num_participants + 1),
+            key=lambda x: -knocked_out[x] if knocked_out[x] is not None else -1e9,
+        )
+        self.projected_placements = [0] * (self.num_participants + 1)
+        for i, seed in enumerate(knocked_out_order):
+            previous_seed = knocked_out_order[i - 1] if i else None
+            if previous_seed and knocked_out[previous_seed] == knocked_out[seed]:
+                self.projected_placements[seed] = self.projected_placements[
+                    previous_seed
+                ]
+            else:
+                self.projected_placements[seed] = i + 1
+
+    def get_projected_opponent(self, seed, round_num):
+        """Gets who a seed is projected to play in a round.
+
+        Args:
+          seed: The seed of the participant.
+          round_num: The round, numbered like Challonge rounds.
+
+        Returns:
+          The seed of their projected opponent, or None if they aren't
+          projected to play a match in that round.
+        """
+        return self._opponents.get((seed, round_num))
+
+    def get_projected_placement(self, seed):
+        """Gets where a seed is projected to place, e.g. 1st, 2nd, 3rd, 4th,
+        5th, 5th, 7th, 7th, etc."""
+        return self.projected_placements[seed]
+
+    def get_placement_groups(self):
+        """Gets the groups of seeds who are projected to tie for placement.
+
+        Returns:
+          A list of lists of seeds, ordered from last place to first place,
+          like shuffle_seeds._get_buckets.
+        """
+        groups = {}
+        for seed in range(1, self.num_participants + 1):
+            groups.setdefault(self.projected_placements[seed], []).append(seed)
+        return [groups[x] for x in sorted(groups, reverse=True)]
+
+    def preserves_placements(self, seeds):
+        """Checks if a reseeding keeps everyone's projected placement.
+
+        Args:
+          seeds: A list of new seeds, as returned by
+                 shuffle_seeds.get_shuffled_seeds, where the value at index
+                 X - 1 is the new seed for the participant seeded X.
+
+        Returns:
+          True if every participant is projected to place the same with their
+          new seed as with their old one.
+        """
+        return all(
+            self.projected_placements[new_seed] == self.projected_placements[seed]
+            for seed, new_seed in enumerate(seeds, 1)
+        )
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Prints the projected matches and placements of a "
+        "double-elimination bracket.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    argparser.add_argument(
+        "num_participants", type=int, help="the number of participants"
+    )
+    args = argparser.parse_args()
+
+    bracket = DoubleEliminationBracket(args.num_participants)
+    for match in range(bracket.num_matches):
+        player_a = bracket.projected_players[2 * match]
+        player_b = bracket.projected_players[2 * match + 1]
+        if player_a and player_b:
+            print(
+                "Round {0}: {1} vs. {2}".format(
+                    bracket.match_rounds[match], player_a, player_b
+                )
+            )
+    print()
+    for seed in range(1, args.num_participants + 1):
+        print("Seed {0} places {1}".format(seed, bracket.get_projected_placement(seed)))
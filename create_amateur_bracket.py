@@ -38,18 +38,22 @@ for an example config file with instructions.
 
 # Global python & package imports.
 import argparse
+import asyncio
 import challonge
 import random
+import requests.exceptions
 import sys
 
 # Local imports.
+import async_challonge
 import defaults
+import http_replay
 import puns
 import util
 import util_challonge
 
 # Local from imports.
-from shuffle_seeds import get_num_participants_placing_last
+from shuffle_seeds import get_bucket_boundaries
 
 
 # Participant param names for requests.
@@ -57,6 +61,11 @@ _PARAMS_CHALLONGE_USERNAME = "challonge_username"
 _PARAMS_SEED = "seed"
 _PARAMS_NAME = "name"
 _PARAMS_STATE = "state"
+_PARAMS_INVITE_NAME_OR_EMAIL = "invite_name_or_email"
+
+# Challonge doesn't document a limit on how many participants can be bulk
+# added at once, so we cap it to keep each request a reasonable size.
+_MAX_BULK_ADD_PARTICIPANTS = 128
 
 _MATCH_STATE_COMPLETE = "complete"
 _MATCH_STATE_OPEN = "open"
@@ -106,6 +115,88 @@ def _get_params_to_create_participant(
     return params
 
 
+def _get_params_to_bulk_add_participant(params):
+    """Converts the params to create a participant into bulk add params.
+
+  Args:
+    params: A dictionary from _get_params_to_create_participant.
+
+  Returns:
+    A dictionary that can be passed in the list of participants to
+    participants.bulk_add. Bulk adds take the Challonge account to invite as
+    "invite_name_or_email" instead of "challonge_username".
+  """
+    bulk_params = dict(params)
+    challonge_username = bulk_params.pop(_PARAMS_CHALLONGE_USERNAME, None)
+    if challonge_username:
+        bulk_params[_PARAMS_INVITE_NAME_OR_EMAIL] = challonge_username
+    return bulk_params
+
+
+def _is_bulk_add_unsupported(err):
+    """Checks if a failed bulk add means Challonge won't take bulk adds.
+
+  Only then is it safe to add the participants one at a time instead. Any
+  other failure, like a server error or a timeout, may have happened after
+  Challonge added the participants, so falling back could add them twice.
+
+  Args:
+    err: The requests.exceptions.HTTPError or
+         challonge.api.ChallongeException that participants.bulk_add raised.
+
+  Returns:
+    True if the endpoint doesn't exist (404) or Challonge rejected the
+    parameters (422).
+  """
+    if isinstance(err, challonge.api.ChallongeException):
+        return True
+    response = getattr(err, "response", None)
+    return response is not None and response.status_code == 404
+
+
+def _create_participants(tourney_name, all_participant_params, client=None):
+    """Adds participants to a tourney with as few API calls as possible.
+
+  Participants are added with bulk adds of up to _MAX_BULK_ADD_PARTICIPANTS
+  at a time. If Challonge doesn't support or rejects a bulk add, we fall back
+  to adding the rest of the participants one at a time. Other errors are
+  raised.
+
+  Args:
+    tourney_name: The name of the tourney to add participants to.
+    all_participant_params: A list of dictionaries from
+                            _get_params_to_create_participant, sorted by seed.
+    client: The util_challonge.ChallongeClient to add them with. Defaults to
+            the shared client.
+
+  Returns:
+    The number of API calls that were made.
+  """
+    client = client or util_challonge.get_client()
+    num_calls = 0
+    num_added = 0
+    while num_added < len(all_participant_params):
+        chunk = all_participant_params[
+            num_added:num_added + _MAX_BULK_ADD_PARTICIPANTS]
+        num_calls += 1
+        try:
+            client.participants.bulk_add(
+                tourney_name,
+                [_get_params_to_bulk_add_participant(x) for x in chunk])
+        except (requests.exceptions.HTTPError,
+                challonge.api.ChallongeException) as err:
+            if not _is_bulk_add_unsupported(err):
+                raise
+            break
+        num_added += len(chunk)
+
+    for participant_params in all_participant_params[num_added:]:
+        num_calls += 1
+        client.participants.create(tourney_name, **participant_params)
+
+    return num_calls
+
+
 def _get_losers_matches_determining_amateurs(matches, cutoff):
     """Filters existing matches that determine who qualifies for amateur's.
 
@@ -135,17 +226,14 @@ def _get_num_amateurs(num_participants, cutoff):
   Returns:
     The number of participants who will be classified as amateurs.
   """
-    # Keep eliminating a loser's round worth of people until we've reached our
-    # cutoff round. The number of eliminated people at that point is the number
-    # of amateurs.
-    num_amateurs = 0
-    for _ in range(cutoff):
-        num_eliminated = get_num_participants_placing_last(num_participants)
-
-        num_amateurs += num_eliminated
-        num_participants -= num_eliminated
-
-    return num_amateurs
+    # Each loser's round eliminates one bucket worth of people, starting from
+    # last place. Everyone in the last |cutoff| buckets is an amateur.
+    if cutoff <= 0:
+        return 0
+    boundaries = get_bucket_boundaries(num_participants)
+    if cutoff >= len(boundaries):
+        return num_participants
+    return num_participants - boundaries[-cutoff] + 1
 
 def get_amateur_participants(tourney_name, amateur_deciding_matches):
     """
@@ -159,20 +247,38 @@ def get_amateur_participants(tourney_name, amateur_deciding_matches):
         that need to be completed.
 
     """
+    # Look up everybody at once instead of each player in each match.
+    participants = []
+    if amateur_deciding_matches:
+        client = util_challonge.get_client()
+        participants = client.participants.index(tourney_name)
+    return _get_amateur_infos(participants, amateur_deciding_matches)
+
+
+def _get_amateur_infos(participants, amateur_deciding_matches):
+    """
+    Gets the players eligible for the amateur bracket from the tourney's
+    participants.
+
+    @params participants: the participants in the tourney.
+    @params: the rest are the same as get_amateur_participants'.
+
+    """
+    participants_by_id = {x["id"]: x for x in participants}
     amateur_infos = []
     for match in amateur_deciding_matches:
         if match[_PARAMS_STATE] == _MATCH_STATE_COMPLETE:
             id = match["loser_id"]
-            player = challonge.participants.show(tourney_name, id)
+            player = dict(participants_by_id[id])
         elif match[_PARAMS_STATE] == _MATCH_STATE_OPEN:
             # If the match isn't complete, create a frankenplayer by
             # combining the two players' tags and averaging their seed.
             id1 = match["player1_id"]
             id2 = match["player2_id"]
-            player1 = challonge.participants.show(tourney_name, id1)
-            player2 = challonge.participants.show(tourney_name, id2)
+            player1 = participants_by_id[id1]
+            player2 = participants_by_id[id2]
 
-            player = player1
+            player = dict(player1)
             player[_PARAMS_SEED] = (player1[_PARAMS_SEED] +
                                     player2[_PARAMS_SEED]) // 2
             player['display_name'] = '{} / {}'.format(player1['display_name'],
@@ -195,10 +301,86 @@ def get_amateur_participants(tourney_name, amateur_deciding_matches):
     return amateur_infos
 
 
+def _get_amateur_tourney_name(tourney_name):
+    """Gets the name of a tourney's amateur bracket."""
+    return tourney_name + "_amateur"
+
+
+def _get_amateur_tourney(tourney_name, tourney_info, single_elimination):
+    """
+    Gets the details of a tourney's amateur bracket.
+
+    @returns: a tuple of the amateur bracket's title, name, URL and type.
+
+    """
+    amateur_tourney_title = tourney_info["name"] + " Amateur's Bracket"
+    amateur_tourney_name = _get_amateur_tourney_name(tourney_name)
+    amateur_tourney_url = util_challonge.tourney_name_to_url(amateur_tourney_name)
+    if single_elimination:
+        amateur_tourney_type = "single elimination"
+    else:
+        amateur_tourney_type = "double elimination"
+    return (amateur_tourney_title, amateur_tourney_name, amateur_tourney_url,
+            amateur_tourney_type)
+
+
+def _get_incomplete_matches_error(amateur_deciding_matches, num_participants,
+                                  cutoff):
+    """
+    Checks that every match deciding the amateurs has been played.
+
+    @returns: an AmateurBracketRequiredMatchesIncompleteError if some haven't,
+        or None.
+
+    """
+    num_completed_deciding_matches = sum(
+        1 for x in amateur_deciding_matches
+            if x[_PARAMS_STATE] == _MATCH_STATE_COMPLETE
+    )
+    num_amateurs = _get_num_amateurs(num_participants, cutoff)
+    if num_completed_deciding_matches == num_amateurs:
+        return None
+
+    matches_remaining = num_amateurs - num_completed_deciding_matches
+    return AmateurBracketRequiredMatchesIncompleteError(
+        "There are still {0} matches incomplete before loser's round {1}.\n"
+        "Please wait for these matches to complete before creating the\n"
+        "amateur bracket.\n"
+        "The last loser's round for amateur's qualification can be\n"
+        "configured using the --losers_round_cutoff flag.\n".format(
+        matches_remaining, cutoff + 1), matches_remaining)
+
+
+def _get_all_amateur_params(amateur_infos, randomize_seeds,
+                            associate_challonge_accounts, rng):
+    """
+    Seeds the amateurs.
+
+    @returns: a list of params to create each amateur with, sorted by seed.
+
+    """
+    if rng is None:
+        rng = random
+    if randomize_seeds:
+        seed_fn = lambda x: rng.random()
+    else:
+        seed_fn = lambda x: x[_PARAMS_SEED]
+    amateur_infos = sorted(amateur_infos, key=seed_fn)
+
+    return [
+        _get_params_to_create_participant(
+            amateur_info,
+            associate_challonge_account=associate_challonge_accounts,
+            seed=seed
+        )
+        for seed, amateur_info in enumerate(amateur_infos, 1)
+    ]
+
+
 def create_amateur_bracket(tourney_url, single_elimination,
                            losers_round_cutoff, randomize_seeds,
                            associate_challonge_accounts=False,
-                           incomplete=False, interactive=False):
+                           incomplete=False, interactive=False, rng=None):
     """
     Create the amateur bracket.
 
@@ -206,21 +388,19 @@ def create_amateur_bracket(tourney_url, single_elimination,
 
     @param interactive: If this is being run on the command line and can take
         user input.
+    @param rng: The random.Random used to randomize seeds. Defaults to the
+        global random number generator.
 
     @returns: URL of the generated amateur bracket.
 
     """
     # Create the info for our amateur's bracket.
+    client = util_challonge.get_client()
     tourney_name = util_challonge.extract_tourney_name(tourney_url)
-    tourney_info = challonge.tournaments.show(tourney_name)
-    tourney_title = tourney_info["name"]
-    amateur_tourney_title = tourney_title + " Amateur's Bracket"
-    amateur_tourney_name = tourney_name + "_amateur"
-    amateur_tourney_url = util_challonge.tourney_name_to_url(amateur_tourney_name)
-    if single_elimination:
-        amateur_tourney_type = "single elimination"
-    else:
-        amateur_tourney_type = "double elimination"
+    tourney_info = client.tournaments.show(tourney_name)
+    (amateur_tourney_title, amateur_tourney_name, amateur_tourney_url,
+     amateur_tourney_type) = _get_amateur_tourney(tourney_name, tourney_info,
+                                                  single_elimination)
 
     # Make sure the tournament doesn't already exist.
     existing_amateur_tournament = util_challonge.get_tourney_info(amateur_tourney_name)
@@ -231,26 +411,15 @@ def create_amateur_bracket(tourney_url, single_elimination,
 
     # Get all decided loser's matches until the cutoff.
     cutoff = losers_round_cutoff
-    matches = challonge.matches.index(tourney_name)
+    matches = client.matches.index(tourney_name)
     amateur_deciding_matches = _get_losers_matches_determining_amateurs(matches, cutoff)
-    num_completed_deciding_matches = sum(
-        1 for x in amateur_deciding_matches
-            if x[_PARAMS_STATE] == _MATCH_STATE_COMPLETE
-    )
-    num_amateurs = _get_num_amateurs(tourney_info["participants_count"], cutoff)
 
     # If they're not all complete, we don't have enough info to create the
     # amateur bracket.
-    if num_completed_deciding_matches != num_amateurs:
-        matches_remaining = num_amateurs - num_completed_deciding_matches
-        err = AmateurBracketRequiredMatchesIncompleteError(
-            "There are still {0} matches incomplete before loser's round {1}.\n"
-            "Please wait for these matches to complete before creating the\n"
-            "amateur bracket.\n"
-            "The last loser's round for amateur's qualification can be\n"
-            "configured using the --losers_round_cutoff flag.\n".format(
-            matches_remaining, cutoff + 1), matches_remaining)
-
+    err = _get_incomplete_matches_error(amateur_deciding_matches,
+                                        tourney_info["participants_count"],
+                                        cutoff)
+    if err:
         if interactive:
             print(err)
 
@@ -270,20 +439,10 @@ def create_amateur_bracket(tourney_url, single_elimination,
                                              amateur_deciding_matches)
 
     # Sort them based on seeding.
-    if randomize_seeds:
-        seed_fn = lambda x: random.random()
-    else:
-        seed_fn = lambda x: x[_PARAMS_SEED]
-    amateur_infos = sorted(amateur_infos, key=seed_fn)
-
-    all_amateur_params = [
-        _get_params_to_create_participant(
-            amateur_info,
-            associate_challonge_account=associate_challonge_accounts,
-            seed=seed
-        )
-        for seed, amateur_info in enumerate(amateur_infos, 1)
-    ]
+    all_amateur_params = _get_all_amateur_params(amateur_infos,
+                                                 randomize_seeds,
+                                                 associate_challonge_accounts,
+                                                 rng)
 
     if interactive:
         # Confirm with the user that this is all okay.
@@ -327,19 +486,83 @@ def create_amateur_bracket(tourney_url, single_elimination,
 
     # We've got confirmation. Go ahead and create the amateur bracket.
     tourney, subdomain = util_challonge.tourney_name_to_parts(amateur_tourney_name)
-    challonge.tournaments.create(
+    client.tournaments.create(
         amateur_tourney_title, tourney, amateur_tourney_type,
         subdomain=subdomain)
 
-    for amateur_params in all_amateur_params:
-        challonge.participants.create(amateur_tourney_name, **amateur_params)
+    num_calls = _create_participants(amateur_tourney_name, all_amateur_params)
 
     if interactive:
         print("Created {0} at {1}.".format(amateur_tourney_title, amateur_tourney_url))
+        print(
+            "Added {0} participants in {1} API calls ({2} saved).".format(
+                len(all_amateur_params),
+                num_calls,
+                len(all_amateur_params) - num_calls,
+            )
+        )
         print("Start the amateur bracket at the above URL when you're ready!")
 
     return amateur_tourney_url
 
+
+async def create_amateur_bracket_async(tourney_url, single_elimination,
+                                       losers_round_cutoff, randomize_seeds,
+                                       associate_challonge_accounts=False,
+                                       incomplete=False, rng=None,
+                                       client=None):
+    """
+    The same as create_amateur_bracket, but makes every lookup about the main
+    bracket at the same time, and never prompts.
+
+    @param client: optional async_challonge.AsyncChallongeClient to make
+        calls with. Defaults to one wrapping the shared client, which is
+        closed before returning.
+
+    """
+    with async_challonge.client_or_default(client) as client:
+        tourney_name = util_challonge.extract_tourney_name(tourney_url)
+        tourney_info, existing_amateur_tournament, matches, participants = (
+            await asyncio.gather(
+                client.tournaments.show(tourney_name),
+                client.get_tourney_info(
+                    _get_amateur_tourney_name(tourney_name)),
+                client.matches.index(tourney_name),
+                client.participants.index(tourney_name),
+            )
+        )
+        (amateur_tourney_title, amateur_tourney_name, amateur_tourney_url,
+         amateur_tourney_type) = _get_amateur_tourney(tourney_name, tourney_info,
+                                                      single_elimination)
+
+        if existing_amateur_tournament:
+            raise AmateurBracketAlreadyExistsError(
+                "Amateur tournament already exists at {}."
+                .format(amateur_tourney_url))
+
+        amateur_deciding_matches = _get_losers_matches_determining_amateurs(
+            matches, losers_round_cutoff)
+        err = _get_incomplete_matches_error(amateur_deciding_matches,
+                                            tourney_info["participants_count"],
+                                            losers_round_cutoff)
+        if err and not incomplete:
+            raise err
+
+        amateur_infos = _get_amateur_infos(participants, amateur_deciding_matches)
+        all_amateur_params = _get_all_amateur_params(
+            amateur_infos, randomize_seeds, associate_challonge_accounts, rng)
+
+        tourney, subdomain = util_challonge.tourney_name_to_parts(amateur_tourney_name)
+        await client.tournaments.create(
+            amateur_tourney_title, tourney, amateur_tourney_type,
+            subdomain=subdomain)
+        # Participants are added one call at a time anyway, since a participant
+        # can't be seeded below the ones that haven't been added yet.
+        await client.run(_create_participants, amateur_tourney_name,
+                         all_amateur_params, client.client)
+
+        return amateur_tourney_url
+
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser(description="Create amateur brackets.",
                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -371,6 +594,12 @@ if __name__ == "__main__":
         "amateur bracket. If this is off, the same "
         "seeds from the main bracket will be used",
     )
+    argparser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="seed for random number generation when randomizing seeds",
+    )
     argparser.add_argument(
         "--incomplete",
         action="store_true",
@@ -385,13 +614,35 @@ if __name__ == "__main__":
         "This will invite their Challonge account to "
         "the tourney via email, so use responsibly.",
     )
+    argparser.add_argument(
+        "--record",
+        default=None,
+        help="record every Challonge response to this cassette file, to "
+        "replay later with --replay. See http_replay.py",
+    )
+    argparser.add_argument(
+        "--replay",
+        default=None,
+        help="answer every Challonge request from a cassette recorded with "
+        "--record instead of the network. No credentials are needed",
+    )
+    argparser.add_argument(
+        "--replay_realtime",
+        action="store_true",
+        help="with --replay, take as long to answer each request as the "
+        "recorded request took, instead of answering straight away",
+    )
     args = argparser.parse_args()
 
+    http_replay.install(args.record, args.replay, args.replay_realtime)
+
     # We need to initialize our Challonge credentials before we can
-    # make any API calls.
-    initialized = util_challonge.set_challonge_credentials_from_config(args.config_file)
-    if not initialized:
-        sys.exit(1)
+    # make any API calls, unless they're being replayed.
+    if not args.replay:
+        initialized = util_challonge.set_challonge_credentials_from_config(
+            args.config_file)
+        if not initialized:
+            sys.exit(1)
 
     try:
         create_amateur_bracket(
@@ -401,7 +652,8 @@ if __name__ == "__main__":
             randomize_seeds=args.randomize_seeds,
             associate_challonge_accounts=args.associate_challonge_accounts,
             incomplete=args.incomplete,
-            interactive=True
+            interactive=True,
+            rng=random.Random(args.seed)
         )
     except (AmateurBracketAlreadyExistsError,
             AmateurBracketRequiredMatchesIncompleteError) as e:
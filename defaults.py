@@ -1,2 +1,46 @@
+import os
+
 DEFAULT_CONFIG_FILENAME = "challonge.ini"
 DEFAULT_REGION = "norcal"
+
+# Where gaR PR rankings are cached between runs, and how many seconds a cached
+# ranking is used before we check gaR PR for a newer one.
+DEFAULT_RANKINGS_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "challonge-tools", "garpr"
+)
+DEFAULT_RANKINGS_CACHE_TTL = 60 * 60
+
+# How many connections to keep open to Challonge at once, and how many seconds
+# to wait for Challonge to (connect, respond) before giving up.
+DEFAULT_CHALLONGE_POOL_SIZE = 10
+DEFAULT_CHALLONGE_TIMEOUT = (5, 30)
+
+# How many seconds Challonge responses are reused for, by endpoint, and how many
+# responses to keep at once. Responses about a tournament are thrown out
+# whenever we change it. Matches are only reused briefly since we wait on them
+# to finish before creating amateur brackets.
+DEFAULT_CHALLONGE_CACHE_TTLS = {
+    "tournaments.show": 60,
+    "participants.index": 30,
+    "matches.index": 5,
+}
+DEFAULT_CHALLONGE_CACHE_SIZE = 256
+
+# How many Challonge requests to send per second on average, and how many can
+# be sent at once after a quiet spell. Challonge doesn't publish its rate
+# limits, so these stay well under what we've seen it allow.
+DEFAULT_CHALLONGE_REQUESTS_PER_SECOND = 5
+DEFAULT_CHALLONGE_BURST = 10
+
+# How many times to retry a Challonge request that was rate limited or hit a
+# server error, and the seconds to wait before the first retry. The wait
+# doubles with each retry, up to the max.
+DEFAULT_CHALLONGE_MAX_RETRIES = 5
+DEFAULT_CHALLONGE_RETRY_DELAY = 1
+DEFAULT_CHALLONGE_MAX_RETRY_DELAY = 60
+
+# Where the last seeding applied to each tournament is saved, so that seeding
+# it again can only slot in new registrants.
+DEFAULT_SEEDING_HISTORY_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "challonge-tools", "seedings"
+)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+
+"""Fuzzy matching of player tags against gaR PR rankings.
+
+Tags on Challonge don't always line up with tags on gaR PR. People add
+sponsors ("C9 | Mango"), swap letters for numbers ("Mang0") or just make
+typos. This module finds the closest gaR PR tags for a name using trigram
+similarity.
+
+Every tag is broken up into its three-letter substrings (trigrams), and an
+inverted index maps each trigram to the tags containing it. To match a name,
+we only have to look at the tags that share at least one trigram with it,
+instead of comparing it against every ranking.
+"""
+
+
+import collections
+import re
+
+
+# The minimum similarity for a tag to count as a match, from 0 to 1.
+DEFAULT_MIN_SCORE = 0.5
+
+# Numbers that people commonly use in place of letters.
+_LEETSPEAK = str.maketrans("013457", "oieast")
+
+
+def normalize_tag(name):
+    """Normalizes a tag so that cosmetic differences are ignored.
+
+    e.g. "SAB | Mang0" => "mango"
+
+    Args:
+      name: The tag to normalize.
+
+    Returns:
+      The tag in lowercase, without any sponsor prefix, with numbers that look
+      like letters replaced by those letters, and with everything that isn't
+      a letter or number removed.
+    """
+    tag = name.split("|")[-1].lower().translate(_LEETSPEAK)
+    return re.sub(r"[\W_]", "", tag)
+
+
+def _get_trigrams(tag):
+    """Gets the set of trigrams in a normalized tag.
+
+    The tag is padded so that short tags still have a few trigrams, and so
+    that the start and end of the tag count for a bit more.
+
+    Args:
+      tag: A tag returned by normalize_tag.
+
+    Returns:
+      A set of three-character strings.
+    """
+    padded_tag = "  {0} ".format(tag)
+    return {padded_tag[i:i + 3] for i in range(len(padded_tag) - 2)}
+
+
+class TrigramIndex(object):
+    """An inverted index from trigrams to gaR PR rankings.
+
+    Args:
+      alias_index: A dictionary from tags to gaR PR ranking objects, as
+                   returned by garpr_seeds._build_alias_index.
+    """
+
+    def __init__(self, alias_index):
+        # Several aliases can normalize to the same tag, in which case we keep
+        # the first ranking for it, like the alias index does.
+        rankings_for_tags = collections.OrderedDict()
+        for alias, ranking in alias_index.items():
+            rankings_for_tags.setdefault(normalize_tag(alias), ranking)
+
+        self._rankings = list(rankings_for_tags.values())
+        self._num_trigrams = []
+        self._postings = collections.defaultdict(list)
+        for i, tag in enumerate(rankings_for_tags):
+            trigrams = _get_trigrams(tag)
+            self._num_trigrams.append(len(trigrams))
+            for trigram in trigrams:
+                self._postings[trigram].append(i)
+
+    def find_matches(self, name, limit=1, min_score=DEFAULT_MIN_SCORE):
+        """Finds the rankings whose tags are most similar to a name.
+
+        Args:
+          name: The name to match.
+          limit: The maximum number of matches to return.
+          min_score: The minimum similarity score for a match.
+
+        Returns:
+          A list of up to |limit| (ranking, score) tuples, best match first.
+          The score is the Jaccard similarity of the trigrams in the two
+          tags, where 1 means the tags are the same once normalized.
+        """
+        trigrams = _get_trigrams(normalize_tag(name))
+
+        num_shared_trigrams = collections.Counter()
+        for trigram in trigrams:
+            num_shared_trigrams.update(self._postings.get(trigram, ()))
+
+        matches = []
+        for i, num_shared in num_shared_trigrams.items():
+            num_total = len(trigrams) + self._num_trigrams[i] - num_shared
+            score = num_shared / num_total
+            if score >= min_score:
+                matches.append((score, i))
+
+        # Ties go to the better-ranked player, since rankings are in order.
+        matches.sort(key=lambda x: (-x[0], x[1]))
+        return [(self._rankings[i], score) for score, i in matches[:limit]]
+
+    def find_ranking(self, name, min_score=DEFAULT_MIN_SCORE):
+        """Finds the ranking whose tag is most similar to a name.
+
+        Args:
+          name: The name to match.
+          min_score: The minimum similarity score for a match.
+
+        Returns:
+          The best matching gaR PR ranking object, or None if no tag is
+          similar enough.
+        """
+        matches = self.find_matches(name, limit=1, min_score=min_score)
+        return matches[0][0] if matches else None
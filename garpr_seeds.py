@@ -3,15 +3,24 @@
 
 import argparse
 import challonge
+import concurrent.futures
 import itertools
 import re
 import requests
 
 import defaults
+import fuzzy_names
+import ranking_sources
+import rankings_cache
+import rankings_stream
 
 
 UNKNOWN_RANK = -1
 
+# What gaR PR is requested with: the requests module, or anything with the same
+# get function, e.g. an http_replay.ReplaySession.
+http_session = requests
+
 
 """Generates seeds for a tournament from gaR PR. http://www.garpr.com
 
@@ -26,18 +35,128 @@ Usage:
 """
 
 
-def _fetch_garpr_rankings(region):
+def _fetch_garpr_rankings(region, cache=None):
     """Fetches the gaR PR rankings from a given region.
 
     Args:
       region: The region of the gaR PR tournament.
+      cache: An optional rankings_cache.RankingsCache to read the rankings
+             from instead of always requesting them from gaR PR.
 
     Returns:
       A list of ranking responses for that region. Basically the same response
-      that you would get from querying /rankings using the gaR PR API.
+      that you would get from querying /rankings using the gaR PR API, but
+      with only the fields in rankings_stream.COMPACT_RANKING_FIELDS.
     """
     rankings_url = "https://www.garpr.com:3001/{0}/rankings".format(region)
-    return requests.get(rankings_url).json()["ranking"]
+    if cache:
+        return cache.get_rankings(region, rankings_url)
+
+    # Close the response even if it fails partway, so its pooled connection
+    # isn't leaked.
+    response = http_session.get(rankings_url, stream=True)
+    try:
+        response.raise_for_status()
+        return rankings_stream.parse_compact_rankings(response)
+    finally:
+        response.close()
+
+
+def _get_regions(region):
+    """Gets the list of regions to pull rankings from.
+
+    Args:
+      region: Either a list of gaR PR regions, or a string of comma-separated
+              regions, e.g. "norcal,googlemtv".
+
+    Returns:
+      A list of gaR PR regions.
+    """
+    if isinstance(region, str):
+        return [x.strip() for x in region.split(",")]
+    return list(region)
+
+
+def _merge_rankings(region_rankings):
+    """Merges the rankings of several regions into a single ranking.
+
+    Players are interleaved by their rank within their own region, so all the
+    rank 1 players come first, then all the rank 2 players, and so on. Players
+    with the same rank are ordered by the order of their regions, so the first
+    region wins ties. If a player is ranked in several regions (going by
+    their name, ignoring case), only their best placement is kept.
+
+    Args:
+      region_rankings: A list with the list of gaR PR ranking objects for each
+                       region, in order of priority.
+
+    Returns:
+      A single list of gaR PR ranking objects, ordered from first to last,
+      with ranks renumbered from 1.
+    """
+    tagged_rankings = [
+        (ranking["rank"], region_num, ranking)
+        for region_num, rankings in enumerate(region_rankings)
+        for ranking in rankings
+    ]
+    tagged_rankings.sort(key=lambda x: (x[0], x[1]))
+
+    merged_rankings = []
+    seen_names = set()
+    for _, _, ranking in tagged_rankings:
+        name = ranking["name"].lower()
+        if name in seen_names:
+            continue
+        seen_names.add(name)
+        merged_rankings.append(dict(ranking, rank=len(merged_rankings) + 1))
+    return merged_rankings
+
+
+def _fetch_rankings_for_regions(region, cache=None):
+    """Fetches the gaR PR rankings for one or more regions.
+
+    The rankings for each region are fetched concurrently, so pulling several
+    regions takes about as long as pulling the slowest one.
+
+    Args:
+      region: The region or regions to fetch rankings from, in any form
+              accepted by _get_regions.
+      cache: An optional rankings_cache.RankingsCache to read the rankings
+             from.
+
+    Returns:
+      A list of ranking responses. If several regions were given, their
+      rankings are merged with _merge_rankings.
+    """
+    regions = _get_regions(region)
+    if len(regions) == 1:
+        return _fetch_garpr_rankings(regions[0], cache)
+
+    with concurrent.futures.ThreadPoolExecutor(len(regions)) as executor:
+        region_rankings = list(
+            executor.map(lambda x: _fetch_garpr_rankings(x, cache), regions)
+        )
+    return _merge_rankings(region_rankings)
+
+
+def _get_garpr_names(garpr_name):
+    """Gets all the tags that a gaR PR name can be matched against.
+
+    Args:
+      garpr_name: The lowercased name of a player on gaR PR.
+
+    Returns:
+      A set of the tags that the player goes by.
+    """
+    # GarPR handles multiple tags with either "Tag / OtherTag" or
+    # "Tag (OtherTag).
+    if "/" in garpr_name:
+        return set(garpr_name.split(" / "))
+    elif "(" in garpr_name:
+        m = re.search("(.*)\s+\((.*)\)", garpr_name)
+        return {m.group(1), m.group(2)}
+    else:
+        return {garpr_name}
 
 
 def _find_ranking_for_name(name, rankings):
@@ -53,22 +172,32 @@ def _find_ranking_for_name(name, rankings):
     """
     name = name.lower()
     for ranking in rankings:
-        garpr_name = ranking["name"].lower()
-        # GarPR handles multiple tags with either "Tag / OtherTag" or
-        # "Tag (OtherTag).
-        if "/" in garpr_name:
-            garpr_names = set(garpr_name.split(" / "))
-        elif "(" in garpr_name:
-            m = re.search("(.*)\s+\((.*)\)", garpr_name)
-            garpr_names = {m.group(1), m.group(2)}
-        else:
-            garpr_names = {garpr_name}
-
-        if name in garpr_names:
+        if name in _get_garpr_names(ranking["name"].lower()):
             return ranking
     return None
 
 
+def _build_alias_index(rankings):
+    """Indexes gaR PR rankings by every tag that a player goes by.
+
+    Looking a name up in the index gives the same result as
+    _find_ranking_for_name, but without rescanning all of the rankings for
+    each name.
+
+    Args:
+      rankings: The list of gaR PR ranking objects to index.
+
+    Returns:
+      A dictionary from lowercased tags to the ranking object for that tag.
+      If several rankings share a tag, the first one in the list wins.
+    """
+    alias_index = {}
+    for ranking in rankings:
+        for alias in _get_garpr_names(ranking["name"].lower()):
+            alias_index.setdefault(alias, ranking)
+    return alias_index
+
+
 def _get_rank(ranking):
     """Retrieves a rank from a gaR PR ranking.
 
@@ -102,32 +231,94 @@ def ranks_to_seeds(ranks):
     # disrupt the order.
     sorted_known_ranks = [x for x in sorted(ranks) if x != UNKNOWN_RANK]
 
+    # Map each rank to its position in the sorted list up front so we don't
+    # have to search the list for every player. If two players share a rank,
+    # they share the seed of the first one.
+    seeds_for_ranks = {}
+    for seed, rank in enumerate(sorted_known_ranks, 1):
+        seeds_for_ranks.setdefault(rank, seed)
+
     next_last_place_seed = len(sorted_known_ranks) + 1
     seeds = []
-    for i, rank in enumerate(ranks):
+    for rank in ranks:
         if rank == UNKNOWN_RANK:
             seeds.append(next_last_place_seed)
             next_last_place_seed = next_last_place_seed + 1
         else:
-            seeds.append(sorted_known_ranks.index(rank) + 1)
+            seeds.append(seeds_for_ranks[rank])
 
     return seeds
 
 
-def get_garpr_ranks(names, region):
+def ranks_to_seeds_batch(rank_lists):
+    """Converts several lists of ranks into seeds at once.
+
+    e.g. [[4, 6, UNKNOWN_RANK], [2, 1]] => [[1, 2, 3], [2, 1]]
+
+    Args:
+      rank_lists: A list of lists of ranks, as accepted by ranks_to_seeds. The
+                  lists don't need to be the same length.
+
+    Returns:
+      A list containing the seeds for each list of ranks, in the same order.
+    """
+    return [ranks_to_seeds(ranks) for ranks in rank_lists]
+
+
+def get_garpr_rankings(names, region, cache=None, fuzzy=False, source=None):
+    """Gets the gaR PR ranking objects for a list of names.
+
+    Args:
+      names: A list of names of the people you want to get rankings for.
+      region: The gaR PR region that you want to pull rankings from. This can
+              also be a list of regions, or a comma-separated string of
+              regions, in which case their rankings are merged using
+              _merge_rankings.
+      cache: An optional rankings_cache.RankingsCache to read the rankings
+             from.
+      fuzzy: If True, names that don't exactly match a tag on gaR PR are
+             given the ranking of the most similar tag, if any are close
+             enough.
+      source: An optional ranking_sources.RankingSource to read rankings from
+              instead of gaR PR. If this is given, region and cache are
+              ignored.
+
+    Returns:
+      A list with the ranking object for each name, or None for any player
+      that is not currently ranked.
+    """
+    alias_index = None
+    if source is None:
+        alias_index = _build_alias_index(_fetch_rankings_for_regions(region, cache))
+        name_rankings = [alias_index.get(name.lower()) for name in names]
+    else:
+        name_rankings = source.find_rankings(names)
+
+    if fuzzy and not all(name_rankings):
+        if alias_index is None:
+            alias_index = _build_alias_index(source.get_rankings())
+        trigram_index = fuzzy_names.TrigramIndex(alias_index)
+        name_rankings = [
+            ranking or trigram_index.find_ranking(name)
+            for name, ranking in zip(names, name_rankings)
+        ]
+
+    return name_rankings
+
+
+def get_garpr_ranks(names, region, cache=None, fuzzy=False, source=None):
     """Gets the seeds for names based off of gaR PR rankings.
 
     Args:
       names: A list of names of the people you want to get ranks for. These
              names should correspond to their name on the gaR PR.
-      region: The gaR PR region that you want to pull rankings from.
+      region, cache, fuzzy, source: The same as for get_garpr_rankings.
 
     Returns:
       A list of ranks for those players. UNKNOWN_RANK will be returned as the
       rank for any player that is not currently on the gaR PR.
     """
-    rankings = _fetch_garpr_rankings(region)
-    name_rankings = [_find_ranking_for_name(name, rankings) for name in names]
+    name_rankings = get_garpr_rankings(names, region, cache, fuzzy, source)
     ranks = [_get_rank(ranking) for ranking in name_rankings]
     return ranks
 
@@ -144,11 +335,47 @@ if __name__ == "__main__":
         help="the region from which the gaR PR rankings "
         "should be pulled from. For example, in the "
         "URL http://garpr.com/googlemtv/players, the "
-        "region is 'googlemtv'",
+        "region is 'googlemtv'. Separate several regions with commas to "
+        "merge their rankings, e.g. 'norcal,googlemtv'",
+    )
+    argparser.add_argument(
+        "--cache_dir",
+        default=defaults.DEFAULT_RANKINGS_CACHE_DIR,
+        help="the directory to cache gaR PR rankings in",
+    )
+    argparser.add_argument(
+        "--cache_ttl",
+        type=int,
+        default=defaults.DEFAULT_RANKINGS_CACHE_TTL,
+        help="the number of seconds to use cached rankings before checking "
+        "gaR PR for newer ones. Use 0 to always check",
+    )
+    argparser.add_argument(
+        "--offline",
+        action="store_true",
+        help="only use cached rankings without contacting gaR PR",
+    )
+    argparser.add_argument(
+        "--rankings_source",
+        default=None,
+        help="a SQLite database (.db), JSON or CSV file to read rankings from "
+        "instead of gaR PR. See ranking_sources.py",
+    )
+    argparser.add_argument(
+        "--fuzzy",
+        action="store_true",
+        help="match names that aren't exactly on gaR PR to the most similar "
+        "tag, e.g. 'Mang0' to 'Mango'",
     )
     args = argparser.parse_args()
 
+    cache = rankings_cache.RankingsCache(
+        args.cache_dir, ttl=args.cache_ttl, offline=args.offline
+    )
+    source = None
+    if args.rankings_source:
+        source = ranking_sources.open_ranking_source(args.rankings_source)
     region = args.region
     names = [x.strip() for x in args.names.split(",")]
-    ranks = get_garpr_ranks(names, region)
+    ranks = get_garpr_ranks(names, region, cache, fuzzy=args.fuzzy, source=source)
     print(ranks_to_seeds(ranks))
@@ -15,11 +15,20 @@ For example, for www.challonge.com/mtvmlee72:
 
 
 import argparse
-import challonge
+import asyncio
+import concurrent.futures
+import functools
+import random
 import sys
+import time
 
+import async_challonge
 import defaults
 import garpr_seeds
+import http_replay
+import ranking_sources
+import rankings_cache
+import seeding_history
 import shuffle_seeds
 import util
 import util_challonge
@@ -29,6 +38,12 @@ class NoSuchTournamentError(Exception):
     """Requested tournament does not exist."""
 
 
+# The stages of seed_tournament that it can time. The rankings, participants
+# and tourney_info stages run at the same time.
+STAGES = ("rankings", "participants", "tourney_info", "matching", "seeding",
+          "total")
+
+
 def _sort_by_seeds(values, seeds):
     """Sorts a list of values by corresponding seed values.
 
@@ -47,35 +62,90 @@ def _sort_by_seeds(values, seeds):
     return [x[1] for x in sorted_enumerated_values]
 
 
-def seed_tournament(tourney_url, region, shuffle):
-    """
-    @params: same as argparse params
+def _slot_in_new_participants(participants, new_seeds, is_new):
+    """Slots new participants in at their seeds around everybody else.
 
-    @returns: a tuple consisting of:
-        * List of participants sorted by seed, ascending.
-        * List of players whose rank could not be found, along with what
-            rank they were seeded.
+  Seeds are shuffled within buckets (see shuffle_seeds.get_bucket_boundaries),
+  and adding participants can move the bucket boundaries. So each bucket of
+  the new field is filled on its own: the new participants whose seed falls
+  in it take their seed, and the rest of its seeds go to the other
+  participants whose seed falls in it, in the order they're in now. So any
+  shuffle is kept within the buckets that didn't change, and everybody's
+  projected placement is kept.
+
+  e.g. with ten participants a-j shuffled as a, b, c, d, e, f, h, g, j, i:
+       a newcomer X seeded 11th => a, b, c, d, e, f, h, g, j, i, X
+       a newcomer X seeded 1st  => X, a, b, c, d, e, f, g, h, j, i
+       since g and h would now be seeded 8th and 9th, which are in different
+       buckets, while i and j are still in the same one.
+
+  Args:
+    participants: A list of participants, sorted by their current seed.
+    new_seeds: A list of the same size as |participants| with the seed each
+               participant would get if the whole field were seeded at once,
+               as from garpr_seeds.ranks_to_seeds.
+    is_new: A list of the same size as |participants| saying whether each
+            participant is new.
 
+  Returns:
+    The participants from 1st seed to last.
+  """
+    # Participants who share a seed are seeded in the order they're in now.
+    order = sorted(range(len(participants)), key=lambda i: new_seeds[i])
+    boundaries = shuffle_seeds.get_bucket_boundaries(len(participants))
+    bucket_ends = boundaries[1:] + (len(participants) + 1,)
+
+    sorted_participants = []
+    for top_seed, end_seed in zip(boundaries, bucket_ends):
+        members = order[top_seed - 1:end_seed - 1]
+
+        # New participants take their seed, and everybody else fills in the
+        # rest of the bucket in the order they're in now, which is how they
+        # were shuffled if they were.
+        old_members = iter(sorted(i for i in members if not is_new[i]))
+        for i in members:
+            sorted_participants.append(
+                participants[i if is_new[i] else next(old_members)])
+    return sorted_participants
+
+
+def _seed_participants(tourney_name, participants, ranks, shuffle, rng=None,
+                       history=None, new_participants_only=False):
     """
-    # Make sure the tournament exists.
-    tourney_name = util_challonge.extract_tourney_name(tourney_url)
-    if not util_challonge.get_tourney_info(tourney_name):
-        raise NoSuchTournamentError("No tourney exists at {0}."
-                                    .format(tourney_url))
+    Seeds participants from their gaR PR ranks.
 
-    # Get the seeds for the participants.
-    participants = challonge.participants.index(tourney_name)
+    @param participants: the tournament's participants, sorted by their
+        current seed.
+    @param ranks: the participants' gaR PR ranks.
+    @params: the rest are the same as seed_tournament's.
+
+    @returns: the same as seed_tournament.
+
+    """
     participant_names = [util_challonge.get_participant_name(x) for x in participants]
-    ranks = garpr_seeds.get_garpr_ranks(participant_names, region)
     new_seeds = garpr_seeds.ranks_to_seeds(ranks)
 
+    # Find out who's registered since the last time we seeded.
+    is_new = [True] * len(participants)
+    last_seeding = None
+    if new_participants_only and history:
+        last_seeding = history.load(tourney_name)
+    if last_seeding is not None:
+        seeded_ids = set(last_seeding)
+        is_new = [x["id"] not in seeded_ids for x in participants]
+
     # Let the user know which participants couldn't be found.
     players_unknown = []
     for i, _ in enumerate(participants):
-        if ranks[i] == garpr_seeds.UNKNOWN_RANK:
+        if ranks[i] == garpr_seeds.UNKNOWN_RANK and is_new[i]:
             unknown = {"name": participant_names[i], "seed": new_seeds[i]}
             players_unknown.append(unknown)
 
+    if last_seeding is not None:
+        sorted_participants = _slot_in_new_participants(participants,
+                                                        new_seeds, is_new)
+        return sorted_participants, players_unknown
+
     # Sort the participants on Challonge. They need to be sorted
     # before updating their seed, or else the order of the seeds could get
     # disrupted from reordering as seeds are changed.
@@ -83,17 +153,190 @@ def seed_tournament(tourney_url, region, shuffle):
 
     # Shuffle the seeds to vary up the bracket a bit.
     if shuffle:
-        shuffled_seeds = shuffle_seeds.get_shuffled_seeds(len(participants))
+        shuffled_seeds = shuffle_seeds.get_shuffled_seeds(len(participants),
+                                                          rng)
         sorted_participants = _sort_by_seeds(sorted_participants, shuffled_seeds)
 
     return sorted_participants, players_unknown
 
 
-def update_seeds(tourney_url, sorted_participants):
-    """This is a helper function to be called from the webapp."""
+def _timed(timings, stage, fn, *args, **kwargs):
+    """Calls fn, recording how many seconds it took in timings[stage] if
+    timings isn't None."""
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if timings is not None:
+            timings[stage] = time.perf_counter() - start
+
+
+def seed_tournament(tourney_url, region, shuffle, cache=None, fuzzy=False,
+                    source=None, rng=None, history=None,
+                    new_participants_only=False, timings=None):
+    """
+    @params: same as argparse params
+    @param cache: optional rankings_cache.RankingsCache to read gaR PR
+        rankings from.
+    @param source: optional ranking_sources.RankingSource to read rankings
+        from instead of gaR PR.
+    @param rng: optional random.Random to shuffle with.
+    @param history: optional seeding_history.SeedingHistory with the last
+        seeding applied to the tournament.
+    @param new_participants_only: if the tournament has been seeded before
+        according to |history|, only slot in the participants who've
+        registered since then at their gaR PR seed, keeping everybody else in
+        the order they're in now within their shuffle bucket. |shuffle| is
+        ignored in this case.
+    @param timings: optional dictionary to record how many seconds each stage
+        took in, keyed by STAGES.
+
+    @returns: a tuple consisting of:
+        * List of participants sorted by seed, ascending.
+        * List of players whose rank could not be found, along with what
+            rank they were seeded.
+
+    """
+    start = time.perf_counter()
     tourney_name = util_challonge.extract_tourney_name(tourney_url)
-    for seed, participant in enumerate(sorted_participants, 1):
-        challonge.participants.update(tourney_name, participant["id"], seed=seed)
+    if source is None:
+        source = ranking_sources.HttpRankingSource(region, cache)
+    client = util_challonge.get_client()
+
+    # The rankings don't depend on anything from Challonge, so fetch them
+    # while we look up the tournament and its participants.
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        rankings_future = executor.submit(_timed, timings, "rankings",
+                                          source.prefetch)
+        # Seed updates are planned from the participants' current order, so
+        # this can't be a cached response that misses changes made on
+        # Challonge since.
+        participants_future = executor.submit(
+            _timed, timings, "participants", client.participants.index,
+            tourney_name, fresh=True)
+
+        # Make sure the tournament exists.
+        if not _timed(timings, "tourney_info", util_challonge.get_tourney_info,
+                      tourney_name):
+            raise NoSuchTournamentError("No tourney exists at {0}."
+                                        .format(tourney_url))
+        participants = participants_future.result()
+        rankings_future.result()
+
+    # Get the seeds for the participants.
+    participants = sorted(participants, key=lambda x: x["seed"])
+    participant_names = [util_challonge.get_participant_name(x) for x in participants]
+    ranks = _timed(timings, "matching", garpr_seeds.get_garpr_ranks,
+                   participant_names, region, cache, fuzzy=fuzzy, source=source)
+
+    seeding = _timed(timings, "seeding", _seed_participants, tourney_name,
+                     participants, ranks, shuffle, rng, history,
+                     new_participants_only)
+    if timings is not None:
+        timings["total"] = time.perf_counter() - start
+    return seeding
+
+
+async def seed_tournament_async(tourney_url, region, shuffle, cache=None,
+                                fuzzy=False, source=None, rng=None,
+                                history=None, new_participants_only=False,
+                                client=None):
+    """
+    The same as seed_tournament, but for asyncio code.
+
+    @param client: optional async_challonge.AsyncChallongeClient to make
+        calls with. Defaults to one wrapping the shared client, which is
+        closed before returning.
+
+    """
+    tourney_name = util_challonge.extract_tourney_name(tourney_url)
+    if source is None:
+        source = ranking_sources.HttpRankingSource(region, cache)
+    loop = asyncio.get_event_loop()
+    with async_challonge.client_or_default(client) as client:
+        tourney_info, participants, prefetched = await asyncio.gather(
+            client.get_tourney_info(tourney_name),
+            client.participants.index(tourney_name, fresh=True),
+            loop.run_in_executor(None, source.prefetch),
+            return_exceptions=True,
+        )
+    if isinstance(tourney_info, Exception):
+        raise tourney_info
+    if not tourney_info:
+        raise NoSuchTournamentError("No tourney exists at {0}."
+                                    .format(tourney_url))
+    if isinstance(participants, Exception):
+        raise participants
+    if isinstance(prefetched, Exception):
+        raise prefetched
+
+    participants = sorted(participants, key=lambda x: x["seed"])
+    participant_names = [util_challonge.get_participant_name(x) for x in participants]
+    ranks = await loop.run_in_executor(
+        None,
+        functools.partial(garpr_seeds.get_garpr_ranks, participant_names,
+                          region, cache, fuzzy=fuzzy, source=source),
+    )
+
+    return _seed_participants(tourney_name, participants, ranks, shuffle, rng,
+                              history, new_participants_only)
+
+
+def _plan_seed_updates(sorted_participants):
+    """Plans the updates that reseed participants from seed_tournament."""
+    current_ids = [
+        x["id"] for x in sorted(sorted_participants, key=lambda x: x["seed"])
+    ]
+    return util_challonge.plan_seed_updates(
+        current_ids, [x["id"] for x in sorted_participants])
+
+
+def update_seeds(tourney_url, sorted_participants, history=None):
+    """
+    Reseeds the participants on Challonge, only updating the participants
+    that need to move.
+
+    @param sorted_participants: participants from seed_tournament, sorted by
+        their new seeds. Their "seed" is still their seed on Challonge.
+    @param history: optional seeding_history.SeedingHistory to save the new
+        seeding to.
+
+    @returns: the number of participants that were updated.
+
+    """
+    tourney_name = util_challonge.extract_tourney_name(tourney_url)
+    client = util_challonge.get_client()
+    updates = _plan_seed_updates(sorted_participants)
+    for participant_id, seed in updates:
+        client.participants.update(tourney_name, participant_id, seed=seed)
+    if history:
+        history.save(tourney_name, [x["id"] for x in sorted_participants])
+    return len(updates)
+
+
+async def update_seeds_async(tourney_url, sorted_participants, history=None,
+                             client=None):
+    """
+    The same as update_seeds, but doesn't block the event loop, so several
+    tournaments can be reseeded at once.
+
+    The updates to one tournament are still made one at a time, since each
+    one shifts the seeds of the participants in between.
+
+    @param client: optional async_challonge.AsyncChallongeClient to make
+        calls with. Defaults to one wrapping the shared client, which is
+        closed before returning.
+
+    """
+    tourney_name = util_challonge.extract_tourney_name(tourney_url)
+    updates = _plan_seed_updates(sorted_participants)
+    with async_challonge.client_or_default(client) as client:
+        for participant_id, seed in updates:
+            await client.participants.update(tourney_name, participant_id,
+                                             seed=seed)
+    if history:
+        history.save(tourney_name, [x["id"] for x in sorted_participants])
+    return len(updates)
 
 
 if __name__ == "__main__":
@@ -118,28 +361,128 @@ if __name__ == "__main__":
         help="the region from which the gaR PR rankings "
         "should be pulled from. For example, in the "
         "URL http://garpr.com/googlemtv/players, the "
-        "region is 'googlemtv'",
+        "region is 'googlemtv'. Separate several regions with commas to "
+        "merge their rankings, e.g. 'norcal,googlemtv'",
+    )
+    argparser.add_argument(
+        "--cache_dir",
+        default=defaults.DEFAULT_RANKINGS_CACHE_DIR,
+        help="the directory to cache gaR PR rankings in",
+    )
+    argparser.add_argument(
+        "--cache_ttl",
+        type=int,
+        default=defaults.DEFAULT_RANKINGS_CACHE_TTL,
+        help="the number of seconds to use cached rankings before checking "
+        "gaR PR for newer ones. Use 0 to always check",
+    )
+    argparser.add_argument(
+        "--offline",
+        action="store_true",
+        help="only use cached gaR PR rankings without contacting gaR PR",
+    )
+    argparser.add_argument(
+        "--rankings_source",
+        default=None,
+        help="a SQLite database (.db), JSON or CSV file to read rankings from "
+        "instead of gaR PR. See ranking_sources.py",
+    )
+    argparser.add_argument(
+        "--fuzzy",
+        action="store_true",
+        help="match participants whose names aren't exactly on gaR PR to "
+        "the most similar tag, e.g. 'Mang0' to 'Mango'",
     )
     argparser.add_argument(
         "--shuffle",
         action="store_true",
         help="shuffles the seeds after seeding with gaR PR",
     )
+    argparser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="seed for random number generation when shuffling",
+    )
+    argparser.add_argument(
+        "--new_participants_only",
+        action="store_true",
+        help="if the tournament was seeded before, only slot in participants "
+        "who registered since then at their gaR PR seed, keeping everybody "
+        "else in their current order within their shuffle bucket",
+    )
+    argparser.add_argument(
+        "--history_dir",
+        default=defaults.DEFAULT_SEEDING_HISTORY_DIR,
+        help="the directory to save the seedings applied to tournaments in",
+    )
+    argparser.add_argument(
+        "--show_timings",
+        action="store_true",
+        help="print how long each stage of seeding took",
+    )
     argparser.add_argument(
         "--print_only",
         action="store_true",
         help="just prints the seeds without changing the tournament",
     )
+    argparser.add_argument(
+        "--record",
+        default=None,
+        help="record every Challonge and gaR PR response to this cassette file, to "
+        "replay later with --replay. See http_replay.py",
+    )
+    argparser.add_argument(
+        "--replay",
+        default=None,
+        help="answer every Challonge and gaR PR request from a cassette recorded with "
+        "--record instead of the network. No credentials are needed",
+    )
+    argparser.add_argument(
+        "--replay_realtime",
+        action="store_true",
+        help="with --replay, take as long to answer each request as the "
+        "recorded request took, instead of answering straight away",
+    )
     args = argparser.parse_args()
 
+    http_replay.install(args.record, args.replay, args.replay_realtime)
+
     # Read config info.
-    initialized = util_challonge.set_challonge_credentials_from_config(args.config_file)
-    if not initialized:
-        sys.exit(1)
+    if not args.replay:
+        initialized = util_challonge.set_challonge_credentials_from_config(
+            args.config_file)
+        if not initialized:
+            sys.exit(1)
+
+    cache = None
+    if not args.record and not args.replay:
+        # Cached rankings would keep gaR PR out of recordings, and make
+        # replays depend on what happens to be cached.
+        cache = rankings_cache.RankingsCache(
+            args.cache_dir, ttl=args.cache_ttl, offline=args.offline
+        )
+    source = None
+    if args.rankings_source:
+        source = ranking_sources.open_ranking_source(args.rankings_source)
+    history = seeding_history.SeedingHistory(args.history_dir)
+    timings = {}
+    sorted_participants, unknown_players = seed_tournament(
+        args.tourney_name,
+        args.region,
+        args.shuffle,
+        cache,
+        args.fuzzy,
+        source,
+        random.Random(args.seed),
+        history,
+        args.new_participants_only,
+        timings,
+    )
 
-    sorted_participants, unknown_players = seed_tournament(args.tourney_name,
-                                                           args.region,
-                                                           args.shuffle)
+    if args.show_timings:
+        for stage in STAGES:
+            print("{0}: {1:.3f}s".format(stage, timings[stage]))
 
     for player in unknown_players:
         print("Could not find gaR PR info for {name}, seeding {seed}"
@@ -149,8 +492,12 @@ if __name__ == "__main__":
         print(
             "{0}. {1}".format(seed, util_challonge.get_participant_name(participant))
         )
-        if not args.print_only:
-            challonge.participants.update(tourney_name, participant["id"], seed=seed)
 
     if not args.print_only:
-        print("Tournament updated; see seeds at {0}/participants.".format(tourney_url))
+        num_updated = update_seeds(args.tourney_name, sorted_participants,
+                                   history)
+        print("Tournament updated ({0} participants moved); see seeds at "
+              "{1}/participants.".format(
+                  num_updated,
+                  util_challonge.tourney_name_to_url(
+                      util_challonge.extract_tourney_name(args.tourney_name))))
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+
+"""Records HTTP responses from Challonge and gaR PR, and replays them.
+
+Benchmarking or regression testing a whole flow, like seeding a tournament,
+against the real APIs is slow, noisy and changes the tournament. Instead, run
+the flow once with a RecordingSession to save every response into a cassette
+file, then run it again as often as you like with a ReplaySession, which
+answers the same requests from the cassette without touching the network,
+either straight away or taking as long as the real requests took.
+
+The command line tools take --record and --replay flags that do this, e.g.
+
+  python garpr_seeds_challonge.py mtvmelee72 --seed=1 --shuffle \
+      --record=mtvmelee72.json.gz
+  python garpr_seeds_challonge.py mtvmelee72 --seed=1 --shuffle \
+      --replay=mtvmelee72.json.gz
+
+Cassettes are compact JSON, gzipped if their name ends in ".gz". They never
+contain your Challonge credentials, but they do contain everything Challonge
+sent back, so think before sharing them.
+"""
+
+
+import atexit
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+import requests.exceptions
+import requests.structures
+
+import garpr_seeds
+import util_challonge
+
+
+# The version of the cassette format.
+CASSETTE_VERSION = 1
+
+# Keys in a cassette.
+_CASSETTE_VERSION = "version"
+_CASSETTE_INTERACTIONS = "interactions"
+
+# Keys in a recorded interaction.
+_INTERACTION_METHOD = "method"
+_INTERACTION_URL = "url"
+_INTERACTION_PARAMS = "params"
+_INTERACTION_STATUS = "status"
+_INTERACTION_HEADERS = "headers"
+_INTERACTION_ELAPSED = "elapsed"
+_INTERACTION_JSON = "json"
+_INTERACTION_TEXT = "text"
+
+# The response headers our code reads. Nothing else is worth recording.
+_RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Retry-After")
+
+
+class ReplayMissError(Exception):
+    """Raised when a request being replayed isn't in the cassette."""
+
+
+class RecordedResponse(object):
+    """A response read back from a cassette.
+
+    It has the parts of a requests.Response that this project uses.
+
+    Args:
+      status_code: The HTTP status of the response.
+      headers: A dictionary of response headers.
+      content: The body of the response, in bytes.
+      url: The URL that was requested.
+    """
+
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self.content), chunk_size):
+            chunk = self.content[start:start + chunk_size]
+            yield chunk.decode("utf-8") if decode_unicode else chunk
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise requests.exceptions.HTTPError(
+                "{0} Error for url: {1}".format(self.status_code, self.url),
+                response=self,
+            )
+
+    def close(self):
+        pass
+
+
+def _get_request_params(params, data):
+    """Gets the parameters of a request in the form they're recorded in.
+
+    Returns:
+      A list of [key, value] pairs with the values as strings, which is how
+      they'd be sent.
+    """
+    pairs = []
+    for request_params in (params, data):
+        if not request_params:
+            continue
+        if isinstance(request_params, dict):
+            request_params = request_params.items()
+        pairs.extend([str(key), str(value)] for key, value in request_params)
+    return pairs
+
+
+def _get_request_key(method, url, params):
+    """Gets the key that a request is replayed by."""
+    return (method.upper(), url, tuple(tuple(x) for x in params))
+
+
+def load_cassette(filename):
+    """Loads the interactions recorded in a cassette.
+
+    Raises:
+      ValueError: If the file isn't a cassette this version can read.
+
+    Returns:
+      A list of interaction dictionaries, in the order they were recorded.
+    """
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt", encoding="utf-8") as cassette_file:
+        cassette = json.load(cassette_file)
+    if (not isinstance(cassette, dict)
+            or cassette.get(_CASSETTE_VERSION) != CASSETTE_VERSION):
+        raise ValueError("{0} is not a version {1} cassette".format(
+            filename, CASSETTE_VERSION))
+    return cassette[_CASSETTE_INTERACTIONS]
+
+
+def save_cassette(filename, interactions):
+    """Saves interactions to a cassette, gzipped if the name ends in ".gz"."""
+    cassette = {
+        _CASSETTE_VERSION: CASSETTE_VERSION,
+        _CASSETTE_INTERACTIONS: interactions,
+    }
+
+    # Write to a temporary file first so that a crash halfway through
+    # doesn't leave a corrupt cassette behind.
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        os.close(fd)
+        opener = gzip.open if filename.endswith(".gz") else open
+        with opener(temp_filename, "wt", encoding="utf-8") as cassette_file:
+            json.dump(cassette, cassette_file, separators=(",", ":"))
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+
+class RecordingSession(object):
+    """Makes requests with a real session and records their responses.
+
+    It can stand in for a requests.Session (as a ChallongeClient's session) or
+    for the requests module (as garpr_seeds.http_session). Recorded responses
+    are read in full, so streaming requests are still made but no longer
+    stream.
+
+    Args:
+      session: The requests.Session to make requests with. Defaults to a new
+               one.
+      clock: A function that returns the current time in seconds.
+    """
+
+    def __init__(self, session=None, clock=time.monotonic):
+        self._session = session or requests.Session()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.interactions = []
+
+    @property
+    def auth(self):
+        return self._session.auth
+
+    @auth.setter
+    def auth(self, auth):
+        self._session.auth = auth
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        started_at = self._clock()
+        response = self._session.request(method, url, params=params, data=data,
+                                         **kwargs)
+        content = response.content
+        elapsed = self._clock() - started_at
+
+        interaction = {
+            _INTERACTION_METHOD: method.upper(),
+            _INTERACTION_URL: url,
+            _INTERACTION_PARAMS: _get_request_params(params, data),
+            _INTERACTION_STATUS: response.status_code,
+            _INTERACTION_HEADERS: {
+                key: response.headers[key]
+                for key in _RECORDED_HEADERS if key in response.headers
+            },
+            _INTERACTION_ELAPSED: round(elapsed, 4),
+        }
+        # JSON bodies are stored as JSON so the cassette can be minified
+        # along with them.
+        try:
+            interaction[_INTERACTION_JSON] = json.loads(content.decode("utf-8"))
+        except ValueError:
+            interaction[_INTERACTION_TEXT] = content.decode("utf-8", "replace")
+
+        with self._lock:
+            self.interactions.append(interaction)
+        return _get_recorded_response(interaction)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def mount(self, prefix, adapter):
+        self._session.mount(prefix, adapter)
+
+    def save(self, filename):
+        """Saves everything recorded so far to a cassette."""
+        with self._lock:
+            interactions = list(self.interactions)
+        save_cassette(filename, interactions)
+
+    def close(self):
+        self._session.close()
+
+
+def _get_recorded_response(interaction):
+    """Makes the response for a recorded interaction."""
+    if _INTERACTION_JSON in interaction:
+        content = json.dumps(interaction[_INTERACTION_JSON]).encode("utf-8")
+    else:
+        content = interaction.get(_INTERACTION_TEXT, "").encode("utf-8")
+    return RecordedResponse(
+        interaction[_INTERACTION_STATUS],
+        interaction[_INTERACTION_HEADERS],
+        content,
+        interaction[_INTERACTION_URL],
+    )
+
+
+class ReplaySession(object):
+    """Answers requests from recorded interactions instead of the network.
+
+    Each request is answered by the first unused interaction with the same
+    method, URL and parameters, so a request made several times gets its
+    recorded responses in the order they came. Request headers and
+    credentials are ignored.
+
+    Args:
+      interactions: The interactions to replay, e.g. from load_cassette.
+      realtime: Whether to take as long to answer each request as the
+                recorded request took. Otherwise requests are answered
+                straight away.
+      sleep: A function that waits for some number of seconds.
+    """
+
+    def __init__(self, interactions, realtime=False, sleep=time.sleep):
+        self.realtime = realtime
+        self.auth = None
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._interactions = {}
+        for interaction in interactions:
+            key = _get_request_key(
+                interaction[_INTERACTION_METHOD],
+                interaction[_INTERACTION_URL],
+                interaction[_INTERACTION_PARAMS],
+            )
+            self._interactions.setdefault(key, []).append(interaction)
+
+    @property
+    def num_remaining(self):
+        """How many recorded interactions haven't been replayed yet."""
+        with self._lock:
+            return sum(len(x) for x in self._interactions.values())
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        key = _get_request_key(method, url, _get_request_params(params, data))
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise ReplayMissError(
+                    "No recorded response left for {0} {1} {2}".format(
+                        key[0], url, list(key[2])))
+            interaction = interactions.pop(0)
+
+        if self.realtime:
+            self._sleep(interaction[_INTERACTION_ELAPSED])
+        return _get_recorded_response(interaction)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
+
+
+class _VirtualClock(object):
+    """A clock that only moves when something sleeps on it."""
+
+    def __init__(self):
+        self._now = 0.0
+        self._lock = threading.Lock()
+
+    def time(self):
+        with self._lock:
+            return self._now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._now += max(0, seconds)
+
+
+def install(record_filename=None, replay_filename=None, realtime=False):
+    """Sends the Challonge and gaR PR requests of this program through a
+    RecordingSession or ReplaySession.
+
+    This replaces the shared Challonge client and garpr_seeds.http_session.
+    When replaying straight away, the client still paces and retries requests
+    like it would have, but on a virtual clock, so it never waits.
+
+    Args:
+      record_filename: A cassette to record every response to. It's saved
+                       when the program exits.
+      replay_filename: A cassette to answer every request from.
+      realtime: When replaying, whether to take as long as the recorded
+                requests took, including any time spent waiting on the
+                rate limit.
+
+    Returns:
+      The session that was installed, or None if no filename was given.
+    """
+    if replay_filename:
+        session = ReplaySession(load_cassette(replay_filename), realtime)
+        if realtime:
+            client = util_challonge.ChallongeClient(session=session)
+        else:
+            clock = _VirtualClock()
+            scheduler = util_challonge.RequestScheduler(clock=clock.time,
+                                                        sleep=clock.sleep)
+            client = util_challonge.ChallongeClient(session=session,
+                                                    scheduler=scheduler)
+    elif record_filename:
+        session = RecordingSession()
+        client = util_challonge.ChallongeClient(session=session)
+        # Save even if the program exits with an error, since what was
+        # recorded up to it is still worth replaying.
+        atexit.register(session.save, record_filename)
+    else:
+        return None
+
+    util_challonge.set_client(client)
+    garpr_seeds.http_session = session
+    return session
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+
+"""Places that player rankings can be read from.
+
+By default, rankings come straight from gaR PR, but seeding can also use
+rankings that you maintain yourself in a JSON file, a CSV file or a SQLite
+database.
+
+Examples:
+
+  1. python ranking_sources.py rankings.db --region=norcal
+
+Copies the current norcal rankings from gaR PR into a SQLite database, which
+can then be used to seed with --rankings_source=rankings.db.
+
+  2. python ranking_sources.py rankings.db --from_file=my_rankings.csv
+
+Copies rankings from a CSV file with "name" and "rank" columns into a SQLite
+database.
+"""
+
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+
+import defaults
+import garpr_seeds
+import rankings_cache
+
+
+# SQLite limits how many parameters a query can have, so huge lists of names
+# are looked up in batches of this size.
+_MAX_SQLITE_PARAMS = 900
+
+_SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+class RankingSource(object):
+    """A source of player rankings.
+
+    Subclasses need to implement get_rankings, and can override find_rankings
+    if they have a faster way to look up a list of names.
+    """
+
+    def get_rankings(self):
+        """Gets every ranking in the source.
+
+        Returns:
+          A list of ranking objects with at least "name" and "rank" keys,
+          ordered from first to last place.
+        """
+        raise NotImplementedError()
+
+    def prefetch(self):
+        """Does any slow work needed before rankings can be looked up.
+
+        This lets callers load the rankings in the background while they wait
+        on something else.
+        """
+        self.get_rankings()
+
+    def find_rankings(self, names):
+        """Finds the rankings for a list of names.
+
+        Names are matched the same way as garpr_seeds._find_ranking_for_name.
+
+        Args:
+          names: A list of player names.
+
+        Returns:
+          A list with the ranking object for each name, or None for names that
+          aren't ranked.
+        """
+        alias_index = garpr_seeds._build_alias_index(self.get_rankings())
+        return [alias_index.get(name.lower()) for name in names]
+
+
+class HttpRankingSource(RankingSource):
+    """Rankings from one or more gaR PR regions.
+
+    Args:
+      region: The gaR PR region(s) to pull rankings from, in any form accepted
+              by garpr_seeds.get_garpr_ranks.
+      cache: An optional rankings_cache.RankingsCache to read the rankings
+             from.
+    """
+
+    def __init__(self, region, cache=None):
+        self._region = region
+        self._cache = cache
+        self._rankings = None
+
+    def get_rankings(self):
+        if self._rankings is None:
+            self._rankings = garpr_seeds._fetch_rankings_for_regions(
+                self._region, self._cache
+            )
+        return self._rankings
+
+
+class FileRankingSource(RankingSource):
+    """Rankings from a JSON or CSV file.
+
+    JSON files can either be a saved gaR PR rankings response or just a list of
+    rankings. CSV files need a header row with "name" and "rank" columns.
+
+    Args:
+      filename: The file to read rankings from.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._rankings = None
+
+    def _read_rankings(self):
+        """Reads the rankings from the file, sorted by rank."""
+        with open(self._filename, newline="") as rankings_file:
+            if self._filename.lower().endswith(".csv"):
+                rankings = [
+                    dict(row, rank=int(row["rank"]))
+                    for row in csv.DictReader(rankings_file)
+                ]
+            else:
+                rankings = json.load(rankings_file)
+                if isinstance(rankings, dict):
+                    rankings = rankings["ranking"]
+        return sorted(rankings, key=lambda x: x["rank"])
+
+    def get_rankings(self):
+        if self._rankings is None:
+            self._rankings = self._read_rankings()
+        return self._rankings
+
+
+class SqliteRankingSource(RankingSource):
+    """Rankings from a SQLite database.
+
+    Every tag a player goes by is stored lowercased in an indexed alias table,
+    so a whole list of names is looked up with a single query instead of
+    loading every ranking.
+
+    Args:
+      filename: The SQLite database file. Use create_tables and add_rankings
+                to fill in a new database.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+
+    def _connect(self):
+        return sqlite3.connect(self._filename)
+
+    def create_tables(self):
+        """Creates the ranking tables if they don't already exist."""
+        with self._connect() as connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS rankings (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    rank INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS aliases (
+                    alias TEXT PRIMARY KEY,
+                    ranking_id INTEGER NOT NULL REFERENCES rankings(id)
+                );
+                """
+            )
+        connection.close()
+
+    def add_rankings(self, rankings):
+        """Replaces the rankings in the database.
+
+        Args:
+          rankings: A list of ranking objects, ordered from first to last.
+                    If several rankings share a tag, the first one wins, the
+                    same as garpr_seeds._build_alias_index.
+        """
+        with self._connect() as connection:
+            connection.execute("DELETE FROM aliases")
+            connection.execute("DELETE FROM rankings")
+            for ranking in rankings:
+                cursor = connection.execute(
+                    "INSERT INTO rankings (name, rank) VALUES (?, ?)",
+                    (ranking["name"], ranking["rank"]),
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO aliases (alias, ranking_id) VALUES (?, ?)",
+                    [
+                        (alias, cursor.lastrowid)
+                        for alias in garpr_seeds._get_garpr_names(
+                            ranking["name"].lower()
+                        )
+                    ],
+                )
+        connection.close()
+
+    def prefetch(self):
+        # Lookups go straight to the database, so there's nothing to load.
+        pass
+
+    def get_rankings(self):
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT name, rank FROM rankings ORDER BY rank, id"
+            ).fetchall()
+        finally:
+            connection.close()
+        return [{"name": name, "rank": rank} for name, rank in rows]
+
+    def find_rankings(self, names):
+        aliases = [name.lower() for name in names]
+        unique_aliases = list(set(aliases))
+
+        rankings_for_aliases = {}
+        connection = self._connect()
+        try:
+            for i in range(0, len(unique_aliases), _MAX_SQLITE_PARAMS):
+                batch = unique_aliases[i:i + _MAX_SQLITE_PARAMS]
+                rows = connection.execute(
+                    "SELECT aliases.alias, rankings.name, rankings.rank "
+                    "FROM aliases JOIN rankings ON aliases.ranking_id = rankings.id "
+                    "WHERE aliases.alias IN ({0})".format(", ".join("?" * len(batch))),
+                    batch,
+                )
+                for alias, name, rank in rows:
+                    rankings_for_aliases[alias] = {"name": name, "rank": rank}
+        finally:
+            connection.close()
+
+        return [rankings_for_aliases.get(alias) for alias in aliases]
+
+
+def open_ranking_source(filename):
+    """Opens a file of rankings as a ranking source.
+
+    Args:
+      filename: A SQLite database (.db, .sqlite or .sqlite3), or a JSON or CSV
+                file of rankings.
+
+    Raises:
+      ValueError: If the file doesn't exist.
+
+    Returns:
+      A RankingSource for the file.
+    """
+    if not os.path.exists(filename):
+        raise ValueError("No rankings file exists at {0}.".format(filename))
+
+    if filename.lower().endswith(_SQLITE_EXTENSIONS):
+        return SqliteRankingSource(filename)
+    return FileRankingSource(filename)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Copies rankings into a SQLite database for seeding.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    argparser.add_argument("database", help="the SQLite database to write to")
+    argparser.add_argument(
+        "--region",
+        default=defaults.DEFAULT_REGION,
+        help="the gaR PR region(s) to copy rankings from",
+    )
+    argparser.add_argument(
+        "--from_file",
+        default=None,
+        help="a JSON or CSV file to copy rankings from instead of gaR PR",
+    )
+    args = argparser.parse_args()
+
+    if args.from_file:
+        source = open_ranking_source(args.from_file)
+    else:
+        source = HttpRankingSource(args.region, rankings_cache.RankingsCache())
+
+    database = SqliteRankingSource(args.database)
+    database.create_tables()
+    rankings = source.get_rankings()
+    database.add_rankings(rankings)
+    print("Copied {0} rankings to {1}.".format(len(rankings), args.database))
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+
+"""An on-disk cache for gaR PR rankings.
+
+Rankings only change when a region's PR is recalculated, so there's no need
+to download them every time we seed a bracket. Each region's rankings are
+saved to their own file along with the ETag and Last-Modified headers gaR PR
+sent with them. Once a cached ranking is older than the TTL we ask gaR PR
+whether it has changed, and only download it again if it has.
+
+If gaR PR can't be reached, the last rankings we got are used instead. In
+offline mode, gaR PR is never contacted at all.
+"""
+
+
+import json
+import os
+import re
+import tempfile
+import time
+
+import requests
+
+import defaults
+import rankings_stream
+
+
+# Keys in a cache file.
+_CACHE_FETCHED_AT = "fetched_at"
+_CACHE_ETAG = "etag"
+_CACHE_LAST_MODIFIED = "last_modified"
+_CACHE_RANKING = "ranking"
+_CACHE_FIELDS = "fields"
+
+
+class RankingsUnavailableError(Exception):
+    """No rankings are cached for a region and gaR PR can't be contacted."""
+
+
+class RankingsCache(object):
+    """Caches the rankings of gaR PR regions on disk.
+
+    Args:
+      cache_dir: The directory to store cached rankings in. It will be created
+                 if it doesn't exist.
+      ttl: The number of seconds that cached rankings are used before checking
+           gaR PR for newer rankings.
+      offline: If True, only cached rankings are used.
+      session: The object used to make HTTP requests, e.g. a requests.Session.
+               Only its get method is used.
+    """
+
+    def __init__(
+        self,
+        cache_dir=defaults.DEFAULT_RANKINGS_CACHE_DIR,
+        ttl=defaults.DEFAULT_RANKINGS_CACHE_TTL,
+        offline=False,
+        session=requests,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.offline = offline
+        self._session = session
+
+    def _get_cache_filename(self, region):
+        """Gets the file that a region's rankings are cached in."""
+        safe_region = re.sub(r"[^\w-]", "_", region)
+        return os.path.join(self.cache_dir, "{0}.json".format(safe_region))
+
+    def load(self, region):
+        """Loads the cached rankings for a region.
+
+        Args:
+          region: The gaR PR region.
+
+        Returns:
+          The cache entry for the region, or None if the region has no
+          rankings cached or its cache file can't be read.
+        """
+        try:
+            with open(self._get_cache_filename(region)) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, region, ranking, etag=None, last_modified=None):
+        """Saves rankings for a region to the cache.
+
+        Args:
+          region: The gaR PR region.
+          ranking: The list of gaR PR ranking objects for that region.
+          etag: The ETag header gaR PR sent with the rankings, if any.
+          last_modified: The Last-Modified header gaR PR sent with the
+                         rankings, if any.
+
+        Returns:
+          The new cache entry for the region.
+        """
+        entry = {
+            _CACHE_FETCHED_AT: time.time(),
+            _CACHE_ETAG: etag,
+            _CACHE_LAST_MODIFIED: last_modified,
+            _CACHE_RANKING: ranking,
+            _CACHE_FIELDS: list(rankings_stream.COMPACT_RANKING_FIELDS),
+        }
+
+        # Write to a temporary file first so that a crash halfway through
+        # doesn't leave a corrupt cache behind.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_filename = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump(entry, temp_file)
+            os.replace(temp_filename, self._get_cache_filename(region))
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+        return entry
+
+    def is_fresh(self, entry):
+        """Checks if a cache entry is young enough to use without revalidating.
+
+        Args:
+          entry: A cache entry returned by load.
+
+        Returns:
+          True if the entry is younger than the cache's TTL.
+        """
+        return (self.has_all_fields(entry)
+                and time.time() - entry[_CACHE_FETCHED_AT] < self.ttl)
+
+    def has_all_fields(self, entry):
+        """Checks if a cache entry has every field we keep from rankings.
+
+        Entries saved before a field was added to
+        rankings_stream.COMPACT_RANKING_FIELDS are missing it, e.g. ratings,
+        so they need to be downloaded again in full.
+
+        Args:
+          entry: A cache entry returned by load.
+
+        Returns:
+          True if the entry was saved with all of today's fields.
+        """
+        return entry.get(_CACHE_FIELDS) == list(
+            rankings_stream.COMPACT_RANKING_FIELDS)
+
+    def get_rankings(self, region, rankings_url):
+        """Gets the rankings for a region, using the cache where possible.
+
+        Args:
+          region: The gaR PR region.
+          rankings_url: The gaR PR URL to request the rankings from.
+
+        Raises:
+          RankingsUnavailableError: If no rankings are cached for the region
+            and we're in offline mode.
+          requests.exceptions.RequestException: If no rankings are cached for
+            the region and the request to gaR PR fails.
+
+        Returns:
+          The list of gaR PR ranking objects for the region, with only the
+          fields in rankings_stream.COMPACT_RANKING_FIELDS.
+        """
+        entry = self.load(region)
+        if self.offline:
+            if not entry:
+                raise RankingsUnavailableError(
+                    "No rankings are cached for {0} and we're offline.".format(region)
+                )
+            return entry[_CACHE_RANKING]
+
+        if entry and self.is_fresh(entry):
+            return entry[_CACHE_RANKING]
+
+        # Ask gaR PR to only send the rankings if they've changed since we
+        # cached them.
+        # An entry that's missing fields can't be revalidated, since a 304
+        # would leave it missing them.
+        headers = {}
+        if entry and self.has_all_fields(entry):
+            if entry[_CACHE_ETAG]:
+                headers["If-None-Match"] = entry[_CACHE_ETAG]
+            if entry[_CACHE_LAST_MODIFIED]:
+                headers["If-Modified-Since"] = entry[_CACHE_LAST_MODIFIED]
+
+        # Close the response even if it fails partway, so its pooled
+        # connection isn't leaked.
+        response = None
+        try:
+            response = self._session.get(rankings_url, headers=headers, stream=True)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.exceptions.RequestException:
+            if response is not None:
+                response.close()
+            # Stale rankings are better than no rankings.
+            if entry:
+                return entry[_CACHE_RANKING]
+            raise
+
+        try:
+            if response.status_code == 304:
+                entry = self.save(
+                    region,
+                    entry[_CACHE_RANKING],
+                    etag=entry[_CACHE_ETAG],
+                    last_modified=entry[_CACHE_LAST_MODIFIED],
+                )
+            else:
+                entry = self.save(
+                    region,
+                    rankings_stream.parse_compact_rankings(response),
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
+        finally:
+            response.close()
+        return entry[_CACHE_RANKING]
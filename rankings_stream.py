@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+
+"""Incremental parsing of gaR PR rankings payloads.
+
+A rankings payload has a full object for every ranked player, but seeding
+and simulating brackets only need each player's name, rank and rating.
+Loading the whole payload with json.loads keeps every one of those objects
+around, which adds up for rankings with tens of thousands of players. Instead,
+we parse the "ranking" array one player at a time as chunks of the response
+arrive, keeping only the fields we need.
+"""
+
+
+import codecs
+import json
+import re
+
+
+# The fields of each ranking that seeding and simulate_bracket actually use.
+COMPACT_RANKING_FIELDS = ("name", "rank", "rating")
+
+# How many bytes of a response to read at a time.
+CHUNK_SIZE = 64 * 1024
+
+_RANKING_ARRAY_START = re.compile(r'"ranking"\s*:\s*\[')
+_WHITESPACE_AND_COMMAS = re.compile(r"[\s,]*")
+
+
+def _decode_chunks(chunks):
+    """Decodes chunks of a UTF-8 response into text.
+
+    Args:
+      chunks: An iterable of bytes or str chunks.
+
+    Yields:
+      The chunks as strings. Multi-byte characters split across chunks are
+      handled properly.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    yield decoder.decode(b"", final=True)
+
+
+def iter_compact_rankings(chunks, fields=COMPACT_RANKING_FIELDS):
+    """Parses the rankings out of a gaR PR rankings payload incrementally.
+
+    Args:
+      chunks: An iterable of bytes or str chunks that together make up the
+              JSON response from gaR PR's /rankings endpoint, e.g.
+              response.iter_content(CHUNK_SIZE).
+      fields: The fields to keep from each ranking.
+
+    Raises:
+      ValueError: If the payload has no "ranking" array or is cut off.
+
+    Yields:
+      A dictionary for each ranking in the payload, in order, with only the
+      given fields.
+    """
+    decoder = json.JSONDecoder()
+    text_chunks = _decode_chunks(chunks)
+    buffer = ""
+
+    def read_more():
+        """Appends the next chunk to the buffer, returning False at the end."""
+        nonlocal buffer
+        for chunk in text_chunks:
+            if chunk:
+                buffer += chunk
+                return True
+        return False
+
+    # Skip ahead to the start of the ranking array. We hang on to a bit of
+    # the buffer in case the key is split across chunks.
+    while True:
+        match = _RANKING_ARRAY_START.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        buffer = buffer[-16:]
+        if not read_more():
+            raise ValueError("No ranking array in the gaR PR rankings payload.")
+
+    pos = 0
+    while True:
+        pos = _WHITESPACE_AND_COMMAS.match(buffer, pos).end()
+        if pos == len(buffer):
+            buffer, pos = "", 0
+            if not read_more():
+                raise ValueError("The gaR PR rankings payload was cut off.")
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            ranking, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            # We only have part of this ranking so far. Drop everything before
+            # it so the buffer doesn't keep growing.
+            buffer, pos = buffer[pos:], 0
+            if not read_more():
+                raise
+            continue
+
+        yield {field: ranking[field] for field in fields if field in ranking}
+
+
+def parse_compact_rankings(response):
+    """Parses the rankings out of a streamed gaR PR response.
+
+    Args:
+      response: A requests.Response for gaR PR's /rankings endpoint, requested
+                with stream=True.
+
+    Returns:
+      A list of compact ranking dictionaries, as yielded by
+      iter_compact_rankings.
+    """
+    return list(iter_compact_rankings(response.iter_content(CHUNK_SIZE)))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+
+"""Remembers the seedings we've applied to Challonge tournaments.
+
+Seeding a tournament again after more people register would normally reseed
+everybody from scratch, throwing away any shuffle. To only slot in the new
+registrants, we need to know who was there the last time the tournament was
+seeded, so each tournament's last applied seeding is saved to its own file.
+"""
+
+
+import json
+import os
+import re
+import tempfile
+import time
+
+import defaults
+
+
+# Keys in a history file.
+_HISTORY_SEEDED_AT = "seeded_at"
+_HISTORY_PARTICIPANT_IDS = "participant_ids"
+
+
+class SeedingHistory(object):
+    """Saves the last seeding applied to each tournament on disk.
+
+    Args:
+      history_dir: The directory to store seedings in. It will be created if
+                   it doesn't exist.
+    """
+
+    def __init__(self, history_dir=defaults.DEFAULT_SEEDING_HISTORY_DIR):
+        self.history_dir = history_dir
+
+    def _get_history_filename(self, tourney_name):
+        """Gets the file that a tournament's seeding is saved in."""
+        safe_tourney_name = re.sub(r"[^\w-]", "_", tourney_name)
+        return os.path.join(self.history_dir, "{0}.json".format(safe_tourney_name))
+
+    def load(self, tourney_name):
+        """Loads the last seeding applied to a tournament.
+
+        Args:
+          tourney_name: The name of the tournament, e.g. "mtvmelee72".
+
+        Returns:
+          The Challonge IDs of the participants from 1st seed to last, or None
+          if the tournament hasn't been seeded or its file can't be read.
+        """
+        try:
+            with open(self._get_history_filename(tourney_name)) as history_file:
+                return json.load(history_file)[_HISTORY_PARTICIPANT_IDS]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, tourney_name, participant_ids):
+        """Saves the seeding applied to a tournament.
+
+        Args:
+          tourney_name: The name of the tournament, e.g. "mtvmelee72".
+          participant_ids: The Challonge IDs of the participants from 1st seed
+                           to last.
+        """
+        entry = {
+            _HISTORY_SEEDED_AT: time.time(),
+            _HISTORY_PARTICIPANT_IDS: list(participant_ids),
+        }
+
+        # Write to a temporary file first so that a crash halfway through
+        # doesn't leave a corrupt file behind.
+        os.makedirs(self.history_dir, exist_ok=True)
+        fd, temp_filename = tempfile.mkstemp(dir=self.history_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump(entry, temp_file)
+            os.replace(temp_filename, self._get_history_filename(tourney_name))
+        except BaseException:
+            os.remove(temp_filename)
+            raise
@@ -22,15 +22,39 @@ listed.
 Returns the newly shuffled order of participants from a list of participant names.
 Participants should be ordered from 1st seed to last seed. Leading and trailing
 spaces in the participant names are stripped.
+
+3. python shuffle_seeds.py "Neal, Bryan, Paragon, gaR, Eden" --avoid "gaR, Eden"
+
+Shuffles the participants, searching for a shuffle where participants in the
+same group don't play each other in the first couple of rounds.
 """
 
 import argparse
+import bisect
+import functools
+import math
 import numbers
 import random
 import sys
 
 import util
 
+# NumPy is optional. Without it, batches of seedings are generated one at a
+# time in pure Python.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# How much a conflict counts for in each of the early winner's rounds that
+# get_conflict_avoiding_seeds looks at, starting from round 1.
+_CONFLICT_ROUND_WEIGHTS = (2, 1)
+
+# Settings for the simulated annealing in get_conflict_avoiding_seeds.
+DEFAULT_NUM_ITERATIONS = 20000
+_INITIAL_TEMPERATURE = 2.0
+_FINAL_TEMPERATURE = 0.05
+
 
 def _get_num_participants_in_first_round(num_participants):
     """Gets the number of people in the first round of a tourney.
@@ -79,9 +103,12 @@ def get_num_participants_placing_last(num_participants, double_elimination=True)
     if num_participants == 1:
         return 1
 
-    # <= 4 is a bit of a weird case, so we handle it specially.
-    # TODO: reason through what's making the bucket size zero for the value 4,
-    # too tired ATM
+    # Tiny brackets are handled specially. With two people, the loser of the
+    # only winner's match goes straight to grand finals, so nobody plays in a
+    # first loser's round and the math below comes out as zero. Up to four
+    # people, exactly one person is knocked out per loser's round.
+    # bracket.DoubleEliminationBracket plays out every bracket size match by
+    # match, and agrees with these numbers.
     if num_participants <= 4:
         return 1 if double_elimination else 2
 
@@ -104,6 +131,53 @@ def get_num_participants_placing_last(num_participants, double_elimination=True)
     return num_losing_in_first_losers_round
 
 
+@functools.lru_cache(maxsize=None)
+def get_bucket_boundaries(num_participants):
+    """Gets the top seed of each bucket for a tourney with num_participants.
+
+    See _get_bucket_sizes for what a bucket is. The table is computed once per
+    number of participants and reused, and since the buckets below the last
+    place bucket are just the buckets for a smaller tourney, computing the
+    table for one size fills in most of the work for smaller sizes too.
+
+    e.g. 9 => (1, 2, 3, 4, 5, 7, 9)
+
+    Args:
+      num_participants: The number of participants in the tourney.
+
+    Returns:
+      A tuple with the top seed of each bucket, ordered from first place to
+      last place. Bucket i holds the seeds from boundaries[i] up to (but not
+      including) boundaries[i + 1], and the last bucket goes up to
+      num_participants.
+    """
+    if num_participants <= 0:
+        return ()
+
+    # The last place bucket sits below the buckets of a tourney with everyone
+    # else in it.
+    bucket_size = get_num_participants_placing_last(num_participants)
+    num_remaining = num_participants - bucket_size
+    return get_bucket_boundaries(num_remaining) + (num_remaining + 1,)
+
+
+def get_bucket_index(num_participants, seed):
+    """Gets the bucket that a seed falls into, in O(log N) time.
+
+    Args:
+      num_participants: The number of participants in the tourney.
+      seed: A seed from 1 to num_participants.
+
+    Returns:
+      The index of the seed's bucket, counting from the first place bucket
+      at 0.
+    """
+    if not 1 <= seed <= num_participants:
+        raise ValueError("Invalid seed for a tourney.")
+    boundaries = get_bucket_boundaries(num_participants)
+    return bisect.bisect_right(boundaries, seed) - 1
+
+
 def _get_bucket_sizes(num_participants):
     """Get the size of buckets in which seeds can be randomized.
 
@@ -125,12 +199,13 @@ def _get_bucket_sizes(num_participants):
     # in a double-elimination bracket, so they fall into their own bucket.
     # Once those people are eliminated, the next bucket can be determined
     # by solving for a tournament without the eliminated people. This approach
-    # can be applied repeatedly to figure out all the buckets.
-    while num_participants > 0:
-        bucket_size = get_num_participants_placing_last(num_participants)
-        yield bucket_size
+    # can be applied repeatedly to figure out all the buckets, which is what
+    # get_bucket_boundaries does.
+    last_seed_in_bucket = num_participants
+    for top_seed_in_bucket in reversed(get_bucket_boundaries(num_participants)):
+        yield last_seed_in_bucket - top_seed_in_bucket + 1
 
-        num_participants = num_participants - bucket_size
+        last_seed_in_bucket = top_seed_in_bucket - 1
 
 
 def _get_buckets(num_participants):
@@ -145,14 +220,13 @@ def _get_buckets(num_participants):
       from last place (largest bucket) to first place (smallest bucket).
     """
     last_seed_in_bucket = num_participants
-    for bucket_size in _get_bucket_sizes(num_participants):
-        top_seed_in_bucket = last_seed_in_bucket - bucket_size + 1
+    for top_seed_in_bucket in reversed(get_bucket_boundaries(num_participants)):
         yield list(range(top_seed_in_bucket, last_seed_in_bucket + 1))
 
         last_seed_in_bucket = top_seed_in_bucket - 1
 
 
-def get_shuffled_seeds(num_participants):
+def get_shuffled_seeds(num_participants, rng=None):
     """Get randomized seedings for a tournament with num_participants.
 
     This is not fully randomized, but instead uses a bucket approach,
@@ -162,18 +236,296 @@ def get_shuffled_seeds(num_participants):
 
     Args:
       num_participants: The number of participants in the tournament.
+      rng: The random.Random to shuffle with. Defaults to the global random
+           number generator.
 
     Returns:
       A list of seeds to use for the tournament. For a given seed X, the value
       at index X - 1 is their randomized seed to use for the tournament.
     """
-    shuffled_buckets = [util.shuffle(x) for x in _get_buckets(num_participants)]
+    shuffled_buckets = [
+        util.shuffle(x, rng) for x in _get_buckets(num_participants)
+    ]
 
     # Buckets are ordered from last place to first place, so we need to reverse
     # them to get the seeds ordered from first to last.
     return util.flatten(reversed(shuffled_buckets))
 
 
+def get_shuffled_seeds_batch(num_participants, num_seedings, rng=None):
+    """Gets many randomized seedings for a tournament at once.
+
+    Each seeding is shuffled the same way as get_shuffled_seeds, with each
+    one shuffled independently of the others. If NumPy is available, every
+    bucket is shuffled for all of the seedings at once, which is much faster
+    than generating the seedings one at a time.
+
+    Args:
+      num_participants: The number of participants in the tournament.
+      num_seedings: The number of seedings to generate.
+      rng: The random.Random to shuffle with. Defaults to the global random
+           number generator. When NumPy is used, a NumPy generator is seeded
+           from it, so the same rng state always gives the same seedings.
+
+    Returns:
+      A list of num_seedings seed lists, whether or not NumPy is available.
+      Each one is a seeding in the same format that get_shuffled_seeds
+      returns.
+    """
+    if np is None:
+        return [
+            get_shuffled_seeds(num_participants, rng) for _ in range(num_seedings)
+        ]
+
+    if rng is None:
+        rng = random
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    seedings = np.empty((num_seedings, num_participants), dtype=np.int64)
+    last_seed_in_bucket = num_participants
+    for top_seed_in_bucket in reversed(get_bucket_boundaries(num_participants)):
+        bucket_size = last_seed_in_bucket - top_seed_in_bucket + 1
+        bucket_columns = slice(top_seed_in_bucket - 1, last_seed_in_bucket)
+        if bucket_size == 1:
+            seedings[:, bucket_columns] = top_seed_in_bucket
+        else:
+            # Sorting a row of random keys gives a uniformly random permutation
+            # of that row, so this shuffles the bucket for every seeding.
+            keys = np_rng.random((num_seedings, bucket_size))
+            seedings[:, bucket_columns] = (
+                np.argsort(keys, axis=1) + top_seed_in_bucket
+            )
+
+        last_seed_in_bucket = top_seed_in_bucket - 1
+
+    return seedings.tolist()
+
+
+def _get_projected_opponent(position, round_num, num_participants):
+    """Gets who a seed is projected to play in an early winner's round.
+
+    Seeds are placed in a power-of-two-sized bracket, with byes for missing
+    seeds. In each round, the top seeds are projected to win, so the seed at
+    position X plays the seed at position (bracket size + 1 - X) of what's
+    left of the bracket.
+
+    Args:
+      position: The seed whose opponent we want.
+      round_num: The winner's round, starting from 1.
+      num_participants: The number of participants in the tourney.
+
+    Returns:
+      The seed of the projected opponent, or None if the seed isn't projected
+      to play in that round or has a bye.
+    """
+    bracket_size = 1 << max(num_participants - 1, 0).bit_length()
+    round_size = bracket_size >> (round_num - 1)
+    opponent = round_size + 1 - position
+    if position > round_size or opponent > num_participants or opponent == position:
+        return None
+    return opponent
+
+
+def parse_conflict_groups(text):
+    """Parses groups of participants who shouldn't meet early in a tourney.
+
+    e.g. "Neal, Bryan; gaR, Eden, Paragon" => [["Neal", "Bryan"],
+                                               ["gaR", "Eden", "Paragon"]]
+
+    Args:
+      text: Groups separated by semicolons, with the participants in each
+            group separated by commas.
+
+    Returns:
+      A list of groups, where each group is a list of stripped names.
+    """
+    groups = []
+    for group_text in text.split(";"):
+        group = [x.strip() for x in group_text.split(",") if x.strip()]
+        if len(group) > 1:
+            groups.append(group)
+    return groups
+
+
+def _get_conflict_weights(conflicts):
+    """Gets the weight of each pair of seeds that shouldn't meet.
+
+    Args:
+      conflicts: A list of groups of seeds, as for
+                 get_conflict_avoiding_seeds.
+
+    Returns:
+      A dictionary from (lower seed, higher seed) tuples to the number of
+      groups that pair appears in together.
+    """
+    conflict_weights = {}
+    for group in conflicts:
+        group = sorted(set(group))
+        for i, seed in enumerate(group):
+            for other_seed in group[i + 1:]:
+                pair = (seed, other_seed)
+                conflict_weights[pair] = conflict_weights.get(pair, 0) + 1
+    return conflict_weights
+
+
+def get_conflict_score(seeds, conflicts):
+    """Scores how many conflicts a seeding has in the early rounds.
+
+    Args:
+      seeds: A list of seeds, as returned by get_shuffled_seeds.
+      conflicts: A list of groups of seeds, as for
+                 get_conflict_avoiding_seeds.
+
+    Returns:
+      The total weight of the conflicting pairs who are projected to meet in
+      the first len(_CONFLICT_ROUND_WEIGHTS) winner's rounds, each weighted
+      by its entry in _CONFLICT_ROUND_WEIGHTS.
+    """
+    conflict_weights = _get_conflict_weights(conflicts)
+    num_participants = len(seeds)
+    seed_at_position = [0] * (num_participants + 1)
+    for seed, position in enumerate(seeds, 1):
+        seed_at_position[position] = seed
+
+    score = 0
+    for round_num, round_weight in enumerate(_CONFLICT_ROUND_WEIGHTS, 1):
+        for position in range(1, num_participants + 1):
+            opponent = _get_projected_opponent(position, round_num, num_participants)
+            if opponent is None or opponent < position:
+                continue
+            pair = tuple(
+                sorted((seed_at_position[position], seed_at_position[opponent]))
+            )
+            score += round_weight * conflict_weights.get(pair, 0)
+    return score
+
+
+def get_conflict_avoiding_seeds(
+    num_participants, conflicts, rng=None, num_iterations=DEFAULT_NUM_ITERATIONS
+):
+    """Gets shuffled seeds that keep conflicting participants apart early on.
+
+    Like get_shuffled_seeds, seeds are only shuffled within their buckets, so
+    projected placements are unaffected. We start from a random shuffle and
+    use simulated annealing to search for a shuffle where as few conflicting
+    participants as possible are projected to meet in the first few rounds,
+    e.g. to avoid rematches from last week or players from the same crew
+    playing each other right away.
+
+    Each step of the search swaps two seeds in the same bucket. A seed only
+    has one projected opponent per round, so the change in score from a swap
+    is worked out in constant time, without rescoring the whole bracket.
+
+    Args:
+      num_participants: The number of participants in the tournament.
+      conflicts: A list of groups of seeds, where each group is a list of
+                 participants' original seeds who shouldn't play each other.
+      rng: The random.Random to shuffle with. Defaults to the global random
+           number generator.
+      num_iterations: The maximum number of swaps to try.
+
+    Returns:
+      A list of seeds in the same format as get_shuffled_seeds, with the
+      lowest conflict score that the search found.
+    """
+    if rng is None:
+        rng = random
+
+    seeds = get_shuffled_seeds(num_participants, rng)
+    conflict_weights = _get_conflict_weights(conflicts)
+    if not conflict_weights:
+        return seeds
+
+    # seed_at_position is the inverse of seeds, with 1-based positions.
+    seed_at_position = [0] * (num_participants + 1)
+    for seed, position in enumerate(seeds, 1):
+        seed_at_position[position] = seed
+
+    opponents = [
+        [
+            _get_projected_opponent(position, round_num, num_participants)
+            for round_num in range(1, len(_CONFLICT_ROUND_WEIGHTS) + 1)
+        ]
+        for position in range(num_participants + 1)
+    ]
+
+    # Only seeds in buckets with more than one seed can be swapped.
+    bucket_ranges = {}
+    swappable_positions = []
+    last_seed_in_bucket = num_participants
+    for top_seed_in_bucket in reversed(get_bucket_boundaries(num_participants)):
+        if top_seed_in_bucket < last_seed_in_bucket:
+            for position in range(top_seed_in_bucket, last_seed_in_bucket + 1):
+                bucket_ranges[position] = (top_seed_in_bucket, last_seed_in_bucket)
+                swappable_positions.append(position)
+        last_seed_in_bucket = top_seed_in_bucket - 1
+    if not swappable_positions:
+        return seeds
+
+    def get_pair_weight(position, other_position):
+        pair = tuple(
+            sorted((seed_at_position[position], seed_at_position[other_position]))
+        )
+        return conflict_weights.get(pair, 0)
+
+    def get_local_score(positions):
+        """Scores the projected matches involving any of the positions."""
+        score = 0
+        counted_matches = set()
+        for position in positions:
+            for round_num, opponent in enumerate(opponents[position]):
+                if opponent is None:
+                    continue
+                match = (round_num, min(position, opponent))
+                if match in counted_matches:
+                    continue
+                counted_matches.add(match)
+                score += _CONFLICT_ROUND_WEIGHTS[round_num] * get_pair_weight(
+                    position, opponent
+                )
+        return score
+
+    def swap(position, other_position):
+        seed, other_seed = seed_at_position[position], seed_at_position[other_position]
+        seed_at_position[position], seed_at_position[other_position] = other_seed, seed
+
+    score = get_conflict_score(seeds, conflicts)
+    best_score = score
+    best_seed_at_position = list(seed_at_position)
+    temperature = _INITIAL_TEMPERATURE
+    cooling_rate = (_FINAL_TEMPERATURE / _INITIAL_TEMPERATURE) ** (
+        1 / max(num_iterations, 1)
+    )
+
+    for _ in range(num_iterations):
+        if best_score == 0:
+            break
+
+        position = rng.choice(swappable_positions)
+        top_seed_in_bucket, last_seed_in_bucket = bucket_ranges[position]
+        other_position = rng.randint(top_seed_in_bucket, last_seed_in_bucket - 1)
+        if other_position >= position:
+            other_position += 1
+
+        old_local_score = get_local_score((position, other_position))
+        swap(position, other_position)
+        delta = get_local_score((position, other_position)) - old_local_score
+
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            score += delta
+            if score < best_score:
+                best_score = score
+                best_seed_at_position = list(seed_at_position)
+        else:
+            swap(position, other_position)
+
+        temperature *= cooling_rate
+
+    best_seeds = [0] * num_participants
+    for position in range(1, num_participants + 1):
+        best_seeds[best_seed_at_position[position] - 1] = position
+    return best_seeds
+
+
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser(
         description="shuffles seeds while preserving project placement",
@@ -186,19 +538,46 @@ if __name__ == "__main__":
     argparser.add_argument(
         "--seed", type=int, default=None, help="seed for random number generation"
     )
+    argparser.add_argument(
+        "--avoid",
+        default=None,
+        help="groups of participants who shouldn't play each other in the "
+        "first rounds, e.g. 'Neal, Bryan; gaR, Eden, Paragon'. Groups are "
+        "separated by semicolons. Use seed numbers if you passed a number of "
+        "participants",
+    )
     args = argparser.parse_args()
 
-    if args.seed:
-        random.seed(args.seed)
+    rng = random.Random(args.seed)
 
     if args.participants.isdigit():
-        num_participants = int(args.participants)
-        print(get_shuffled_seeds(num_participants))
+        participants = [str(x) for x in range(1, int(args.participants) + 1)]
     else:
         participants = [x.strip() for x in args.participants.split(",")]
-        shuffled_seeds = get_shuffled_seeds(len(participants))
 
-        # participants[0] is the first seed, so we subtract 1 from the seed number
-        # to get the index of the participant.
-        shuffled_participants = [participants[seed - 1] for seed in shuffled_seeds]
+    if args.avoid:
+        # participants[0] is the first seed, so we add 1 to the index of each
+        # participant to get their seed.
+        seeds_for_names = {x.lower(): i for i, x in enumerate(participants, 1)}
+        conflicts = []
+        for group in parse_conflict_groups(args.avoid):
+            unknown_names = [x for x in group if x.lower() not in seeds_for_names]
+            if unknown_names:
+                sys.stderr.write(
+                    "Unknown participants: {0}\n".format(", ".join(unknown_names))
+                )
+                sys.exit(1)
+            conflicts.append([seeds_for_names[x.lower()] for x in group])
+        shuffled_seeds = get_conflict_avoiding_seeds(len(participants), conflicts, rng)
+    else:
+        shuffled_seeds = get_shuffled_seeds(len(participants), rng)
+
+    if args.participants.isdigit():
+        print(shuffled_seeds)
+    else:
+        # The participant at index X gets the seed at index X, so we sort the
+        # participants by their new seeds.
+        shuffled_participants = [None] * len(participants)
+        for participant, seed in zip(participants, shuffled_seeds):
+            shuffled_participants[seed - 1] = participant
         print(shuffled_participants)
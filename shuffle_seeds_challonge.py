@@ -11,12 +11,18 @@ Replace <tournament_name> with the name of the tournament in the URL.
 For example, for www.challonge.com/mtvmlee72:
 
     python shuffle_seeds_challonge.py mtvmelee72
+
+To keep people from running into last week's opponents or their own crew in
+the first rounds:
+
+    python shuffle_seeds_challonge.py mtvmelee73 \
+        --avoid_rematches_from=mtvmelee72 --avoid="Neal, Bryan; gaR, Eden"
 """
 
 
 # Python package imports.
 import argparse
-import challonge
+import random
 import sys
 
 # Local imports.
@@ -26,6 +32,62 @@ import util
 import util_challonge
 
 
+def _get_rematch_conflicts(tourney_name, seeds_for_names):
+    """Gets the pairs of participants who played each other in a tourney.
+
+    Args:
+      tourney_name: The name of the earlier tourney.
+      seeds_for_names: A dictionary from lowercased participant names to their
+                       seeds in the tourney we're shuffling.
+
+    Returns:
+      A list of [seed, seed] pairs for the participants who played each other
+      in the earlier tourney and are also in the tourney we're shuffling.
+    """
+    client = util_challonge.get_client()
+    names_for_ids = {
+        x["id"]: util_challonge.get_participant_name(x).lower()
+        for x in client.participants.index(tourney_name)
+    }
+
+    conflicts = []
+    for match in client.matches.index(tourney_name):
+        names = [
+            names_for_ids.get(match["player1_id"]),
+            names_for_ids.get(match["player2_id"]),
+        ]
+        if all(name in seeds_for_names for name in names):
+            conflicts.append([seeds_for_names[name] for name in names])
+    return conflicts
+
+
+def _get_named_conflicts(avoid, seeds_for_names):
+    """Gets the groups of participants named in the --avoid flag.
+
+    Names that aren't in the tourney are reported on stderr and the program
+    exits, the same as in shuffle_seeds.py, so that a typo can't quietly
+    drop a conflict before any seeds are changed.
+
+    Args:
+      avoid: The value of the --avoid flag.
+      seeds_for_names: A dictionary from lowercased participant names to their
+                       seeds in the tourney we're shuffling.
+
+    Returns:
+      A list of groups of seeds who shouldn't play each other.
+    """
+    conflicts = []
+    for group in shuffle_seeds.parse_conflict_groups(avoid):
+        unknown_names = [x for x in group if x.lower() not in seeds_for_names]
+        if unknown_names:
+            sys.stderr.write(
+                "Unknown participants: {0}\n".format(", ".join(unknown_names))
+            )
+            sys.exit(1)
+        conflicts.append([seeds_for_names[x.lower()] for x in group])
+    return conflicts
+
+
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser(
         description="shuffles seeds in a Challonge bracket, preserving "
@@ -43,6 +105,22 @@ if __name__ == "__main__":
         default=defaults.DEFAULT_CONFIG_FILENAME,
         help="the config file to read your Challonge " "credentials from",
     )
+    argparser.add_argument(
+        "--seed", type=int, default=None, help="seed for random number generation"
+    )
+    argparser.add_argument(
+        "--avoid",
+        default=None,
+        help="groups of participants who shouldn't play each other in the "
+        "first rounds, e.g. 'Neal, Bryan; gaR, Eden, Paragon'",
+    )
+    argparser.add_argument(
+        "--avoid_rematches_from",
+        action="append",
+        default=[],
+        help="the name of an earlier tournament whose matches shouldn't be "
+        "repeated in the first rounds. Can be given more than once",
+    )
     args = argparser.parse_args()
 
     initialized = util_challonge.set_challonge_credentials_from_config(args.config_file)
@@ -51,7 +129,8 @@ if __name__ == "__main__":
 
     tourney_name = util_challonge.extract_tourney_name(args.tourney_name)
     tourney_url = "http://challonge.com/{0}".format(tourney_name)
-    tourney_info = challonge.tournaments.show(tourney_name)
+    client = util_challonge.get_client()
+    tourney_info = client.tournaments.show(tourney_name)
     if tourney_info["state"] != "pending":
         sys.stderr.write(
             "Can only run {0} on tournaments that haven't "
@@ -62,17 +141,44 @@ if __name__ == "__main__":
     # The participants need to be sorted by seed so their index in the
     # list matches up with the shuffled seeds list.
     participant_infos = sorted(
-        challonge.participants.index(tourney_name), key=lambda x: x["seed"]
+        client.participants.index(tourney_name, fresh=True),
+        key=lambda x: x["seed"]
     )
     num_participants = len(participant_infos)
-    new_seeds = shuffle_seeds.get_shuffled_seeds(num_participants)
-
-    for i, new_seed in enumerate(new_seeds):
-        participant_info = participant_infos[i]
-        if participant_info["seed"] == new_seed:
-            continue
-
-        participant_id = participant_info["id"]
-        challonge.participants.update(tourney_name, participant_id, seed=new_seed)
+    rng = random.Random(args.seed)
+
+    if args.avoid or args.avoid_rematches_from:
+        seeds_for_names = {
+            util_challonge.get_participant_name(x).lower(): i
+            for i, x in enumerate(participant_infos, 1)
+        }
+        conflicts = []
+        if args.avoid:
+            conflicts.extend(_get_named_conflicts(args.avoid, seeds_for_names))
+        for earlier_tourney in args.avoid_rematches_from:
+            earlier_tourney_name = util_challonge.extract_tourney_name(earlier_tourney)
+            conflicts.extend(
+                _get_rematch_conflicts(earlier_tourney_name, seeds_for_names)
+            )
+        new_seeds = shuffle_seeds.get_conflict_avoiding_seeds(
+            num_participants, conflicts, rng
+        )
+        print(
+            "Early-round conflicts: {0}".format(
+                shuffle_seeds.get_conflict_score(new_seeds, conflicts)
+            )
+        )
+    else:
+        new_seeds = shuffle_seeds.get_shuffled_seeds(num_participants, rng)
+
+    # Each update shifts the seeds of everybody in between, so plan the
+    # fewest updates that end with everybody at their new seed.
+    current_ids = [x["id"] for x in participant_infos]
+    target_ids = [None] * num_participants
+    for participant_id, new_seed in zip(current_ids, new_seeds):
+        target_ids[new_seed - 1] = participant_id
+    for participant_id, seed in util_challonge.plan_seed_updates(
+            current_ids, target_ids):
+        client.participants.update(tourney_name, participant_id, seed=seed)
 
     print("Seeds shuffled: {0}/participants".format(tourney_url))
@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+
+
+"""Simulates how a double-elimination bracket might play out.
+
+Before an event starts, this plays the bracket out many times using gaR PR
+ratings to decide who wins each game, to estimate:
+
+  * where each player is likely to place,
+  * how often each seed places where it's projected to,
+  * how likely each player is to end up in the amateur bracket, and
+  * how long the loser's rounds that decide the amateur bracket take.
+
+Players without a rating are treated as if they had the lowest rating of
+anyone in the bracket.
+
+Trials are split into chunks that are run on a pool of processes. With NumPy
+installed, each chunk plays a whole round of matches across all of its trials
+at once. Without it, the trials are played out one at a time.
+
+Examples:
+
+  1. python simulate_bracket.py mtvmelee72
+
+Simulates the current seeding of http://challonge.com/mtvmelee72.
+
+  2. python simulate_bracket.py --names "Neal, Bryan, Paragon, gaR" --shuffle
+
+Simulates a bracket with those players, from 1st seed to last, after
+shuffling the seeds.
+"""
+
+
+import argparse
+import collections
+import concurrent.futures
+import math
+import random
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import bracket
+import defaults
+import garpr_seeds
+import ranking_sources
+import rankings_cache
+import shuffle_seeds
+import util
+import util_challonge
+
+
+DEFAULT_NUM_TRIALS = 100000
+DEFAULT_BEST_OF = 3
+DEFAULT_MINUTES_PER_GAME = 7
+DEFAULT_LOSERS_ROUND_CUTOFF = 2
+
+# gaR PR ratings are TrueSkill ratings, and this is TrueSkill's default spread
+# of a player's performance from game to game. A player rated this much higher
+# than their opponent wins about 73% of their games.
+DEFAULT_RATING_SCALE = 25 / 6
+
+# How many trials are simulated together. This keeps the memory used by each
+# process bounded no matter how many trials are run.
+_TRIALS_PER_CHUNK = 1024
+
+
+def _get_rounds(model, cutoff):
+    """Splits a bracket's matches into rounds that can be played together.
+
+    Every match in a round only depends on matches in earlier rounds, and
+    every player in a round comes from the same kind of place, e.g. the
+    winners of the previous round.
+
+    Args:
+      model: The bracket.DoubleEliminationBracket to split up.
+      cutoff: The number of loser's rounds to time, counting only rounds
+              where at least one match is played.
+
+    Returns:
+      A list of (matches, sources_a, sources_b, placements, timed) tuples,
+      where:
+        * matches is a list of match indexes in the round,
+        * sources_a and sources_b are (kind, values) tuples for where the
+          first and second player of each match comes from,
+        * placements is a list with the placement of each match's loser if
+          they're knocked out of the bracket, or 0 if they aren't, and
+        * timed is True if this round counts towards the time taken to
+          decide the amateur bracket.
+    """
+    rounds = []
+    num_timed = 0
+    start = 0
+    for end in range(1, model.num_matches + 1):
+        if (end < model.num_matches and
+                model.match_rounds[end] == model.match_rounds[start]):
+            continue
+
+        matches = list(range(start, end))
+        sources = []
+        for slot in (0, 1):
+            kind = model.source_kinds[2 * start + slot]
+            values = [model.source_values[2 * x + slot] for x in matches]
+            sources.append((kind, values))
+
+        placements = []
+        any_played = False
+        for match in matches:
+            players = model.projected_players[2 * match:2 * match + 2]
+            played = all(players)
+            any_played = any_played or played
+            if played and model.loser_to[match] == bracket._NO_MATCH:
+                placements.append(model.get_projected_placement(max(players)))
+            else:
+                placements.append(0)
+
+        timed = model.match_rounds[start] < 0 and any_played and num_timed < cutoff
+        if timed:
+            num_timed += 1
+
+        rounds.append((matches, sources[0], sources[1], placements, timed))
+        start = end
+    return rounds
+
+
+def _get_game_win_probability(rating, other_rating, rating_scale):
+    """Gets the chance of a player winning a game against another player.
+
+    This is the logistic function of the difference in ratings, written with
+    tanh so huge differences don't overflow.
+    """
+    return 0.5 * (1.0 + math.tanh((rating - other_rating) / (2 * rating_scale)))
+
+
+def _simulate_chunk_python(rounds, ratings, num_trials, seed, best_of,
+                           rating_scale):
+    """Simulates a chunk of trials one at a time. See _simulate_chunk."""
+    rng = random.Random(seed)
+    num_participants = len(ratings) - 1
+    num_matches = sum(len(x[0]) for x in rounds)
+    wins_needed = best_of // 2 + 1
+
+    placement_counts = [collections.Counter() for _ in range(num_participants + 1)]
+    games_counts = collections.Counter()
+    for _ in range(num_trials):
+        winners = [bracket._NO_PLAYER] * num_matches
+        losers = [bracket._NO_PLAYER] * num_matches
+        results = {bracket._FROM_WINNER: winners, bracket._FROM_LOSER: losers}
+        placements = [1] * (num_participants + 1)
+        num_games = 0
+
+        for matches, sources_a, sources_b, round_placements, timed in rounds:
+            longest_set = 0
+            for i, match in enumerate(matches):
+                players = []
+                for kind, values in (sources_a, sources_b):
+                    if kind == bracket._FROM_SEED:
+                        player = values[i] if values[i] <= num_participants else 0
+                    else:
+                        player = results[kind][values[i]]
+                    players.append(player)
+                player_a, player_b = players
+
+                if player_a and player_b:
+                    p = _get_game_win_probability(
+                        ratings[player_a], ratings[player_b], rating_scale
+                    )
+                    wins_a = wins_b = 0
+                    while wins_a < wins_needed and wins_b < wins_needed:
+                        if rng.random() < p:
+                            wins_a += 1
+                        else:
+                            wins_b += 1
+                    longest_set = max(longest_set, wins_a + wins_b)
+                    if wins_a == wins_needed:
+                        winner, loser = player_a, player_b
+                    else:
+                        winner, loser = player_b, player_a
+                else:
+                    winner, loser = player_a or player_b, bracket._NO_PLAYER
+
+                winners[match] = winner
+                losers[match] = loser
+                if round_placements[i]:
+                    placements[loser] = round_placements[i]
+            if timed:
+                num_games += longest_set
+
+        for seed_num in range(1, num_participants + 1):
+            placement_counts[seed_num][placements[seed_num]] += 1
+        games_counts[num_games] += 1
+
+    return placement_counts, games_counts
+
+
+def _simulate_chunk_numpy(rounds, ratings, num_trials, seed, best_of,
+                          rating_scale):
+    """Simulates a chunk of trials together. See _simulate_chunk."""
+    gen = np.random.default_rng(seed)
+    num_participants = len(ratings) - 1
+    num_matches = sum(len(x[0]) for x in rounds)
+    wins_needed = best_of // 2 + 1
+    ratings = np.array(ratings, dtype=np.float64)
+    trials = np.arange(num_trials)
+
+    winners = np.zeros((num_matches, num_trials), dtype=np.int32)
+    losers = np.zeros((num_matches, num_trials), dtype=np.int32)
+    results = {bracket._FROM_WINNER: winners, bracket._FROM_LOSER: losers}
+    placements = np.ones((num_participants + 1, num_trials), dtype=np.int32)
+    num_games = np.zeros(num_trials, dtype=np.int32)
+
+    for matches, sources_a, sources_b, round_placements, timed in rounds:
+        players = []
+        for kind, values in (sources_a, sources_b):
+            values = np.array(values)
+            if kind == bracket._FROM_SEED:
+                values[values > num_participants] = bracket._NO_PLAYER
+                player = np.repeat(values[:, None], num_trials, axis=1)
+            else:
+                player = results[kind][values]
+            players.append(player)
+        player_a, player_b = players
+
+        # Play every set in the round, in every trial, one game at a time.
+        p = 0.5 * (1.0 + np.tanh(
+            (ratings[player_a] - ratings[player_b]) / (2 * rating_scale)))
+        wins_a = np.zeros(p.shape, dtype=np.int8)
+        wins_b = np.zeros(p.shape, dtype=np.int8)
+        for _ in range(best_of):
+            playing = (wins_a < wins_needed) & (wins_b < wins_needed)
+            a_won_game = gen.random(p.shape) < p
+            wins_a += playing & a_won_game
+            wins_b += playing & ~a_won_game
+
+        played = (player_a != bracket._NO_PLAYER) & (player_b != bracket._NO_PLAYER)
+        a_won = np.where(played, wins_a == wins_needed, player_b == bracket._NO_PLAYER)
+        winners[matches] = np.where(a_won, player_a, player_b)
+        losers[matches] = np.where(
+            played, np.where(a_won, player_b, player_a), bracket._NO_PLAYER
+        )
+
+        round_placements = np.array(round_placements)
+        knocked_out = np.nonzero(round_placements)[0]
+        if len(knocked_out):
+            placements[
+                losers[np.array(matches)[knocked_out]].ravel(),
+                np.tile(trials, len(knocked_out)),
+            ] = np.repeat(round_placements[knocked_out], num_trials)
+        if timed:
+            num_games += np.where(played, wins_a + wins_b, 0).max(axis=0)
+
+    placement_counts = []
+    for seed_num in range(num_participants + 1):
+        values, counts = np.unique(placements[seed_num], return_counts=True)
+        placement_counts.append(
+            collections.Counter(dict(zip(values.tolist(), counts.tolist())))
+        )
+    values, counts = np.unique(num_games, return_counts=True)
+    games_counts = collections.Counter(dict(zip(values.tolist(), counts.tolist())))
+    return placement_counts, games_counts
+
+
+def _simulate_chunk(rounds, ratings, num_trials, seed, best_of, rating_scale):
+    """Simulates a chunk of trials.
+
+    Args:
+      rounds: The rounds of the bracket, from _get_rounds.
+      ratings: A list of ratings for each seed, where the rating at index X is
+               the rating of the player seeded X. Index 0 is ignored.
+      num_trials: The number of trials to simulate.
+      seed: The seed for this chunk's random number generator.
+      best_of: The number of games in each set.
+      rating_scale: How much of a difference in ratings makes a player more
+                    likely to win. See DEFAULT_RATING_SCALE.
+
+    Returns:
+      A tuple of:
+        * A list with a Counter for each seed of how many trials they placed
+          in each placement, and
+        * A Counter of how many trials the timed loser's rounds took each
+          number of games.
+    """
+    simulate = _simulate_chunk_numpy if np is not None else _simulate_chunk_python
+    return simulate(rounds, ratings, num_trials, seed, best_of, rating_scale)
+
+
+class SimulationResults(object):
+    """The combined results of simulating a bracket many times.
+
+    Args:
+      model: The bracket.DoubleEliminationBracket that was simulated.
+      num_trials: The number of trials that were simulated.
+      placement_counts: A list with a Counter for each seed of how many trials
+                        they placed in each placement.
+      games_counts: A Counter of how many trials the timed loser's rounds
+                    took each number of games.
+      cutoff: The loser's round after which people are no longer qualified for
+              amateur bracket.
+      minutes_per_game: How many minutes a game takes.
+    """
+
+    def __init__(self, model, num_trials, placement_counts, games_counts,
+                 cutoff, minutes_per_game):
+        self.model = model
+        self.num_trials = num_trials
+        self.placement_counts = placement_counts
+        self.games_counts = games_counts
+        self.cutoff = cutoff
+        self.minutes_per_game = minutes_per_game
+
+        # Everybody placing at or below the placement of the last amateur
+        # bucket is an amateur.
+        groups = model.get_placement_groups()[:max(cutoff, 0)]
+        if groups:
+            self._amateur_placement = model.get_projected_placement(groups[-1][0])
+        else:
+            self._amateur_placement = None
+
+    def get_placement_distribution(self, seed):
+        """Gets how likely a seed is to place in each placement.
+
+        Returns:
+          A dictionary from placements to probabilities, sorted from first to
+          last place.
+        """
+        counts = self.placement_counts[seed]
+        return {x: counts[x] / self.num_trials for x in sorted(counts)}
+
+    def get_hold_probability(self, seed):
+        """Gets how likely a seed is to place exactly where it's projected to."""
+        placement = self.model.get_projected_placement(seed)
+        return self.placement_counts[seed][placement] / self.num_trials
+
+    def get_amateur_probability(self, seed):
+        """Gets how likely a seed is to end up in the amateur bracket."""
+        if self._amateur_placement is None:
+            return 0.0
+        counts = self.placement_counts[seed]
+        num_amateur = sum(counts[x] for x in counts if x >= self._amateur_placement)
+        return num_amateur / self.num_trials
+
+    def get_num_amateurs(self):
+        """Gets how many people end up in the amateur bracket.
+
+        This is the same in every trial, since it only depends on the shape of
+        the bracket.
+        """
+        return int(round(sum(
+            self.get_amateur_probability(x)
+            for x in range(1, self.model.num_participants + 1)
+        )))
+
+    def get_mean_losers_rounds_minutes(self):
+        """Gets how long the loser's rounds deciding amateurs take on average.
+
+        Each round is assumed to take as long as its longest set, i.e. that
+        there are enough setups for every set in a round to be played at once.
+        """
+        total_games = sum(x * count for x, count in self.games_counts.items())
+        return total_games * self.minutes_per_game / self.num_trials
+
+    def get_losers_rounds_minutes_percentile(self, percentile):
+        """Gets how long the loser's rounds deciding amateurs take in all but
+        the slowest (100 - percentile)% of trials."""
+        target = percentile / 100.0 * self.num_trials
+        num_seen = 0
+        for num_games in sorted(self.games_counts):
+            num_seen += self.games_counts[num_games]
+            if num_seen >= target:
+                return num_games * self.minutes_per_game
+        return 0
+
+
+def simulate_bracket(ratings, num_trials=DEFAULT_NUM_TRIALS,
+                     cutoff=DEFAULT_LOSERS_ROUND_CUTOFF, best_of=DEFAULT_BEST_OF,
+                     minutes_per_game=DEFAULT_MINUTES_PER_GAME,
+                     rating_scale=DEFAULT_RATING_SCALE, num_processes=None,
+                     seed=None):
+    """Simulates a double-elimination bracket many times.
+
+    Args:
+      ratings: A list with the rating of each participant, from 1st seed to
+               last. Unknown ratings can be None.
+      num_trials: The number of times to play out the bracket.
+      cutoff: The loser's round after which people are no longer qualified for
+              amateur bracket.
+      best_of: The number of games in each set.
+      minutes_per_game: How many minutes a game takes.
+      rating_scale: How much of a difference in ratings makes a player more
+                    likely to win. See DEFAULT_RATING_SCALE.
+      num_processes: The number of processes to run trials on. Defaults to the
+                     number of CPUs. If this is 1, everything runs in this
+                     process.
+      seed: The seed for random number generation. The same seed gives the
+            same results no matter how many processes are used.
+
+    Returns:
+      A SimulationResults.
+    """
+    model = bracket.DoubleEliminationBracket(len(ratings))
+    rounds = _get_rounds(model, cutoff)
+
+    known_ratings = [x for x in ratings if x is not None]
+    unknown_rating = min(known_ratings) if known_ratings else 0.0
+    ratings = [0.0] + [x if x is not None else unknown_rating for x in ratings]
+
+    # The chunks are decided up front, so the results only depend on the
+    # seed and not how the chunks get scheduled.
+    chunk_sizes = [
+        min(_TRIALS_PER_CHUNK, num_trials - x)
+        for x in range(0, num_trials, _TRIALS_PER_CHUNK)
+    ]
+    chunk_seeds = [x.getrandbits(64) for x in util.spawn_rngs(seed, len(chunk_sizes))]
+    chunk_args = [
+        (rounds, ratings, size, chunk_seed, best_of, rating_scale)
+        for size, chunk_seed in zip(chunk_sizes, chunk_seeds)
+    ]
+
+    if num_processes == 1:
+        chunk_results = [_simulate_chunk(*x) for x in chunk_args]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(num_processes) as executor:
+            chunk_results = list(executor.map(_simulate_chunk, *zip(*chunk_args)))
+
+    placement_counts = [collections.Counter() for _ in ratings]
+    games_counts = collections.Counter()
+    for chunk_placement_counts, chunk_games_counts in chunk_results:
+        for counts, chunk_counts in zip(placement_counts, chunk_placement_counts):
+            counts.update(chunk_counts)
+        games_counts.update(chunk_games_counts)
+
+    return SimulationResults(model, num_trials, placement_counts, games_counts,
+                             cutoff, minutes_per_game)
+
+
+def _get_rating(ranking):
+    """Retrieves a rating from a ranking object.
+
+    Args:
+      ranking: A ranking object, or None for unranked players.
+
+    Returns:
+      The player's rating as a float, or None if it's unknown. Rankings read
+      from CSV files have string ratings, and rankings from older caches or
+      SQLite databases have none at all.
+    """
+    rating = ranking.get("rating") if ranking else None
+    return float(rating) if rating not in (None, "") else None
+
+
+def _format_placement(placement):
+    """Formats a placement, e.g. 1 => 1st, 13 => 13th, 33 => 33rd."""
+    if placement % 100 in (11, 12, 13):
+        suffix = "th"
+    else:
+        suffix = {1: "st", 2: "nd", 3: "rd"}.get(placement % 10, "th")
+    return "{0}{1}".format(placement, suffix)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Simulates how a double-elimination bracket might play "
+        "out using gaR PR ratings.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    argparser.add_argument(
+        "participants",
+        help="the name of the Challonge tournament to read the current "
+        "seeding from. With --names, a comma-separated list of players from "
+        "1st seed to last instead",
+    )
+    argparser.add_argument(
+        "--names",
+        action="store_true",
+        help="read the players from the command line instead of Challonge",
+    )
+    argparser.add_argument(
+        "--config_file",
+        default=defaults.DEFAULT_CONFIG_FILENAME,
+        help="the config file to read your Challonge credentials from",
+    )
+    argparser.add_argument(
+        "--region",
+        default=defaults.DEFAULT_REGION,
+        help="the gaR PR region(s) to read ratings from",
+    )
+    argparser.add_argument(
+        "--cache_dir",
+        default=defaults.DEFAULT_RANKINGS_CACHE_DIR,
+        help="the directory to cache gaR PR rankings in",
+    )
+    argparser.add_argument(
+        "--cache_ttl",
+        type=int,
+        default=defaults.DEFAULT_RANKINGS_CACHE_TTL,
+        help="the number of seconds to use cached rankings before checking "
+        "gaR PR for newer ones. Use 0 to always check",
+    )
+    argparser.add_argument(
+        "--offline",
+        action="store_true",
+        help="only use cached gaR PR rankings without contacting gaR PR",
+    )
+    argparser.add_argument(
+        "--rankings_source",
+        default=None,
+        help="a SQLite database (.db), JSON or CSV file to read rankings from "
+        "instead of gaR PR. See ranking_sources.py",
+    )
+    argparser.add_argument(
+        "--shuffle",
+        action="store_true",
+        help="shuffle the seeds before simulating",
+    )
+    argparser.add_argument(
+        "--trials",
+        type=int,
+        default=DEFAULT_NUM_TRIALS,
+        help="the number of times to play out the bracket",
+    )
+    argparser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="the number of processes to run trials on. Defaults to the "
+        "number of CPUs",
+    )
+    argparser.add_argument(
+        "--losers_round_cutoff",
+        type=int,
+        default=DEFAULT_LOSERS_ROUND_CUTOFF,
+        help="the loser's round after which people are no longer qualified "
+        "for amateur bracket",
+    )
+    argparser.add_argument(
+        "--best_of", type=int, default=DEFAULT_BEST_OF, help="games per set"
+    )
+    argparser.add_argument(
+        "--minutes_per_game",
+        type=float,
+        default=DEFAULT_MINUTES_PER_GAME,
+        help="how long a game takes",
+    )
+    argparser.add_argument(
+        "--rating_scale",
+        type=float,
+        default=DEFAULT_RATING_SCALE,
+        help="how big a difference in rating makes someone more likely to "
+        "win a game",
+    )
+    argparser.add_argument(
+        "--seed", type=int, default=None, help="seed for random number generation"
+    )
+    args = argparser.parse_args()
+
+    if args.names:
+        names = [x.strip() for x in args.participants.split(",")]
+    else:
+        initialized = util_challonge.set_challonge_credentials_from_config(
+            args.config_file
+        )
+        if not initialized:
+            sys.exit(1)
+        tourney_name = util_challonge.extract_tourney_name(args.participants)
+        participants = sorted(
+            util_challonge.get_client().participants.index(tourney_name),
+            key=lambda x: x["seed"],
+        )
+        names = [util_challonge.get_participant_name(x) for x in participants]
+
+    rng = random.Random(args.seed)
+    if args.shuffle:
+        new_seeds = shuffle_seeds.get_shuffled_seeds(len(names), rng)
+        shuffled_names = [None] * len(names)
+        for name, new_seed in zip(names, new_seeds):
+            shuffled_names[new_seed - 1] = name
+        names = shuffled_names
+
+    cache = rankings_cache.RankingsCache(
+        args.cache_dir, ttl=args.cache_ttl, offline=args.offline
+    )
+    source = None
+    if args.rankings_source:
+        source = ranking_sources.open_ranking_source(args.rankings_source)
+    rankings = garpr_seeds.get_garpr_rankings(names, args.region, cache, source=source)
+    ratings = [_get_rating(ranking) for ranking in rankings]
+
+    results = simulate_bracket(
+        ratings,
+        num_trials=args.trials,
+        cutoff=args.losers_round_cutoff,
+        best_of=args.best_of,
+        minutes_per_game=args.minutes_per_game,
+        rating_scale=args.rating_scale,
+        num_processes=args.processes,
+        seed=rng.getrandbits(64),
+    )
+
+    for seed, name in enumerate(names, 1):
+        distribution = results.get_placement_distribution(seed)
+        likeliest = sorted(distribution, key=lambda x: -distribution[x])[:3]
+        print(
+            "{0}. {1} (projected {2}): holds {3:.1%}, amateurs {4:.1%}, "
+            "likeliest {5}".format(
+                seed,
+                name,
+                _format_placement(results.model.get_projected_placement(seed)),
+                results.get_hold_probability(seed),
+                results.get_amateur_probability(seed),
+                ", ".join(
+                    "{0} {1:.1%}".format(_format_placement(x), distribution[x])
+                    for x in likeliest
+                ),
+            )
+        )
+
+    print()
+    print("Amateur bracket: {0} players".format(results.get_num_amateurs()))
+    print(
+        "Loser's rounds 1-{0}: {1:.0f} minutes on average, {2:.0f} minutes in "
+        "90% of brackets".format(
+            args.losers_round_cutoff,
+            results.get_mean_losers_rounds_minutes(),
+            results.get_losers_rounds_minutes_percentile(90),
+        )
+    )
@@ -0,0 +1,147 @@
+import asyncio
+from os.path import dirname, abspath, join
+import pytest
+import sys
+
+# Add the parent directory and the benchmarks to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+sys.path.append(join(dirname(CWD), "benchmarks"))
+
+import async_challonge
+import create_amateur_bracket
+import fake_challonge
+import garpr_seeds_challonge
+import ranking_sources
+import util_challonge
+
+
+NAMES = ["Player{0}".format(x) for x in range(1, 10)]
+
+
+class StaticRankingSource(ranking_sources.RankingSource):
+    def __init__(self, rankings):
+        self._rankings = rankings
+
+    def get_rankings(self):
+        return self._rankings
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_get_tourney_info():
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES)
+    client = async_challonge.AsyncChallongeClient(fake)
+
+    info = run(client.get_tourney_info("mtvmelee72"))
+    assert info["participants_count"] == 9
+    assert run(client.get_tourney_info("mtvmelee73")) is None
+    client.close()
+
+
+def test_seed_tournament_async():
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", list(reversed(NAMES)))
+    url = util_challonge.tourney_name_to_url("mtvmelee72")
+    source = StaticRankingSource(
+        [{"name": x, "rank": i} for i, x in enumerate(NAMES, 1)])
+    client = async_challonge.AsyncChallongeClient(fake)
+
+    async def seed():
+        sorted_participants, _ = await garpr_seeds_challonge.seed_tournament_async(
+            url, None, False, source=source, client=client)
+        return await garpr_seeds_challonge.update_seeds_async(
+            url, sorted_participants, client=client)
+
+    assert run(seed()) == 8
+    assert [x["display_name"] for x in fake.get_participants("mtvmelee72")] == NAMES
+
+    with pytest.raises(garpr_seeds_challonge.NoSuchTournamentError):
+        run(garpr_seeds_challonge.seed_tournament_async(
+            util_challonge.tourney_name_to_url("mtvmelee73"), None, False,
+            source=source, client=client))
+    client.close()
+
+
+def test_seed_tournament_async_raises_ranking_errors():
+    class FailingRankingSource(ranking_sources.RankingSource):
+        num_calls = 0
+
+        def get_rankings(self):
+            self.num_calls += 1
+            raise ValueError("gaR PR is down")
+
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES)
+    source = FailingRankingSource()
+    client = async_challonge.AsyncChallongeClient(fake)
+
+    with pytest.raises(ValueError):
+        run(garpr_seeds_challonge.seed_tournament_async(
+            util_challonge.tourney_name_to_url("mtvmelee72"), None, False,
+            source=source, client=client))
+    assert source.num_calls == 1
+    client.close()
+
+
+def test_create_amateur_bracket_async():
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES, completed_losers_rounds=2)
+    client = async_challonge.AsyncChallongeClient(fake)
+
+    amateur_url = run(create_amateur_bracket.create_amateur_bracket_async(
+        util_challonge.tourney_name_to_url("mtvmelee72"),
+        single_elimination=False, losers_round_cutoff=2, randomize_seeds=False,
+        client=client))
+
+    assert amateur_url == util_challonge.tourney_name_to_url("mtvmelee72_amateur")
+    assert [x["display_name"]
+            for x in fake.get_participants("mtvmelee72_amateur")] == [
+        "Player7", "Player8", "Player9"]
+
+    with pytest.raises(create_amateur_bracket.AmateurBracketAlreadyExistsError):
+        run(create_amateur_bracket.create_amateur_bracket_async(
+            util_challonge.tourney_name_to_url("mtvmelee72"),
+            single_elimination=False, losers_round_cutoff=2,
+            randomize_seeds=False, client=client))
+    client.close()
+
+
+def test_closes_default_clients(monkeypatch):
+    closed = []
+    monkeypatch.setattr(async_challonge.AsyncChallongeClient, "close",
+                        lambda self: closed.append(self))
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES, completed_losers_rounds=2)
+    url = util_challonge.tourney_name_to_url("mtvmelee72")
+    source = StaticRankingSource(
+        [{"name": x, "rank": i} for i, x in enumerate(NAMES, 1)])
+
+    with fake.installed():
+        sorted_participants, _ = run(garpr_seeds_challonge.seed_tournament_async(
+            url, None, False, source=source))
+        run(garpr_seeds_challonge.update_seeds_async(url, sorted_participants))
+        run(create_amateur_bracket.create_amateur_bracket_async(
+            url, single_elimination=False, losers_round_cutoff=2,
+            randomize_seeds=False))
+        assert len(closed) == 3
+
+        # Even when they fail.
+        with pytest.raises(garpr_seeds_challonge.NoSuchTournamentError):
+            run(garpr_seeds_challonge.seed_tournament_async(
+                util_challonge.tourney_name_to_url("mtvmelee73"), None, False,
+                source=source))
+        assert len(closed) == 4
+
+        # Clients that are passed in are left open.
+        client = async_challonge.AsyncChallongeClient()
+        run(garpr_seeds_challonge.update_seeds_async(
+            url, sorted_participants, client=client))
+        assert client not in closed
@@ -0,0 +1,72 @@
+from os.path import dirname, abspath
+import pytest
+import random
+import sys
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import bracket
+import shuffle_seeds
+
+
+def test_seed_order():
+    assert bracket._get_seed_order(1) == [1]
+    assert bracket._get_seed_order(8) == [1, 8, 4, 5, 2, 7, 3, 6]
+
+
+def test_invalid_num_participants():
+    with pytest.raises(ValueError):
+        bracket.DoubleEliminationBracket(0)
+
+
+def test_projected_opponents():
+    eight = bracket.DoubleEliminationBracket(8)
+    assert eight.get_projected_opponent(1, 1) == 8
+    assert eight.get_projected_opponent(4, 2) == 1
+    assert eight.get_projected_opponent(2, 3) == 1
+    assert eight.get_projected_opponent(5, -1) == 8
+    assert eight.get_projected_opponent(3, -4) == 2
+    assert eight.get_projected_opponent(2, 4) == 1
+
+    # Seed 1 doesn't play in loser's, and seed 1 has a bye with 5 people.
+    assert eight.get_projected_opponent(1, -1) is None
+    assert bracket.DoubleEliminationBracket(5).get_projected_opponent(1, 1) is None
+
+
+def test_projected_placements():
+    nine = bracket.DoubleEliminationBracket(9)
+    assert [nine.get_projected_placement(x) for x in range(1, 10)] == [
+        1, 2, 3, 4, 5, 5, 7, 7, 9]
+    assert bracket.DoubleEliminationBracket(1).get_projected_placement(1) == 1
+    assert bracket.DoubleEliminationBracket(2).get_projected_placement(2) == 2
+
+
+def test_routing():
+    sixteen = bracket.DoubleEliminationBracket(16)
+    # Every match but grand finals sends its winner somewhere, and everyone
+    # gets two losses before being out, other than the grand finals loser.
+    assert sixteen.winner_to.count(bracket._NO_MATCH) == 1
+    assert sixteen.loser_to.count(bracket._NO_MATCH) == 16 - 1
+    assert sixteen.num_matches == 2 * 16 - 2
+
+
+def test_placement_groups_match_buckets():
+    for num_participants in range(1, 1025):
+        groups = bracket.DoubleEliminationBracket(num_participants).get_placement_groups()
+        buckets = shuffle_seeds._get_buckets(num_participants)
+        assert [sorted(x) for x in groups] == [sorted(x) for x in buckets]
+
+
+def test_shuffles_preserve_placements():
+    rng = random.Random(0)
+    for num_participants in [1, 2, 3, 4, 5, 9, 17, 100, 257, 1000]:
+        model = bracket.DoubleEliminationBracket(num_participants)
+        for _ in range(20):
+            seeds = shuffle_seeds.get_shuffled_seeds(num_participants, rng)
+            assert model.preserves_placements(seeds)
+
+    swapped = list(range(1, 10))
+    swapped[0], swapped[1] = swapped[1], swapped[0]
+    assert not bracket.DoubleEliminationBracket(9).preserves_placements(swapped)
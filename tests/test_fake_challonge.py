@@ -0,0 +1,273 @@
+from os.path import dirname, abspath, join
+import random
+import sys
+import threading
+
+import pytest
+import requests.exceptions
+
+# Add the parent directory and the benchmarks to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+sys.path.append(join(dirname(CWD), "benchmarks"))
+
+import bracket
+import create_amateur_bracket
+import fake_challonge
+import garpr_seeds_challonge
+import ranking_sources
+import seeding_history
+import shuffle_seeds
+import util_challonge
+
+
+NAMES = ["Player{0}".format(x) for x in range(1, 10)]
+
+
+class StaticRankingSource(ranking_sources.RankingSource):
+    def __init__(self, rankings):
+        self._rankings = rankings
+
+    def get_rankings(self):
+        return self._rankings
+
+
+def seeded_names(fake, tourney_name):
+    return [x["display_name"] for x in fake.get_participants(tourney_name)]
+
+
+def test_updating_seed_shifts_others():
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES[:4])
+    last_id = fake.get_participants("mtvmelee72")[-1]["id"]
+
+    fake.participants_update("mtvmelee72", last_id, seed=1)
+
+    assert seeded_names(fake, "mtvmelee72") == [
+        "Player4", "Player1", "Player2", "Player3"]
+    assert fake.calls["participants.update"] == 1
+
+
+def test_update_seeds_applies_order():
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES)
+    url = util_challonge.tourney_name_to_url("mtvmelee72")
+    desired = random.Random(0).sample(fake.get_participants("mtvmelee72"), 9)
+
+    with fake.installed():
+        garpr_seeds_challonge.update_seeds(url, desired)
+
+    assert seeded_names(fake, "mtvmelee72") == [
+        x["display_name"] for x in desired]
+
+
+def test_seed_new_participants_only(tmp_path):
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES[1:])
+    url = util_challonge.tourney_name_to_url("mtvmelee72")
+    source = StaticRankingSource(
+        [{"name": x, "rank": i} for i, x in enumerate(NAMES, 1)])
+    history = seeding_history.SeedingHistory(str(tmp_path))
+
+    def reseed():
+        sorted_participants, unknown = garpr_seeds_challonge.seed_tournament(
+            url, None, True, source=source, rng=random.Random(7),
+            history=history, new_participants_only=True)
+        num_updated = garpr_seeds_challonge.update_seeds(
+            url, sorted_participants, history)
+        return unknown, num_updated
+
+    with fake.installed():
+        sorted_participants, _ = garpr_seeds_challonge.seed_tournament(
+            url, None, True, source=source, rng=random.Random(7))
+        garpr_seeds_challonge.update_seeds(url, sorted_participants, history)
+        shuffled = seeded_names(fake, "mtvmelee72")
+        assert shuffled != NAMES[1:]
+
+        # A late registrant at the bottom leaves the buckets above alone, so
+        # the shuffle is kept.
+        fake.participants_create("mtvmelee72", "Newcomer")
+        fake.calls.clear()
+        unknown, num_updated = reseed()
+        assert seeded_names(fake, "mtvmelee72") == shuffled + ["Newcomer"]
+        assert unknown == [{"name": "Newcomer", "seed": 9}]
+        assert num_updated == 0
+        assert "participants.update" not in fake.calls
+
+        # One at the top pushes everybody else into a different bucket, so
+        # they're placed in their new ones.
+        fake.participants_create("mtvmelee72", "Player1")
+        unknown, num_updated = reseed()
+
+    assert seeded_names(fake, "mtvmelee72") == NAMES + ["Newcomer"]
+    assert unknown == []
+    assert num_updated == 3
+    assert history.load("mtvmelee72") == [
+        x["id"] for x in fake.get_participants("mtvmelee72")]
+
+
+def test_seed_tournament_fetches_rankings_and_participants_together():
+    # Each fetch waits for the other to start, so this only finishes if
+    # they run at the same time.
+    barrier = threading.Barrier(2, timeout=5)
+
+    class SlowRankingSource(StaticRankingSource):
+        def prefetch(self):
+            barrier.wait()
+
+    class SlowFakeChallonge(fake_challonge.FakeChallonge):
+        def participants_index(self, tournament, **params):
+            barrier.wait()
+            return super().participants_index(tournament, **params)
+
+    fake = SlowFakeChallonge()
+    fake.add_tournament("mtvmelee72", list(reversed(NAMES)))
+    source = SlowRankingSource(
+        [{"name": x, "rank": i} for i, x in enumerate(NAMES, 1)])
+    timings = {}
+
+    with fake.installed():
+        sorted_participants, _ = garpr_seeds_challonge.seed_tournament(
+            util_challonge.tourney_name_to_url("mtvmelee72"), None, False,
+            source=source, timings=timings)
+
+    assert [x["display_name"] for x in sorted_participants] == NAMES
+    assert set(timings) == set(garpr_seeds_challonge.STAGES)
+    assert timings["total"] >= timings["rankings"]
+
+
+def test_slot_in_new_participants():
+    assert garpr_seeds_challonge._slot_in_new_participants(
+        ["a", "b", "X", "c", "Y"], [3, 5, 1, 4, 4],
+        [False, False, True, False, True]) == ["X", "a", "c", "Y", "b"]
+    assert garpr_seeds_challonge._slot_in_new_participants(
+        ["a", "X", "Y"], [1, 3, 2], [False, True, True]) == ["a", "Y", "X"]
+
+    # The shuffle is kept in buckets the newcomer doesn't move.
+    shuffled = list("abcdefhgji")
+    seeds = [ord(x) - ord("a") + 1 for x in shuffled]
+    assert garpr_seeds_challonge._slot_in_new_participants(
+        shuffled + ["X"], seeds + [11], [False] * 10 + [True]) == (
+            shuffled + ["X"])
+    assert garpr_seeds_challonge._slot_in_new_participants(
+        shuffled + ["X"], [x + 1 for x in seeds] + [1],
+        [False] * 10 + [True]) == list("Xabcdefghji")
+
+
+def test_slot_in_new_participants_preserves_placements():
+    rng = random.Random(0)
+    for num_participants in [2, 3, 5, 9, 17, 33, 100]:
+        model = bracket.DoubleEliminationBracket(num_participants)
+        for _ in range(20):
+            new_seeds = list(range(1, num_participants + 1))
+            rng.shuffle(new_seeds)
+            is_new = [rng.random() < 0.2 for _ in new_seeds]
+            sorted_participants = (
+                garpr_seeds_challonge._slot_in_new_participants(
+                    list(range(num_participants)), new_seeds, is_new))
+
+            # seeds[X - 1] is where the participant seeded X ends up.
+            seeds = [0] * num_participants
+            for seed, i in enumerate(sorted_participants, 1):
+                seeds[new_seeds[i] - 1] = seed
+                assert shuffle_seeds.get_bucket_index(
+                    num_participants, seed) == shuffle_seeds.get_bucket_index(
+                        num_participants, new_seeds[i])
+                if is_new[i]:
+                    assert seed == new_seeds[i]
+            assert model.preserves_placements(seeds)
+
+
+def test_create_amateur_bracket():
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES, completed_losers_rounds=2)
+    url = util_challonge.tourney_name_to_url("mtvmelee72")
+
+    with fake.installed():
+        amateur_url = create_amateur_bracket.create_amateur_bracket(
+            url, single_elimination=False, losers_round_cutoff=2,
+            randomize_seeds=False)
+
+    # The bottom two buckets of a 9-person bracket are seeds 9, 7 and 8.
+    assert amateur_url == util_challonge.tourney_name_to_url("mtvmelee72_amateur")
+    assert seeded_names(fake, "mtvmelee72_amateur") == [
+        "Player7", "Player8", "Player9"]
+    assert fake.calls["participants.index"] == 1
+    assert fake.calls["participants.show"] == 0
+
+
+def test_get_amateur_participants_with_open_match():
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES[:4])
+    ids = [x["id"] for x in fake.get_participants("mtvmelee72")]
+    matches = [
+        {"state": "complete", "loser_id": ids[3]},
+        {"state": "open", "player1_id": ids[1], "player2_id": ids[2]},
+    ]
+
+    with fake.installed():
+        amateurs = create_amateur_bracket.get_amateur_participants(
+            "mtvmelee72", matches)
+
+    assert [(x["display_name"], x["seed"]) for x in amateurs] == [
+        ("Player4", 4), ("Player2 / Player3", 2)]
+    assert seeded_names(fake, "mtvmelee72")[1] == "Player2"
+    assert fake.num_calls == 1
+
+
+def test_create_amateur_bracket_bulk_adds_in_chunks(monkeypatch):
+    monkeypatch.setattr(create_amateur_bracket, "_MAX_BULK_ADD_PARTICIPANTS", 2)
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES, completed_losers_rounds=2)
+    url = util_challonge.tourney_name_to_url("mtvmelee72")
+
+    with fake.installed():
+        create_amateur_bracket.create_amateur_bracket(
+            url, single_elimination=False, losers_round_cutoff=2,
+            randomize_seeds=False)
+
+    assert seeded_names(fake, "mtvmelee72_amateur") == [
+        "Player7", "Player8", "Player9"]
+    assert fake.calls["participants.bulk_add"] == 2
+    assert fake.calls["participants.create"] == 0
+
+
+def test_create_amateur_bracket_raises_bulk_add_server_errors(monkeypatch):
+    fake = fake_challonge.FakeChallonge()
+    fake.add_tournament("mtvmelee72", NAMES, completed_losers_rounds=2)
+    url = util_challonge.tourney_name_to_url("mtvmelee72")
+
+    # The participants are added, but the response never makes it back.
+    bulk_add = fake.participants_bulk_add
+
+    def participants_bulk_add(tournament, participants):
+        bulk_add(tournament, participants)
+        raise requests.exceptions.HTTPError(
+            "500 Server Error", response=fake_challonge._FakeHttpResponse(500))
+
+    monkeypatch.setattr(fake, "participants_bulk_add", participants_bulk_add)
+    with fake.installed(), pytest.raises(requests.exceptions.HTTPError):
+        create_amateur_bracket.create_amateur_bracket(
+            url, single_elimination=False, losers_round_cutoff=2,
+            randomize_seeds=False)
+
+    assert seeded_names(fake, "mtvmelee72_amateur") == [
+        "Player7", "Player8", "Player9"]
+    assert fake.calls["participants.create"] == 0
+
+
+def test_create_amateur_bracket_without_bulk_add():
+    fake = fake_challonge.FakeChallonge()
+    fake.supports_bulk_add = False
+    fake.add_tournament("mtvmelee72", NAMES, completed_losers_rounds=2)
+    url = util_challonge.tourney_name_to_url("mtvmelee72")
+
+    with fake.installed():
+        create_amateur_bracket.create_amateur_bracket(
+            url, single_elimination=False, losers_round_cutoff=2,
+            randomize_seeds=False)
+
+    assert seeded_names(fake, "mtvmelee72_amateur") == [
+        "Player7", "Player8", "Player9"]
+    assert fake.calls["participants.bulk_add"] == 1
+    assert fake.calls["participants.create"] == 3
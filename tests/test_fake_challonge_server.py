@@ -0,0 +1,84 @@
+from os.path import dirname, abspath, join
+import json
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Add the parent directory and the benchmarks to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+sys.path.append(join(dirname(CWD), "benchmarks"))
+
+import fake_challonge_server
+
+
+def call(server, method, path, params=None):
+    data = None
+    if params is not None:
+        data = urllib.parse.urlencode(params).encode()
+    request = urllib.request.Request(
+        "{0}/{1}.json".format(server.api_url, path), data=data, method=method)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read().decode()), {}
+    except urllib.error.HTTPError as err:
+        return err.code, json.loads(err.read().decode()), err.headers
+
+
+def test_parse_params():
+    assert fake_challonge_server._parse_params([
+        ("participant[seed]", "3"), ("participant[name]", "123"),
+        ("participant[invite]", "false"),
+    ]) == {"seed": 3, "name": "123", "invite": False}
+    assert fake_challonge_server._parse_params([
+        ("participants[][name]", "Neal"), ("participants[][seed]", "1"),
+        ("participants[][name]", "Bryan"),
+    ]) == {"participants": [{"name": "Neal", "seed": 1}, {"name": "Bryan"}]}
+
+
+def test_serves_api():
+    with fake_challonge_server.FakeChallongeServer() as server:
+        server.fake.add_tournament("mtvmelee72", ["Neal", "Bryan", "Paragon"])
+
+        status, tournament, _ = call(server, "GET", "tournaments/mtvmelee72")
+        assert status == 200
+        assert tournament["tournament"]["participants_count"] == 3
+
+        status, participants, _ = call(
+            server, "GET", "tournaments/mtvmelee72/participants")
+        paragon = participants[2]["participant"]
+        assert [x["participant"]["name"] for x in participants] == [
+            "Neal", "Bryan", "Paragon"]
+
+        status, updated, _ = call(
+            server, "PUT",
+            "tournaments/mtvmelee72/participants/{0}".format(paragon["id"]),
+            [("participant[seed]", "1")])
+        assert updated["participant"]["seed"] == 1
+
+        status, added, _ = call(
+            server, "POST", "tournaments/mtvmelee72/participants/bulk_add",
+            [("participants[][name]", "gaR"), ("participants[][seed]", "2"),
+             ("participants[][name]", "Eden")])
+        assert [x["participant"]["name"] for x in added] == ["gaR", "Eden"]
+        assert [x["display_name"]
+                for x in server.fake.get_participants("mtvmelee72")] == [
+            "Paragon", "gaR", "Neal", "Bryan", "Eden"]
+
+        status, _, _ = call(server, "GET", "tournaments/mtvmelee73")
+        assert status == 404
+
+
+def test_rate_limit():
+    with fake_challonge_server.FakeChallongeServer(requests_per_second=1,
+                                                   burst=2) as server:
+        server.fake.add_tournament("mtvmelee72", ["Neal"])
+        statuses = []
+        for _ in range(3):
+            status, _, headers = call(server, "GET", "tournaments/mtvmelee72")
+            statuses.append(status)
+
+        assert statuses == [200, 200, 429]
+        assert 0 < float(headers["Retry-After"]) <= 1
+        assert server.num_rate_limited == 1
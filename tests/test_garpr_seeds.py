@@ -10,7 +10,13 @@ from unittest.mock import Mock
 CWD = dirname(abspath(__file__))
 sys.path.append(dirname(CWD))
 
+import fuzzy_names
 import garpr_seeds
+import requests.exceptions
+
+
+# Tests below replace this with a Mock, so keep the real one.
+_fetch_garpr_rankings = garpr_seeds._fetch_garpr_rankings
 
 
 def rankings(region):
@@ -91,3 +97,169 @@ def test_multiple_tags_parens(players):
     seeds = seed_players(players)
 
     assert seeds == [2, 3, 1, 3, 5]
+
+
+@pytest.mark.parametrize('region', ['norcal', 'googlemtv'])
+def test_alias_index_matches_scan(region):
+    """Looking names up in the alias index matches scanning the rankings."""
+    region_rankings = rankings(region)
+    alias_index = garpr_seeds._build_alias_index(region_rankings)
+
+    for name in list(alias_index) + ['BLAHBLAH']:
+        expected = garpr_seeds._find_ranking_for_name(name, region_rankings)
+        assert alias_index.get(name.lower()) is expected
+
+
+def slow_ranks_to_seeds(ranks):
+    """The original quadratic implementation of ranks_to_seeds."""
+    sorted_known_ranks = [x for x in sorted(ranks)
+                          if x != garpr_seeds.UNKNOWN_RANK]
+    next_last_place_seed = len(sorted_known_ranks) + 1
+    seeds = []
+    for rank in ranks:
+        if rank == garpr_seeds.UNKNOWN_RANK:
+            seeds.append(next_last_place_seed)
+            next_last_place_seed += 1
+        else:
+            seeds.append(sorted_known_ranks.index(rank) + 1)
+    return seeds
+
+
+def test_ranks_to_seeds_example():
+    unknown = garpr_seeds.UNKNOWN_RANK
+    ranks = [4, 6, unknown, 2, unknown]
+
+    assert garpr_seeds.ranks_to_seeds(ranks) == [2, 3, 4, 1, 5]
+
+
+@pytest.mark.parametrize('num_players', [0, 1, 7, 100, 1000])
+def test_ranks_to_seeds_matches_original(num_players):
+    """Seeds are the same as before, including shared and unknown ranks."""
+    ranks = [choice([garpr_seeds.UNKNOWN_RANK, choice(range(1, 50)),
+                     choice(range(1, 5000))])
+             for _ in range(num_players)]
+
+    assert garpr_seeds.ranks_to_seeds(ranks) == slow_ranks_to_seeds(ranks)
+
+
+def test_ranks_to_seeds_batch():
+    unknown = garpr_seeds.UNKNOWN_RANK
+    rank_lists = [[4, 6, unknown], [2, 1], []]
+
+    assert garpr_seeds.ranks_to_seeds_batch(rank_lists) == [[1, 2, 3], [2, 1], []]
+
+
+def test_fuzzy_matching_is_opt_in():
+    """Near-miss tags are only matched when fuzzy matching is on."""
+    garpr_seeds._fetch_garpr_rankings = Mock(return_value=rankings('norcal'))
+    players = ['Umarth', 'Ralph', 'Tr0ck', 'BLAHBLAHBLAHBLAH']
+
+    exact_ranks = garpr_seeds.get_garpr_ranks(players, '')
+    fuzzy_ranks = garpr_seeds.get_garpr_ranks(players, '', fuzzy=True)
+
+    unknown = garpr_seeds.UNKNOWN_RANK
+    assert exact_ranks == [9, unknown, unknown, unknown]
+    assert fuzzy_ranks == [9, 6, 25, unknown]
+
+
+def test_fuzzy_match_scores():
+    """Identical tags after normalization score 1, unrelated tags don't match."""
+    alias_index = garpr_seeds._build_alias_index(rankings('googlemtv'))
+    index = fuzzy_names.TrigramIndex(alias_index)
+
+    [(ranking, score)] = index.find_matches('C9 | Y3llow_Yoshi')
+    assert ranking['name'] == 'Yellow Yoshi (Char)'
+    assert score == 1
+    assert index.find_matches('qqqqqqqq') == []
+
+
+def test_merge_rankings_interleaves_regions():
+    """Ties in rank go to the first region, duplicates keep their best rank."""
+    norcal = [{'name': 'Spark', 'rank': 1}, {'name': 'gaR', 'rank': 2}]
+    googlemtv = [{'name': 'GAR', 'rank': 1}, {'name': 'Bryan', 'rank': 2},
+                 {'name': 'Neal', 'rank': 3}]
+
+    merged = garpr_seeds._merge_rankings([norcal, googlemtv])
+
+    assert [(x['name'], x['rank']) for x in merged] == [
+        ('Spark', 1), ('GAR', 2), ('Bryan', 3), ('Neal', 4)]
+
+
+def seed_players_in(players, region):
+    ranks = garpr_seeds.get_garpr_ranks(players, region)
+    return garpr_seeds.ranks_to_seeds(ranks)
+
+
+def test_multiple_regions():
+    """Each region's rankings are fetched and seeded together."""
+    fetch = Mock(side_effect=lambda region, cache: rankings(region))
+    garpr_seeds._fetch_garpr_rankings = fetch
+    players = ['Spark', 'gaR', 'Rocky', 'Bryan']
+
+    seeds = seed_players_in(players, 'norcal,googlemtv')
+
+    assert sorted(x[0][0] for x in fetch.call_args_list) == ['googlemtv',
+                                                             'norcal']
+    assert seeds == [1, 2, 3, 4]
+    assert seed_players_in(players, ['googlemtv', 'norcal']) == [2, 1, 4, 3]
+
+
+@pytest.fixture
+def sqlite_source(tmpdir):
+    import ranking_sources
+
+    source = ranking_sources.SqliteRankingSource(str(tmpdir.join('pr.db')))
+    source.create_tables()
+    source.add_rankings(rankings('googlemtv'))
+    return source
+
+
+@pytest.fixture
+def csv_source(tmpdir):
+    import ranking_sources
+
+    csv_file = tmpdir.join('pr.csv')
+    csv_file.write('name,rank\n' + ''.join(
+        '"{name}",{rank}\n'.format(**x) for x in rankings('googlemtv')))
+    return ranking_sources.open_ranking_source(str(csv_file))
+
+
+@pytest.mark.parametrize('source_fixture', ['sqlite_source', 'csv_source'])
+def test_ranking_sources(request, source_fixture):
+    """Local ranking sources match names the same way as gaR PR."""
+    source = request.getfixturevalue(source_fixture)
+    players = ['bryan', 'yellow yoshi', 'gar', 'char', 'twig', 'BLAH']
+
+    ranks = garpr_seeds.get_garpr_ranks(players, None, source=source)
+
+    assert garpr_seeds.ranks_to_seeds(ranks) == [2, 3, 1, 3, 5, 6]
+    assert source.get_rankings()[0] == {'name': 'gaR', 'rank': 1}
+
+
+@pytest.mark.parametrize('status_code, content, error', [
+    (500, b'', requests.exceptions.HTTPError),
+    (200, b'{"ranking": [{"name": "Neal"', ValueError),
+])
+def test_fetch_closes_failed_responses(monkeypatch, status_code, content,
+                                       error):
+    class FakeResponse(object):
+        closed = False
+
+        def raise_for_status(self):
+            if status_code >= 400:
+                raise requests.exceptions.HTTPError(response=self)
+
+        def iter_content(self, chunk_size):
+            yield content
+
+        def close(self):
+            self.closed = True
+
+    response = FakeResponse()
+    session = Mock()
+    session.get.return_value = response
+    monkeypatch.setattr(garpr_seeds, 'http_session', session)
+
+    with pytest.raises(error):
+        _fetch_garpr_rankings('norcal')
+    assert response.closed
@@ -0,0 +1,220 @@
+from os.path import dirname, abspath, join
+import json
+import random
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+import requests.exceptions
+
+# Add the parent directory and the benchmarks to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+sys.path.append(join(dirname(CWD), "benchmarks"))
+
+import create_amateur_bracket
+import fake_challonge_server
+import garpr_seeds
+import garpr_seeds_challonge
+import http_replay
+import util_challonge
+
+
+RANKINGS_URL = "https://www.garpr.com:3001/norcal/rankings"
+RANKINGS = {
+    "ranking": [
+        {"name": "Neal", "rank": 1, "rating": 30.0, "player": "a"},
+        {"name": "Bryan", "rank": 2, "rating": 25.0, "player": "b"},
+    ]
+}
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class FakeSession(object):
+    """Answers gaR PR from RANKINGS, and everything else over a real socket
+    with urllib."""
+
+    def __init__(self):
+        self.auth = None
+        self.num_requests = 0
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        self.num_requests += 1
+        if url == RANKINGS_URL:
+            return FakeResponse(200, json.dumps(RANKINGS).encode(),
+                                {"ETag": '"1"', "Server": "gaR PR"})
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        body = urllib.parse.urlencode(data).encode() if data else None
+        request = urllib.request.Request(url, data=body, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return FakeResponse(response.status, response.read(),
+                                    dict(response.headers))
+        except urllib.error.HTTPError as err:
+            return FakeResponse(err.code, err.read(), dict(err.headers))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        pass
+
+
+# Other tests replace this with a Mock, so keep the real one to put back.
+_fetch_garpr_rankings = garpr_seeds._fetch_garpr_rankings
+
+
+@pytest.fixture(autouse=True)
+def restore_sessions(monkeypatch):
+    monkeypatch.setattr(garpr_seeds, "_fetch_garpr_rankings",
+                        _fetch_garpr_rankings)
+    monkeypatch.setattr(garpr_seeds, "http_session", garpr_seeds.http_session)
+    client = util_challonge.set_client(None)
+    yield
+    util_challonge.set_client(client)
+
+
+def replay(tmpdir, recording, filename="cassette.json", **kwargs):
+    path = str(tmpdir.join(filename))
+    recording.save(path)
+    return http_replay.ReplaySession(http_replay.load_cassette(path), **kwargs)
+
+
+@pytest.mark.parametrize("filename", ["cassette.json", "cassette.json.gz"])
+def test_round_trip(tmpdir, filename):
+    recording = http_replay.RecordingSession(FakeSession())
+    recording.auth = ("user", "secret_api_key")
+    response = recording.get(RANKINGS_URL, stream=True)
+    assert response.json() == RANKINGS
+
+    session = replay(tmpdir, recording, filename)
+    response = session.get(RANKINGS_URL, headers={"If-None-Match": '"0"'})
+    assert response.status_code == 200
+    assert response.json() == RANKINGS
+    assert response.headers["etag"] == '"1"'
+    assert "Server" not in response.headers
+    assert session.num_remaining == 0
+    with pytest.raises(http_replay.ReplayMissError):
+        session.get(RANKINGS_URL)
+
+    # Credentials are never saved.
+    with open(str(tmpdir.join(filename)), "rb") as cassette_file:
+        assert b"secret_api_key" not in cassette_file.read()
+
+
+def test_replays_by_request():
+    session = http_replay.ReplaySession([
+        {"method": "GET", "url": "a", "params": [["page", "1"]], "status": 200,
+         "headers": {}, "elapsed": 0, "json": 1},
+        {"method": "GET", "url": "a", "params": [["page", "1"]], "status": 429,
+         "headers": {"Retry-After": "1"}, "elapsed": 0, "text": "slow down"},
+        {"method": "GET", "url": "a", "params": [["page", "1"]], "status": 200,
+         "headers": {}, "elapsed": 0, "json": 2},
+        {"method": "PUT", "url": "a", "params": [["seed", "2"]], "status": 404,
+         "headers": {}, "elapsed": 0, "json": {}},
+    ])
+
+    with pytest.raises(http_replay.ReplayMissError):
+        session.request("GET", "a", params={"page": 2})
+    with pytest.raises(requests.exceptions.HTTPError) as err:
+        session.request("PUT", "a", data=[("seed", 2)]).raise_for_status()
+    assert err.value.response.status_code == 404
+
+    responses = [session.get("a", params={"page": 1}) for _ in range(3)]
+    assert [x.status_code for x in responses] == [200, 429, 200]
+    assert responses[0].json() == 1
+    assert responses[1].text == "slow down"
+    assert responses[2].json() == 2
+
+
+def test_realtime():
+    now = [0]
+    recording = http_replay.RecordingSession(FakeSession(),
+                                             clock=lambda: now[0])
+
+    def slow_request(method, url, **kwargs):
+        now[0] += 0.25
+        return FakeResponse(200, b"[]")
+
+    recording._session.request = slow_request
+    recording.get(RANKINGS_URL)
+
+    slept = []
+    for realtime, expected_sleeps in ((False, []), (True, [0.25])):
+        del slept[:]
+        session = http_replay.ReplaySession(recording.interactions, realtime,
+                                            sleep=slept.append)
+        session.get(RANKINGS_URL)
+        assert slept == expected_sleeps
+
+
+def test_load_cassette_rejects_other_files(tmpdir):
+    path = str(tmpdir.join("rankings.json"))
+    with open(path, "w") as rankings_file:
+        json.dump(RANKINGS, rankings_file)
+    with pytest.raises(ValueError):
+        http_replay.load_cassette(path)
+
+
+def test_replays_seeding(tmpdir):
+    names = ["Bryan", "Paragon", "Neal"]
+    with fake_challonge_server.FakeChallongeServer() as server:
+        server.fake.add_tournament("mtvmelee72", names)
+        recording = http_replay.RecordingSession(FakeSession())
+        util_challonge.set_client(util_challonge.ChallongeClient(
+            session=recording, api_url=server.api_url, scheduler=None))
+        garpr_seeds.http_session = recording
+
+        participants, _ = garpr_seeds_challonge.seed_tournament(
+            "challonge.com/mtvmelee72", "norcal", shuffle=False)
+        num_updated = garpr_seeds_challonge.update_seeds(
+            "challonge.com/mtvmelee72", participants)
+        seeded = [x["display_name"]
+                  for x in server.fake.get_participants("mtvmelee72")]
+    assert seeded == ["Neal", "Bryan", "Paragon"]
+
+    session = replay(tmpdir, recording)
+    util_challonge.set_client(util_challonge.ChallongeClient(
+        session=session, api_url=server.api_url, scheduler=None))
+    garpr_seeds.http_session = session
+    replayed, _ = garpr_seeds_challonge.seed_tournament(
+        "challonge.com/mtvmelee72", "norcal", shuffle=False)
+    assert replayed == participants
+    assert garpr_seeds_challonge.update_seeds(
+        "challonge.com/mtvmelee72", replayed) == num_updated
+    assert session.num_remaining == 0
+
+
+def test_replays_amateur_bracket(tmpdir):
+    names = ["Player{0}".format(x) for x in range(1, 17)]
+
+    def create():
+        return create_amateur_bracket.create_amateur_bracket(
+            "challonge.com/mtvmelee72", single_elimination=False,
+            losers_round_cutoff=2, randomize_seeds=True, rng=random.Random(1))
+
+    with fake_challonge_server.FakeChallongeServer() as server:
+        server.fake.add_tournament("mtvmelee72", names,
+                                   completed_losers_rounds=2)
+        inner_session = FakeSession()
+        recording = http_replay.RecordingSession(inner_session)
+        util_challonge.set_client(util_challonge.ChallongeClient(
+            session=recording, api_url=server.api_url, scheduler=None))
+        recorded_url = create()
+
+    num_requests = inner_session.num_requests
+    session = replay(tmpdir, recording)
+    util_challonge.set_client(util_challonge.ChallongeClient(
+        session=session, api_url=server.api_url, scheduler=None))
+    assert create() == recorded_url
+    assert session.num_remaining == 0
+    assert len(recording.interactions) == num_requests
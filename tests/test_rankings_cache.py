@@ -0,0 +1,186 @@
+import json
+import os
+from os.path import dirname, abspath
+import pytest
+import sys
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import rankings_cache
+import requests.exceptions
+
+
+RANKINGS_URL = 'https://www.garpr.com:3001/norcal/rankings'
+
+
+def compact(ranking):
+    return [{'name': x['name'], 'rank': x['rank'], 'rating': x['rating']}
+            for x in ranking]
+
+
+def rankings_payload(region):
+    test_file = os.path.join(CWD, 'test_data',
+                             '{}_rankings.json'.format(region))
+    with open(test_file) as data:
+        return json.load(data)
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        content = self._payload
+        if not isinstance(content, bytes):
+            content = json.dumps(content).encode()
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(response=self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(object):
+    """Records requests and replies with a queue of canned responses."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False):
+        self.requests.append((url, headers))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def make_cache(tmpdir, session, **kwargs):
+    return rankings_cache.RankingsCache(str(tmpdir), session=session, **kwargs)
+
+
+def test_fetches_and_caches(tmpdir):
+    payload = rankings_payload('norcal')
+    session = FakeSession(FakeResponse(200, payload, {'ETag': '"v1"'}))
+    cache = make_cache(tmpdir, session)
+
+    assert cache.get_rankings('norcal', RANKINGS_URL) == compact(
+        payload['ranking'])
+    assert cache.get_rankings('norcal', RANKINGS_URL) == compact(
+        payload['ranking'])
+    assert len(session.requests) == 1
+
+
+def test_revalidates_stale_rankings(tmpdir):
+    payload = rankings_payload('norcal')
+    session = FakeSession(
+        FakeResponse(200, payload, {'ETag': '"v1"',
+                                    'Last-Modified': 'Sat, 01 Sep 2018'}),
+        FakeResponse(304))
+    cache = make_cache(tmpdir, session, ttl=0)
+
+    cache.get_rankings('norcal', RANKINGS_URL)
+    assert cache.get_rankings('norcal', RANKINGS_URL) == compact(
+        payload['ranking'])
+
+    _, headers = session.requests[1]
+    assert headers == {'If-None-Match': '"v1"',
+                       'If-Modified-Since': 'Sat, 01 Sep 2018'}
+
+
+def test_refetches_rankings_cached_without_all_fields(tmpdir):
+    payload = rankings_payload('norcal')
+    session = FakeSession(FakeResponse(200, payload, {'ETag': '"v1"'}))
+    cache = make_cache(tmpdir, session)
+
+    # An entry saved before ratings were kept, which is otherwise fresh.
+    entry = cache.save('norcal', [{'name': x['name'], 'rank': x['rank']}
+                                  for x in payload['ranking']], etag='"v1"')
+    del entry['fields']
+    with open(cache._get_cache_filename('norcal'), 'w') as cache_file:
+        json.dump(entry, cache_file)
+
+    assert cache.get_rankings('norcal', RANKINGS_URL) == compact(
+        payload['ranking'])
+    assert session.requests == [(RANKINGS_URL, {})]
+    assert cache.get_rankings('norcal', RANKINGS_URL) == compact(
+        payload['ranking'])
+    assert len(session.requests) == 1
+
+
+def test_closes_responses(tmpdir):
+    responses = [
+        FakeResponse(200, rankings_payload('norcal')),
+        FakeResponse(304),
+        FakeResponse(500),
+        FakeResponse(200, b'{"ranking": [{"name": "Neal"'),
+    ]
+    cache = make_cache(tmpdir, FakeSession(*responses), ttl=0)
+
+    cache.get_rankings('norcal', RANKINGS_URL)
+    cache.get_rankings('norcal', RANKINGS_URL)
+    cache.get_rankings('norcal', RANKINGS_URL)
+    with pytest.raises(ValueError):
+        make_cache(tmpdir, FakeSession(responses[3])).get_rankings(
+            'googlemtv', RANKINGS_URL)
+    assert all(x.closed for x in responses)
+
+
+def test_replaces_changed_rankings(tmpdir):
+    cache = make_cache(tmpdir, FakeSession(), ttl=0)
+    cache.save('norcal', rankings_payload('googlemtv')['ranking'], etag='"v1"')
+
+    payload = rankings_payload('norcal')
+    cache._session = FakeSession(FakeResponse(200, payload, {'ETag': '"v2"'}))
+
+    assert cache.get_rankings('norcal', RANKINGS_URL) == compact(
+        payload['ranking'])
+    assert cache.load('norcal')['etag'] == '"v2"'
+
+
+def test_serves_stale_rankings_when_garpr_is_down(tmpdir):
+    ranking = rankings_payload('norcal')['ranking']
+    session = FakeSession(requests.exceptions.ConnectionError())
+    cache = make_cache(tmpdir, session, ttl=0)
+    cache.save('norcal', ranking)
+
+    assert cache.get_rankings('norcal', RANKINGS_URL) == ranking
+
+
+def test_raises_when_garpr_is_down_and_nothing_is_cached(tmpdir):
+    session = FakeSession(FakeResponse(500))
+    cache = make_cache(tmpdir, session)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        cache.get_rankings('norcal', RANKINGS_URL)
+
+
+def test_offline_uses_cache_only(tmpdir):
+    ranking = rankings_payload('norcal')['ranking']
+    session = FakeSession()
+    cache = make_cache(tmpdir, session, ttl=0, offline=True)
+
+    with pytest.raises(rankings_cache.RankingsUnavailableError):
+        cache.get_rankings('norcal', RANKINGS_URL)
+
+    cache.save('norcal', ranking)
+    assert cache.get_rankings('norcal', RANKINGS_URL) == ranking
+    assert session.requests == []
+
+
+def test_regions_are_cached_separately(tmpdir):
+    cache = make_cache(tmpdir, FakeSession())
+    cache.save('norcal', rankings_payload('norcal')['ranking'])
+    cache.save('googlemtv', rankings_payload('googlemtv')['ranking'])
+
+    assert cache.load('norcal')['ranking'] != cache.load('googlemtv')['ranking']
+    assert cache.load('socal') is None
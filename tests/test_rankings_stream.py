@@ -0,0 +1,56 @@
+import json
+import os
+from os.path import dirname, abspath
+import pytest
+import sys
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import rankings_stream
+
+
+def rankings_payload(region):
+    test_file = os.path.join(CWD, 'test_data',
+                             '{}_rankings.json'.format(region))
+    with open(test_file) as data:
+        return json.load(data)
+
+
+def chunked(content, chunk_size):
+    return [content[i:i + chunk_size]
+            for i in range(0, len(content), chunk_size)]
+
+
+@pytest.mark.parametrize('region', ['norcal', 'googlemtv'])
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024, 1 << 20])
+def test_parses_rankings_in_chunks(region, chunk_size):
+    """Rankings come out the same however the payload is split up."""
+    payload = rankings_payload(region)
+    content = json.dumps(payload, indent=2).encode()
+
+    rankings = list(rankings_stream.iter_compact_rankings(
+        chunked(content, chunk_size)))
+
+    assert rankings == [
+        {'name': x['name'], 'rank': x['rank'], 'rating': x['rating']}
+        for x in payload['ranking']]
+
+
+def test_handles_multibyte_characters_split_across_chunks():
+    content = '{"ranking": [{"name": "Ça va", "rank": 1}]}'.encode()
+
+    rankings = list(rankings_stream.iter_compact_rankings(chunked(content, 1)))
+
+    assert rankings == [{'name': 'Ça va', 'rank': 1}]
+
+
+@pytest.mark.parametrize('content', [
+    '{"region": "norcal"}',
+    '{"ranking": [{"name": "Spark", "rank": 1}',
+    '{"ranking": [{"name": "Spark", "ra',
+])
+def test_rejects_incomplete_payloads(content):
+    with pytest.raises(ValueError):
+        list(rankings_stream.iter_compact_rankings([content]))
@@ -0,0 +1,25 @@
+from os.path import dirname, abspath
+import sys
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import seeding_history
+
+
+def test_save_and_load(tmp_path):
+    history = seeding_history.SeedingHistory(str(tmp_path / 'seedings'))
+    assert history.load('mtvmelee72') is None
+
+    history.save('mtvmelee72', [3, 1, 2])
+    history.save('mtvmelee-mtvmelee72', [4, 5])
+
+    assert history.load('mtvmelee72') == [3, 1, 2]
+    assert history.load('mtvmelee-mtvmelee72') == [4, 5]
+
+
+def test_corrupt_file(tmp_path):
+    history = seeding_history.SeedingHistory(str(tmp_path))
+    (tmp_path / 'mtvmelee72.json').write_text('{"participant_ids": [1,')
+    assert history.load('mtvmelee72') is None
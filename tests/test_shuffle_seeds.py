@@ -0,0 +1,169 @@
+import concurrent.futures
+from os.path import dirname, abspath
+import pytest
+import random
+import sys
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import shuffle_seeds
+import shuffle_seeds_challonge
+import util
+
+
+def slow_bucket_sizes(num_participants):
+    """Computes bucket sizes one loser's round at a time."""
+    sizes = []
+    while num_participants > 0:
+        bucket_size = shuffle_seeds.get_num_participants_placing_last(
+            num_participants)
+        sizes.append(bucket_size)
+        num_participants -= bucket_size
+    return sizes
+
+
+def test_bucket_boundaries_example():
+    assert shuffle_seeds.get_bucket_boundaries(9) == (1, 2, 3, 4, 5, 7, 9)
+    assert shuffle_seeds.get_bucket_boundaries(0) == ()
+
+
+@pytest.mark.parametrize('num_participants', range(1, 300))
+def test_bucket_table_matches_elimination(num_participants):
+    """The memoized table gives the same buckets as eliminating by hand."""
+    assert list(shuffle_seeds._get_bucket_sizes(num_participants)) == (
+        slow_bucket_sizes(num_participants))
+
+
+@pytest.mark.parametrize('num_participants', [1, 2, 9, 24, 100, 257])
+def test_bucket_index(num_participants):
+    """Every seed is looked up in the bucket that contains it."""
+    buckets = list(reversed(list(shuffle_seeds._get_buckets(num_participants))))
+
+    for i, bucket in enumerate(buckets):
+        for seed in bucket:
+            assert shuffle_seeds.get_bucket_index(num_participants, seed) == i
+
+    with pytest.raises(ValueError):
+        shuffle_seeds.get_bucket_index(num_participants, num_participants + 1)
+
+
+def assert_preserves_buckets(num_participants, seeds):
+    """Checks that each seed stays within its own bucket."""
+    seeds = [int(x) for x in seeds]
+    assert sorted(seeds) == list(range(1, num_participants + 1))
+    for i, seed in enumerate(seeds, 1):
+        assert shuffle_seeds.get_bucket_index(num_participants, seed) == (
+            shuffle_seeds.get_bucket_index(num_participants, i))
+
+
+@pytest.mark.parametrize('num_participants', [1, 2, 9, 24, 100, 257])
+def test_shuffled_seeds_preserve_buckets(num_participants):
+    assert_preserves_buckets(num_participants,
+                             shuffle_seeds.get_shuffled_seeds(num_participants))
+
+
+@pytest.mark.parametrize('num_participants', [1, 2, 9, 24, 100, 257])
+def test_shuffled_seeds_batch_preserves_buckets(num_participants):
+    seedings = shuffle_seeds.get_shuffled_seeds_batch(num_participants, 20)
+
+    assert isinstance(seedings, list) and len(seedings) == 20
+    for seeds in seedings:
+        assert isinstance(seeds, list)
+        assert_preserves_buckets(num_participants, seeds)
+
+
+def test_shuffled_seeds_batch_varies_seedings():
+    seedings = shuffle_seeds.get_shuffled_seeds_batch(64, 20)
+
+    assert len({tuple(seeds) for seeds in seedings}) > 1
+
+
+def test_shuffled_seeds_are_reproducible():
+    """The same seed gives the same shuffle without touching global state."""
+    seeds = shuffle_seeds.get_shuffled_seeds(100, random.Random(1500))
+
+    random.random()
+    assert shuffle_seeds.get_shuffled_seeds(100, random.Random(1500)) == seeds
+    assert shuffle_seeds.get_shuffled_seeds(100, random.Random(1501)) != seeds
+
+
+def test_shuffled_seeds_batch_is_reproducible():
+    first = shuffle_seeds.get_shuffled_seeds_batch(64, 5, random.Random(7))
+    second = shuffle_seeds.get_shuffled_seeds_batch(64, 5, random.Random(7))
+
+    assert first == second
+
+
+def test_spawned_rngs_are_independent_of_scheduling():
+    """Shuffling with spawned streams gives the same results in threads."""
+    def shuffle_with(rng):
+        return shuffle_seeds.get_shuffled_seeds(128, rng)
+
+    sequential = [shuffle_with(rng) for rng in util.spawn_rngs(42, 8)]
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        threaded = list(executor.map(shuffle_with, util.spawn_rngs(42, 8)))
+
+    assert threaded == sequential
+    assert len({tuple(x) for x in sequential}) == len(sequential)
+
+
+def test_parse_conflict_groups():
+    groups = shuffle_seeds.parse_conflict_groups('Neal, Bryan; gaR,Eden, ; solo')
+
+    assert groups == [['Neal', 'Bryan'], ['gaR', 'Eden']]
+
+
+def test_projected_opponents():
+    # 9 participants play in a 16-person bracket, so only 8 vs. 9 plays in
+    # the first round.
+    opponents = [shuffle_seeds._get_projected_opponent(x, 1, 9)
+                 for x in range(1, 10)]
+    assert opponents == [None] * 7 + [9, 8]
+    assert shuffle_seeds._get_projected_opponent(1, 2, 9) == 8
+    assert shuffle_seeds._get_projected_opponent(9, 2, 9) is None
+
+
+def test_conflict_avoiding_seeds_avoid_conflicts():
+    # Everyone's projected second round opponent is someone they should avoid.
+    conflicts = [[1, 8], [2, 7], [3, 6], [4, 5]]
+    unshuffled_seeds = list(range(1, 10))
+    assert shuffle_seeds.get_conflict_score(unshuffled_seeds, conflicts) == 4
+
+    seeds = shuffle_seeds.get_conflict_avoiding_seeds(9, conflicts,
+                                                      random.Random(1))
+
+    assert_preserves_buckets(9, seeds)
+    assert shuffle_seeds.get_conflict_score(seeds, conflicts) == 0
+
+
+@pytest.mark.parametrize('num_participants', [64, 256, 300])
+def test_conflict_avoiding_seeds_beat_random_shuffles(num_participants):
+    rng = random.Random(num_participants)
+    conflicts = [rng.sample(range(1, num_participants + 1), 2)
+                 for _ in range(num_participants)]
+    conflicts += [rng.sample(range(1, num_participants + 1), 8)
+                  for _ in range(num_participants // 16)]
+
+    seeds = shuffle_seeds.get_conflict_avoiding_seeds(num_participants,
+                                                      conflicts, rng)
+
+    assert_preserves_buckets(num_participants, seeds)
+    random_scores = [
+        shuffle_seeds.get_conflict_score(
+            shuffle_seeds.get_shuffled_seeds(num_participants, rng), conflicts)
+        for _ in range(10)]
+    assert shuffle_seeds.get_conflict_score(seeds, conflicts) <= min(
+        random_scores)
+
+
+def test_named_conflicts_reject_unknown_names(capsys):
+    seeds_for_names = {'neal': 1, 'bryan': 2, 'gar': 3}
+
+    assert shuffle_seeds_challonge._get_named_conflicts(
+        'Neal, Bryan; gaR, Neal', seeds_for_names) == [[1, 2], [3, 1]]
+    with pytest.raises(SystemExit):
+        shuffle_seeds_challonge._get_named_conflicts(
+            'Neal, Bryan; gaR, Eden', seeds_for_names)
+    assert 'Unknown participants: Eden' in capsys.readouterr().err
@@ -0,0 +1,75 @@
+from os.path import dirname, abspath
+import pytest
+import sys
+
+# Add the parent directory to the path
+CWD = dirname(abspath(__file__))
+sys.path.append(dirname(CWD))
+
+import create_amateur_bracket
+import simulate_bracket
+
+
+def test_favorites_always_win():
+    # With a tiny rating scale, the better-rated player always wins.
+    ratings = [100 - x for x in range(9)]
+    results = simulate_bracket.simulate_bracket(
+        ratings, num_trials=50, rating_scale=1e-3, num_processes=1, seed=0)
+    for seed in range(1, 10):
+        assert results.get_hold_probability(seed) == 1.0
+
+
+def test_upsets():
+    # Reversing the ratings means the bottom seed always wins.
+    ratings = list(range(8))
+    results = simulate_bracket.simulate_bracket(
+        ratings, num_trials=50, rating_scale=1e-3, num_processes=1, seed=0)
+    assert results.get_placement_distribution(8) == {1: 1.0}
+    assert results.get_hold_probability(1) == 0.0
+
+
+def test_placement_distributions():
+    ratings = [30, 28, 25, None, 20, 19, 18]
+    results = simulate_bracket.simulate_bracket(
+        ratings, num_trials=2000, num_processes=1, seed=0)
+    for seed in range(1, len(ratings) + 1):
+        distribution = results.get_placement_distribution(seed)
+        assert sum(distribution.values()) == pytest.approx(1.0)
+        assert set(distribution) <= {1, 2, 3, 4, 5, 7}
+    assert results.get_hold_probability(1) > results.get_hold_probability(5)
+
+
+@pytest.mark.parametrize("num_participants", [1, 2, 5, 9, 24])
+def test_amateurs(num_participants):
+    ratings = [None] * num_participants
+    results = simulate_bracket.simulate_bracket(
+        ratings, num_trials=100, cutoff=2, num_processes=1, seed=0)
+    assert results.get_num_amateurs() == (
+        create_amateur_bracket._get_num_amateurs(num_participants, 2))
+
+
+def test_losers_rounds_minutes():
+    # Nine people only play one set in each of the first two loser's rounds.
+    ratings = [None] * 9
+    results = simulate_bracket.simulate_bracket(
+        ratings, num_trials=500, best_of=3, minutes_per_game=5, num_processes=1,
+        seed=0)
+    assert 20 <= results.get_mean_losers_rounds_minutes() <= 30
+    assert results.get_losers_rounds_minutes_percentile(0) >= 20
+    assert results.get_losers_rounds_minutes_percentile(100) <= 30
+
+
+def test_same_results_for_any_number_of_processes():
+    ratings = [30, 28, 25, 24, 20, None, 19, 18, 10]
+    one_process = simulate_bracket.simulate_bracket(
+        ratings, num_trials=3000, num_processes=1, seed=7)
+    several_processes = simulate_bracket.simulate_bracket(
+        ratings, num_trials=3000, num_processes=2, seed=7)
+    assert one_process.placement_counts == several_processes.placement_counts
+    assert one_process.games_counts == several_processes.games_counts
+
+
+def test_format_placement():
+    assert [simulate_bracket._format_placement(x)
+            for x in (1, 2, 3, 4, 11, 13, 21, 33)] == [
+        "1st", "2nd", "3rd", "4th", "11th", "13th", "21st", "33rd"]
@@ -1,14 +1,46 @@
 from os.path import dirname, abspath
 import pytest
+import random
 import sys
 
 # Add the parent directory to the path
 CWD = dirname(abspath(__file__))
 sys.path.append(dirname(CWD))
 
+import challonge
+import requests.exceptions
 import util_challonge
 
 
+class FakeResponse(object):
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                '{} Error'.format(self.status_code), response=self)
+
+
+class FakeSession(object):
+    def __init__(self, *responses):
+        self.auth = None
+        self.requests = []
+        self._responses = list(responses)
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        return self._responses.pop(0)
+
+    def close(self):
+        pass
+
+
 @pytest.mark.parametrize('url, expected', [
     ('https://challonge.com/mtvmelee82', 'mtvmelee82'),
     ('challonge.com/mtvmelee82', 'mtvmelee82'),
@@ -26,3 +58,314 @@ def test_extract_tourney_name(url, expected):
     except ValueError as e:
         if expected != ValueError:
             raise e
+
+
+def test_client_unwraps_responses():
+    session = FakeSession(FakeResponse(200, [
+        {'participant': {'id': 1, 'seed': 2}},
+        {'participant': {'id': 2, 'seed': 1}},
+    ]))
+    client = util_challonge.ChallongeClient('user', 'key', timeout=3,
+                                            session=session)
+
+    assert client.participants.index('mtvmelee72') == [
+        {'id': 1, 'seed': 2}, {'id': 2, 'seed': 1}]
+    assert session.auth == ('user', 'key')
+    assert session.requests == [(
+        'GET',
+        'https://api.challonge.com/v1/tournaments/mtvmelee72/participants.json',
+        {'timeout': 3, 'params': []},
+    )]
+
+
+def test_client_api_url():
+    session = FakeSession(FakeResponse(200, {'tournament': {'id': 1}}))
+    client = util_challonge.ChallongeClient(
+        'user', 'key', session=session, api_url='http://127.0.0.1:8000/v1')
+
+    client.tournaments.show('mtvmelee72')
+    assert session.requests[0][1] == (
+        'http://127.0.0.1:8000/v1/tournaments/mtvmelee72.json')
+
+
+def test_client_prefixes_params():
+    session = FakeSession(FakeResponse(200, {'participant': {'id': 1}}))
+    client = util_challonge.ChallongeClient('user', 'key', session=session)
+
+    client.participants.update('mtvmelee72', 1, seed=3, misc=None,
+                               invite=False)
+
+    method, url, kwargs = session.requests[0]
+    assert method == 'PUT'
+    assert url.endswith('/tournaments/mtvmelee72/participants/1.json')
+    assert kwargs['data'] == [('participant[seed]', 3),
+                              ('participant[invite]', 'false')]
+
+
+def test_client_bulk_adds_participants():
+    session = FakeSession(FakeResponse(200, [
+        {'participant': {'id': 1}}, {'participant': {'id': 2}}]))
+    client = util_challonge.ChallongeClient('user', 'key', session=session)
+
+    assert client.participants.bulk_add('mtvmelee72', [
+        {'name': 'Neal', 'seed': 1},
+        {'name': 'Bryan', 'seed': 2, 'invite_name_or_email': 'bryan'},
+    ]) == [{'id': 1}, {'id': 2}]
+
+    method, url, kwargs = session.requests[0]
+    assert method == 'POST'
+    assert url.endswith('/tournaments/mtvmelee72/participants/bulk_add.json')
+    assert sorted(kwargs['data'][:2]) == [('participants[][name]', 'Neal'),
+                                          ('participants[][seed]', 1)]
+    assert sorted(kwargs['data'][2:]) == [
+        ('participants[][invite_name_or_email]', 'bryan'),
+        ('participants[][name]', 'Bryan'),
+        ('participants[][seed]', 2)]
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_client_caches_reads():
+    clock = FakeClock()
+    session = FakeSession(*[FakeResponse(200, [{'participant': {'id': x}}])
+                            for x in range(1, 5)])
+    cache = util_challonge.ResponseCache({'participants.index': 10},
+                                         clock=clock)
+    client = util_challonge.ChallongeClient('user', 'key', session=session,
+                                            cache=cache)
+
+    participants = client.participants.index('mtvmelee72')
+    participants[0]['seed'] = 3
+    assert client.participants.index('mtvmelee72') == [{'id': 1}]
+    assert len(session.requests) == 1
+
+    # Other credentials don't share responses.
+    client.set_credentials('other_user', 'other_key')
+    assert client.participants.index('mtvmelee72') == [{'id': 2}]
+    client.set_credentials('user', 'key')
+
+    clock.now = 10
+    assert client.participants.index('mtvmelee72') == [{'id': 3}]
+    assert client.participants.index('mtvmelee72') == [{'id': 3}]
+    assert len(session.requests) == 3
+
+    # Fresh reads always ask Challonge, and are cached for later reads.
+    assert client.participants.index('mtvmelee72', fresh=True) == [{'id': 4}]
+    assert client.participants.index('mtvmelee72') == [{'id': 4}]
+    assert len(session.requests) == 4
+    assert 'fresh' not in str(session.requests[-1])
+
+
+def test_client_invalidates_cache_on_writes():
+    session = FakeSession(
+        FakeResponse(200, {'tournament': {'id': 1}}),
+        FakeResponse(200, {'participant': {'id': 2}}),
+        FakeResponse(200, {'tournament': {'id': 1, 'participants_count': 1}}),
+    )
+    client = util_challonge.ChallongeClient('user', 'key', session=session)
+
+    client.tournaments.show('mtvmelee72')
+    client.participants.create('mtvmelee72', 'Neal')
+
+    assert client.tournaments.show('mtvmelee72') == {
+        'id': 1, 'participants_count': 1}
+    assert len(session.requests) == 3
+
+
+def test_client_drops_reads_that_race_writes():
+    class RacingSession(FakeSession):
+        def request(self, method, url, **kwargs):
+            # Another thread writes to the tournament while this is in flight.
+            if method == 'GET' and not self.requests:
+                client.participants.create('mtvmelee72', 'Neal')
+            return super(RacingSession, self).request(method, url, **kwargs)
+
+    session = RacingSession(
+        FakeResponse(200, {'participant': {'id': 2}}),
+        FakeResponse(200, []),
+        FakeResponse(200, [{'participant': {'id': 2}}]),
+    )
+    client = util_challonge.ChallongeClient('user', 'key', session=session,
+                                            scheduler=None)
+
+    assert client.participants.index('mtvmelee72') == []
+    assert client.participants.index('mtvmelee72') == [{'id': 2}]
+    assert len(session.requests) == 3
+
+
+def test_response_cache_drops_responses_from_older_generations():
+    cache = util_challonge.ResponseCache({'matches.index': 10})
+    generation = cache.generation('a')
+    other_generation = cache.generation('b')
+    cache.invalidate('a')
+    cache.put(('a', 'matches.index'), 1, generation)
+    cache.put(('b', 'matches.index'), 2, other_generation)
+    assert cache.get(('a', 'matches.index')) is None
+    assert cache.get(('b', 'matches.index')) == 2
+
+    generation = cache.generation('a')
+    cache.clear()
+    cache.put(('a', 'matches.index'), 1, generation)
+    assert cache.get(('a', 'matches.index')) is None
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = util_challonge.ResponseCache({'matches.index': 10}, max_entries=2)
+    cache.put(('a', 'matches.index'), 1)
+    cache.put(('b', 'matches.index'), 2)
+    cache.get(('a', 'matches.index'))
+    cache.put(('c', 'matches.index'), 3)
+    cache.put(('c', 'participants.show'), 4)
+
+    assert cache.get(('a', 'matches.index')) == 1
+    assert cache.get(('b', 'matches.index')) is None
+    assert cache.get(('c', 'matches.index')) == 3
+    assert cache.get(('c', 'participants.show')) is None
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(fake_time, **kwargs):
+    return util_challonge.RequestScheduler(
+        clock=fake_time.clock, sleep=fake_time.sleep, rng=random.Random(0),
+        **kwargs)
+
+
+def test_scheduler_paces_requests():
+    fake_time = FakeTime()
+    scheduler = make_scheduler(fake_time, requests_per_second=2, burst=3)
+    sent_at = []
+    for _ in range(7):
+        scheduler.send('PUT', lambda: sent_at.append(fake_time.now) or
+                       FakeResponse(200))
+    assert sent_at == [0, 0, 0, 0.5, 1.0, 1.5, 2.0]
+
+
+def test_scheduler_retries():
+    fake_time = FakeTime()
+    scheduler = make_scheduler(fake_time, retry_delay=1, max_retry_delay=3)
+    responses = [FakeResponse(429, headers={'Retry-After': '7'}),
+                 FakeResponse(503), FakeResponse(503), FakeResponse(503),
+                 FakeResponse(200)]
+    response = scheduler.send('GET', lambda: responses.pop(0))
+
+    assert response.status_code == 200
+    # Retry-After is capped by the max delay, and the backoff doubles from
+    # there.
+    assert fake_time.sleeps[0] == 3
+    assert 0 <= fake_time.sleeps[1] <= 2
+    assert 0 <= fake_time.sleeps[2] <= 3
+    assert 0 <= fake_time.sleeps[3] <= 3
+
+
+def test_scheduler_gives_up():
+    fake_time = FakeTime()
+    scheduler = make_scheduler(fake_time, max_retries=2)
+    responses = [FakeResponse(500), FakeResponse(502), FakeResponse(503)]
+    assert scheduler.send('PUT', lambda: responses.pop(0)).status_code == 503
+
+    # Creating something twice is worse than failing.
+    responses = [FakeResponse(500), FakeResponse(200)]
+    assert scheduler.send('POST', lambda: responses.pop(0)).status_code == 500
+    responses = [FakeResponse(429), FakeResponse(200)]
+    assert scheduler.send('POST', lambda: responses.pop(0)).status_code == 200
+
+
+def test_client_retries_rate_limited_requests():
+    fake_time = FakeTime()
+    session = FakeSession(FakeResponse(429, headers={'Retry-After': '2'}),
+                          FakeResponse(200, {'participant': {'id': 1}}))
+    client = util_challonge.ChallongeClient(
+        'user', 'key', session=session, scheduler=make_scheduler(fake_time))
+
+    assert client.participants.create('mtvmelee72', 'Neal') == {'id': 1}
+    assert len(session.requests) == 2
+    assert fake_time.sleeps == [2]
+
+
+def test_client_errors():
+    session = FakeSession(FakeResponse(404),
+                          FakeResponse(422, {'errors': ['Name is taken']}))
+    util_challonge.set_client(
+        util_challonge.ChallongeClient('user', 'key', session=session))
+
+    try:
+        assert util_challonge.get_tourney_info('mtvmelee72') is None
+        with pytest.raises(challonge.api.ChallongeException):
+            util_challonge.get_client().tournaments.create(
+                'MTV Melee', 'mtvmelee72')
+    finally:
+        util_challonge.set_client(None)
+
+
+def test_set_credentials_keeps_client():
+    previous_client = util_challonge.set_client(None)
+    try:
+        util_challonge.set_credentials('user', 'key')
+        client = util_challonge.get_client()
+        util_challonge.set_credentials('other_user', 'other_key')
+        assert util_challonge.get_client() is client
+    finally:
+        util_challonge.set_client(previous_client)
+
+
+def apply_seed_updates(order, updates):
+    order = list(order)
+    for participant_id, seed in updates:
+        order.remove(participant_id)
+        order.insert(seed - 1, participant_id)
+    return order
+
+
+@pytest.mark.parametrize('current, target, num_updates', [
+    ([], [], 0),
+    ([1, 2, 3, 4], [1, 2, 3, 4], 0),
+    ([1, 2, 3, 4], [2, 3, 4, 1], 1),
+    ([1, 2, 3, 4], [4, 1, 2, 3], 1),
+    ([3, 4, 1, 2], [1, 2, 3, 4], 2),
+    ([1, 2, 3, 4], [4, 3, 2, 1], 3),
+])
+def test_plan_seed_updates(current, target, num_updates):
+    updates = util_challonge.plan_seed_updates(current, target)
+    assert apply_seed_updates(current, updates) == target
+    assert len(updates) == num_updates
+
+
+def test_plan_seed_updates_random():
+    rng = random.Random(0)
+    for size in range(1, 130):
+        current = rng.sample(range(1000), size)
+        target = rng.sample(current, size)
+        updates = util_challonge.plan_seed_updates(current, target)
+        assert apply_seed_updates(current, updates) == target
+
+        # Swapping two neighbors only takes one update.
+        if size > 1:
+            target = list(current)
+            i = rng.randrange(1, size)
+            target[i - 1], target[i] = target[i], target[i - 1]
+            updates = util_challonge.plan_seed_updates(current, target)
+            assert apply_seed_updates(current, updates) == target
+            assert len(updates) == 1
+
+
+def test_plan_seed_updates_different_participants():
+    with pytest.raises(ValueError):
+        util_challonge.plan_seed_updates([1, 2], [1, 3])
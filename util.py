@@ -8,7 +8,7 @@ import argparse
 import random
 
 
-def shuffle(values):
+def shuffle(values, rng=None):
     """Returns the list of values shuffled.
 
     This is different from random.shuffle because it returns a new list
@@ -16,11 +16,39 @@ def shuffle(values):
 
     Args:
       values: A list of arbitrary values.
+      rng: The random.Random to shuffle with. Defaults to the global random
+           number generator.
 
     Returns:
       The values shuffled into a random order.
     """
-    return random.sample(values, len(values))
+    if rng is None:
+        rng = random
+    return rng.sample(values, len(values))
+
+
+def spawn_rngs(seed, count):
+    """Creates independent random number generators from a single seed.
+
+    Each generator gets its own stream, so work can be split across threads or
+    processes with one generator each and still give the same results no
+    matter how it's split up or scheduled.
+
+    Args:
+      seed: The seed to derive the generators from. If None, each generator
+            is seeded from the operating system instead.
+      count: The number of generators to create.
+
+    Returns:
+      A list of count random.Random instances. The same seed always gives the
+      same generators, in the same order.
+    """
+    if seed is None:
+        return [random.Random() for _ in range(count)]
+
+    # String seeds are hashed with SHA-512, so similar strings still give
+    # unrelated streams, and the result doesn't change between runs.
+    return [random.Random("{0}/{1}".format(seed, i)) for i in range(count)]
 
 
 def flatten(lists):
@@ -1,16 +1,626 @@
 #!/usr/bin/env python3
 
 
-"""Various common utility functions that interact with Challonge."""
+"""Various common utility functions that interact with Challonge.
 
+All Challonge API calls go through a ChallongeClient, which keeps a pool of
+connections open to Challonge instead of setting up a new connection for every
+request. Scripts set up the shared client with set_credentials or
+set_challonge_credentials_from_config, then make calls with e.g.
+get_client().participants.index(tourney_name).
 
+Responses from tournaments.show and the index endpoints are reused for a
+short while, so looking up the same tournament again doesn't mean another
+round trip. Anything we change on a tournament throws out what we knew about
+it. Requests are paced to stay under Challonge's rate limits, and retried if
+they're rate limited anyway or hit a server error.
+"""
+
+
+import bisect
 import challonge
+import collections
+import copy
+import email.utils
+import os
+import random
 import re
+import requests
+import requests.adapters
 import requests.exceptions
+import threading
+import time
 
+import defaults
 from parse_challonge_credentials import safe_parse_challonge_credentials_from_config
 
 
+# Where the Challonge API is. Set the CHALLONGE_API_URL environment variable
+# to use something else, like benchmarks/fake_challonge_server.py.
+CHALLONGE_API_URL = os.environ.get("CHALLONGE_API_URL",
+                                   "https://api.challonge.com/v1")
+
+# Stands in for the default value of arguments that can be None to turn a
+# feature off.
+_DEFAULT = object()
+
+# Responses that mean Challonge didn't handle a request and it can be tried
+# again later. Server errors are only retried for requests that are safe to
+# repeat.
+_RATE_LIMITED_STATUS = 429
+_SERVER_ERROR_STATUSES = frozenset((500, 502, 503, 504))
+_IDEMPOTENT_METHODS = frozenset(("GET", "PUT", "DELETE"))
+
+
+def _prepare_params(params, prefix=None):
+    """Converts API call arguments into request parameters.
+
+    e.g. {"seed": 3, "misc": True}, "participant" =>
+         [("participant[seed]", 3), ("participant[misc]", "true")]
+
+    Args:
+      params: A dictionary of arguments for the API call.
+      prefix: The type of object the parameters are for, if Challonge expects
+              them to be nested under it.
+
+    Returns:
+      A list of (key, value) tuples to send with the request. None values
+      are left out.
+    """
+    prepared = []
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = str(value).lower()
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat()
+        if prefix:
+            key = "{0}[{1}]".format(prefix, key)
+        prepared.append((key, value))
+    return prepared
+
+
+def _unwrap(data):
+    """Unwraps objects in a Challonge response.
+
+    Challonge wraps every object in its type, e.g. {"tournament": {...}}, so
+    this strips that off to get the same dictionaries the challonge module
+    returns.
+    """
+    if isinstance(data, list):
+        return [_unwrap(x) for x in data]
+    if isinstance(data, dict) and len(data) == 1:
+        value = next(iter(data.values()))
+        if isinstance(value, dict):
+            return value
+    return data
+
+
+def _get_endpoint(uri):
+    """Gets the tournament and endpoint that an API path is for.
+
+    e.g. "tournaments/mtvmelee72/participants" =>
+         ("mtvmelee72", "participants.index")
+
+    Returns:
+      A (tournament, endpoint) tuple. The tournament is None for paths that
+      aren't about a single tournament, and the endpoint is None for paths
+      other than tournaments.show and the index endpoints.
+    """
+    parts = uri.split("/")
+    if parts[0] != "tournaments" or len(parts) < 2:
+        return None, None
+    if len(parts) == 2:
+        return parts[1], "tournaments.show"
+    if len(parts) == 3:
+        return parts[1], "{0}.index".format(parts[2])
+    return parts[1], None
+
+
+class ResponseCache(object):
+    """Reuses responses from read-only Challonge endpoints for a while.
+
+    Responses are kept for as long as their endpoint's TTL, and the least
+    recently used ones are thrown out once the cache is full. Responses are
+    copied going in and out, so callers are free to change them.
+
+    Every tournament has a generation that goes up whenever its responses are
+    thrown out. A response fetched under an older generation may be from
+    before a change, so it's dropped instead of cached.
+
+    Args:
+      ttls: A dictionary from endpoints, e.g. "participants.index", to the
+            number of seconds to reuse their responses for. Other endpoints
+            aren't cached.
+      max_entries: The most responses to keep at once.
+      clock: A function that returns the current time in seconds.
+    """
+
+    def __init__(self, ttls=defaults.DEFAULT_CHALLONGE_CACHE_TTLS,
+                 max_entries=defaults.DEFAULT_CHALLONGE_CACHE_SIZE,
+                 clock=time.monotonic):
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._generations = {}
+        self._num_clears = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Gets a response if it's cached and hasn't expired.
+
+        Args:
+          key: A tuple whose first item is the tournament the response is
+               about, and whose second item is the endpoint.
+
+        Returns:
+          A copy of the response, or None if it isn't cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if self._clock() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def generation(self, tournament):
+        """Gets the current generation of a tournament's responses.
+
+        Get it before fetching a response to cache, and pass it to put.
+        """
+        with self._lock:
+            return (self._num_clears, self._generations.get(tournament, 0))
+
+    def put(self, key, value, generation=None):
+        """Caches a response, if its endpoint is cached.
+
+        Args:
+          key: The same as for get.
+          value: The response.
+          generation: The generation of the tournament from before the
+                      response was fetched. The response isn't cached if the
+                      tournament's responses have been thrown out since.
+        """
+        ttl = self.ttls.get(key[1])
+        if not ttl:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            if generation is not None and generation != (
+                    self._num_clears, self._generations.get(key[0], 0)):
+                return
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tournament):
+        """Throws out every response about a tournament."""
+        with self._lock:
+            self._generations[tournament] = (
+                self._generations.get(tournament, 0) + 1)
+            for key in [x for x in self._entries if x[0] == tournament]:
+                del self._entries[key]
+
+    def clear(self):
+        """Throws out every response."""
+        with self._lock:
+            self._num_clears += 1
+            self._entries.clear()
+
+
+def _get_retry_after(response):
+    """Gets how many seconds a response's Retry-After header asks us to wait.
+
+    Returns:
+      The number of seconds, or None if the response doesn't say.
+    """
+    retry_after = getattr(response, "headers", {}).get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RequestScheduler(object):
+    """Paces Challonge requests and retries the ones that can be retried.
+
+    Requests are spaced out with a token bucket, so bursts of calls like
+    reseeding a whole bracket go out at the allowed rate instead of getting
+    rate limited. Requests that are rate limited anyway (429), or that hit a
+    server error and are safe to repeat, are retried with exponential backoff
+    and jitter, or after however long Challonge's Retry-After header says.
+    While one request is backing off from a 429, every request waits.
+
+    The scheduler is thread-safe, and only lets max_concurrency requests be
+    in flight at once.
+
+    Args:
+      requests_per_second: The average number of requests to send per second.
+      burst: The most requests that can be sent back to back.
+      max_concurrency: The most requests to have in flight at once.
+      max_retries: The most times to retry a request.
+      retry_delay: The seconds to wait before the first retry.
+      max_retry_delay: The most seconds to wait before any retry.
+      clock: A function that returns the current time in seconds.
+      sleep: A function that waits for some number of seconds.
+      rng: The random.Random used for jitter.
+    """
+
+    def __init__(
+        self,
+        requests_per_second=defaults.DEFAULT_CHALLONGE_REQUESTS_PER_SECOND,
+        burst=defaults.DEFAULT_CHALLONGE_BURST,
+        max_concurrency=defaults.DEFAULT_CHALLONGE_POOL_SIZE,
+        max_retries=defaults.DEFAULT_CHALLONGE_MAX_RETRIES,
+        retry_delay=defaults.DEFAULT_CHALLONGE_RETRY_DELAY,
+        max_retry_delay=defaults.DEFAULT_CHALLONGE_MAX_RETRY_DELAY,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        rng=None,
+    ):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._tokens = float(burst)
+        self._updated_at = clock()
+        self._paused_until = 0.0
+
+    def _take_token(self):
+        """Waits until a request can be sent, then counts it against the
+        rate."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated_at) * self.requests_per_second,
+                )
+                self._updated_at = now
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.requests_per_second
+            self._sleep(wait)
+
+    def _get_retry_delay(self, attempt, response):
+        """Gets how long to wait before retrying a request.
+
+        Args:
+          attempt: How many times the request has been retried already.
+          response: The response to the last try.
+        """
+        retry_after = _get_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_delay)
+
+        # "Full jitter": wait a random amount up to the backoff, so requests
+        # that failed together don't all retry together.
+        backoff = min(self.max_retry_delay, self.retry_delay * 2 ** attempt)
+        return self._rng.uniform(0, backoff)
+
+    def send(self, method, send):
+        """Sends a request, retrying it if it can be.
+
+        Args:
+          method: The HTTP method of the request, e.g. "GET".
+          send: A function that sends the request and returns its response.
+
+        Returns:
+          The response to the last try, which may still be an error if we ran
+          out of retries or the error can't be retried.
+        """
+        attempt = 0
+        while True:
+            with self._slots:
+                self._take_token()
+                response = send()
+
+            retryable = response.status_code == _RATE_LIMITED_STATUS or (
+                response.status_code in _SERVER_ERROR_STATUSES
+                and method in _IDEMPOTENT_METHODS
+            )
+            if not retryable or attempt >= self.max_retries:
+                return response
+
+            delay = self._get_retry_delay(attempt, response)
+            if response.status_code == _RATE_LIMITED_STATUS:
+                # Hold off everybody, not just this request.
+                with self._lock:
+                    self._paused_until = max(self._paused_until,
+                                             self._clock() + delay)
+            self._sleep(delay)
+            attempt += 1
+
+
+class _Tournaments(object):
+    def __init__(self, client):
+        self._client = client
+
+    def show(self, tournament, **params):
+        return self._client.fetch("GET", "tournaments/{0}".format(tournament), **params)
+
+    def create(self, name, url, tournament_type="single elimination", **params):
+        params.update(name=name, url=url, tournament_type=tournament_type)
+        return self._client.fetch("POST", "tournaments", "tournament", **params)
+
+
+class _Participants(object):
+    def __init__(self, client):
+        self._client = client
+
+    def index(self, tournament, **params):
+        return self._client.fetch(
+            "GET", "tournaments/{0}/participants".format(tournament), **params
+        )
+
+    def show(self, tournament, participant_id, **params):
+        return self._client.fetch(
+            "GET",
+            "tournaments/{0}/participants/{1}".format(tournament, participant_id),
+            **params
+        )
+
+    def create(self, tournament, name, **params):
+        params.update(name=name)
+        return self._client.fetch(
+            "POST",
+            "tournaments/{0}/participants".format(tournament),
+            "participant",
+            **params
+        )
+
+    def update(self, tournament, participant_id, **params):
+        return self._client.fetch(
+            "PUT",
+            "tournaments/{0}/participants/{1}".format(tournament, participant_id),
+            "participant",
+            **params
+        )
+
+    def bulk_add(self, tournament, participants):
+        """Adds several participants with one call.
+
+        Args:
+          tournament: The name of the tournament.
+          participants: A list of dictionaries of params for each participant,
+                        e.g. [{"name": "Neal", "seed": 1}]. Challonge takes
+                        "name", "seed", "misc" and "invite_name_or_email".
+
+        Returns:
+          A list of the new participants.
+        """
+        params = [
+            x for participant in participants
+            for x in _prepare_params(participant, "participants[]")
+        ]
+        return self._client.request(
+            "POST",
+            "tournaments/{0}/participants/bulk_add".format(tournament),
+            params,
+        )
+
+
+class _Matches(object):
+    def __init__(self, client):
+        self._client = client
+
+    def index(self, tournament, **params):
+        return self._client.fetch(
+            "GET", "tournaments/{0}/matches".format(tournament), **params
+        )
+
+
+class ChallongeClient(object):
+    """Makes Challonge API calls over a pool of keep-alive connections.
+
+    Calls are grouped the same way as the challonge module, e.g.
+    client.participants.update(tourney_name, participant_id, seed=1), and
+    return the same dictionaries. Errors are raised the same way too: a
+    requests.exceptions.HTTPError for failed requests, or a
+    challonge.api.ChallongeException if Challonge rejects the parameters.
+
+    Args:
+      user: Your Challonge username.
+      api_key: Your Challonge API key.
+      pool_size: The most connections to keep open to Challonge at once.
+      timeout: The seconds to wait for Challonge before giving up, either as
+               a single number or a (connect, read) tuple.
+      session: An optional requests.Session to make requests with. If this
+               is given, pool_size is ignored.
+      api_url: The URL of the Challonge API. Defaults to CHALLONGE_API_URL.
+      cache: An optional ResponseCache to reuse responses from
+             tournaments.show and the index endpoints with. Defaults to a
+             new ResponseCache. Pass None to always call Challonge.
+      scheduler: An optional RequestScheduler to pace and retry requests
+                 with. Defaults to a new RequestScheduler allowing as many
+                 requests at once as the pool has connections. Pass None to
+                 send requests right away and never retry them.
+    """
+
+    def __init__(self, user=None, api_key=None,
+                 pool_size=defaults.DEFAULT_CHALLONGE_POOL_SIZE,
+                 timeout=defaults.DEFAULT_CHALLONGE_TIMEOUT, session=None,
+                 api_url=None, cache=_DEFAULT, scheduler=_DEFAULT):
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        if cache is _DEFAULT:
+            cache = ResponseCache()
+        if scheduler is _DEFAULT:
+            scheduler = RequestScheduler(max_concurrency=pool_size)
+        self._session = session
+        self._timeout = timeout
+        self.api_url = api_url or CHALLONGE_API_URL
+        self.cache = cache
+        self.scheduler = scheduler
+        self.set_credentials(user, api_key)
+
+        self.tournaments = _Tournaments(self)
+        self.participants = _Participants(self)
+        self.matches = _Matches(self)
+
+    def set_credentials(self, user, api_key):
+        """Changes the credentials used for future calls."""
+        self._session.auth = (user, api_key) if user else None
+
+    def fetch(self, method, uri, params_prefix=None, fresh=False, **params):
+        """Makes a Challonge API call.
+
+        Args:
+          method: The HTTP method, e.g. "GET".
+          uri: The path of the API endpoint, without the ".json", e.g.
+               "tournaments/mtvmelee72".
+          params_prefix: The type of object the parameters are for, if
+                         Challonge expects them to be nested under it.
+          fresh: Whether to ask Challonge even if a cached response is still
+                 young enough to use, e.g. when the call has to see changes
+                 made in Challonge's UI. The response is still cached.
+          params: The arguments for the call.
+
+        Raises:
+          requests.exceptions.HTTPError: If the request failed.
+          challonge.api.ChallongeException: If Challonge rejected the
+                                            parameters.
+
+        Returns:
+          The response, with each object unwrapped from its type.
+        """
+        return self.request(method, uri, _prepare_params(params, params_prefix),
+                            fresh)
+
+    def request(self, method, uri, params, fresh=False):
+        """Makes a Challonge API call with already prepared parameters.
+
+        Args:
+          method, uri, fresh: The same as for fetch.
+          params: A list of (key, value) tuples, as from _prepare_params.
+
+        Raises:
+          The same errors as fetch.
+
+        Returns:
+          The same as fetch.
+        """
+        if self.cache is None:
+            return self._send(method, uri, params)
+
+        tournament, endpoint = _get_endpoint(uri)
+        if method != "GET":
+            # Whatever we knew about the tournament may be out of date now,
+            # even if the call fails partway through.
+            try:
+                return self._send(method, uri, params)
+            finally:
+                if tournament:
+                    self.cache.invalidate(tournament)
+
+        # Different credentials can see different tournaments.
+        key = (tournament, endpoint, self._session.auth, tuple(params))
+        response = None if fresh else self.cache.get(key)
+        if response is None:
+            # A write that finishes while this is in flight makes the
+            # response out of date before it's cached.
+            generation = self.cache.generation(tournament)
+            response = self._send(method, uri, params)
+            if endpoint:
+                self.cache.put(key, response, generation)
+        return response
+
+    def _send(self, method, uri, params):
+        """Sends a Challonge API call, skipping the cache."""
+        if method in ("POST", "PUT"):
+            request_params = {"data": params}
+        else:
+            request_params = {"params": params}
+
+        def send():
+            return self._session.request(
+                method,
+                "{0}/{1}.json".format(self.api_url, uri),
+                timeout=self._timeout,
+                **request_params
+            )
+
+        if self.scheduler is None:
+            response = send()
+        else:
+            response = self.scheduler.send(method, send)
+        if response.status_code == 422:
+            raise challonge.api.ChallongeException(*response.json()["errors"])
+        response.raise_for_status()
+        return _unwrap(response.json())
+
+    def close(self):
+        """Closes any open connections."""
+        self._session.close()
+
+
+# The client shared by everything that talks to Challonge.
+_client = None
+
+
+def get_client():
+    """Gets the shared Challonge client.
+
+    If no credentials have been set yet, the client makes unauthenticated
+    calls, which Challonge will reject.
+    """
+    global _client
+    if _client is None:
+        _client = ChallongeClient()
+    return _client
+
+
+def set_client(client):
+    """Replaces the shared Challonge client, e.g. with a fake for testing.
+
+    Returns:
+      The client that was being used before.
+    """
+    global _client
+    previous_client = _client
+    _client = client
+    return previous_client
+
+
+def set_credentials(user, api_key):
+    """Sets the credentials of the shared Challonge client.
+
+    The client's open connections are kept, so switching credentials doesn't
+    mean reconnecting to Challonge.
+    """
+    get_client().set_credentials(user, api_key)
+
+
 def set_challonge_credentials_from_config(config_filename):
     """Sets up your Challonge API credentials from info in a config file.
 
@@ -24,7 +634,7 @@ def set_challonge_credentials_from_config(config_filename):
     if not credentials:
         return False
 
-    challonge.set_credentials(credentials["user"], credentials["api_key"])
+    set_credentials(credentials["user"], credentials["api_key"])
     return True
 
 
@@ -104,7 +714,7 @@ def get_tourney_info(name):
     # a 404, it exists.
     tourney_info = None
     try:
-        tourney_info = challonge.tournaments.show(name)
+        tourney_info = get_client().tournaments.show(name)
     except requests.exceptions.HTTPError as err:
         # If we got a 404, we queried fine and no amateur bracket exists,
         # but otherwise we've got an unexpected error, so we escalate it.
@@ -128,3 +738,104 @@ def get_participant_name(participant_info):
     # are some weird invitation-based cases where "name" is invalid),
     # so I made this function to help me remember.
     return participant_info["display_name"]
+
+
+def _get_longest_increasing_subsequence(values):
+    """Gets the indices of a longest strictly increasing subsequence.
+
+    e.g. [2, 0, 1, 4, 3] => [1, 2, 4] (the values 0, 1, 3)
+
+    Args:
+      values: A list of comparable values.
+
+    Returns:
+      A list of indices into values, in increasing order.
+    """
+    # tails[k] is the index of the smallest value that ends an increasing
+    # subsequence of length k + 1, and previous links each index to the one
+    # before it in its subsequence.
+    tails = []
+    tail_values = []
+    previous = [None] * len(values)
+    for i, value in enumerate(values):
+        k = bisect.bisect_left(tail_values, value)
+        if k > 0:
+            previous[i] = tails[k - 1]
+        if k == len(tails):
+            tails.append(i)
+            tail_values.append(value)
+        else:
+            tails[k] = i
+            tail_values[k] = value
+
+    indices = []
+    i = tails[-1] if tails else None
+    while i is not None:
+        indices.append(i)
+        i = previous[i]
+    return indices[::-1]
+
+
+def plan_seed_updates(current_ids, target_ids):
+    """Plans the fewest seed updates that reorder participants on Challonge.
+
+    Setting a participant's seed on Challonge moves them to that seed and
+    shifts everybody in between over by one, so participants who are already
+    in the right order relative to each other never need to be touched. This
+    keeps a longest run of those in place and moves everybody else, in order
+    of their target seed, to just after whoever should be seeded above them.
+
+    e.g. [1, 2, 3, 4], [2, 3, 4, 1] => [(1, 4)]
+
+    Args:
+      current_ids: The participants' IDs, sorted by their current seed.
+      target_ids: The same IDs, sorted by the seeds they should have.
+
+    Raises:
+      ValueError: If the two lists don't have the same IDs.
+
+    Returns:
+      A list of (participant ID, seed) updates to make, in order.
+    """
+    if sorted(current_ids) != sorted(target_ids):
+        raise ValueError("The current and target seeds have different participants.")
+
+    target_seeds = {x: i for i, x in enumerate(target_ids)}
+    kept = {
+        current_ids[i] for i in _get_longest_increasing_subsequence(
+            [target_seeds[x] for x in current_ids])
+    }
+
+    # When it's someone's turn to move, everybody who should be seeded above
+    # them is already in order at the top, apart from the participants who
+    # haven't moved yet. Those are still where they started relative to the
+    # participants who stay put, so we count the ones above the last
+    # participant who stays put with a Fenwick tree over starting seeds.
+    current_seeds = {x: i for i, x in enumerate(current_ids)}
+    num_waiting = [0] * (len(current_ids) + 1)
+
+    def update_waiting(seed, delta):
+        while seed < len(num_waiting):
+            num_waiting[seed] += delta
+            seed += seed & -seed
+
+    def count_waiting(seed):
+        count = 0
+        while seed > 0:
+            count += num_waiting[seed]
+            seed -= seed & -seed
+        return count
+
+    for participant_id in current_ids:
+        if participant_id not in kept:
+            update_waiting(current_seeds[participant_id] + 1, 1)
+
+    updates = []
+    last_kept_seed = 0
+    for i, participant_id in enumerate(target_ids):
+        if participant_id in kept:
+            last_kept_seed = current_seeds[participant_id] + 1
+            continue
+        update_waiting(current_seeds[participant_id] + 1, -1)
+        updates.append((participant_id, i + 1 + count_waiting(last_kept_seed)))
+    return updates
@@ -19,6 +19,9 @@ from create_amateur_bracket import AmateurBracketAlreadyExistsError
 from create_amateur_bracket import AmateurBracketRequiredMatchesIncompleteError
 from create_amateur_bracket import create_amateur_bracket
 import garpr_seeds_challonge
+import rankings_cache
+import seeding_history
+import util_challonge
 
 
 app = Flask(__name__)
@@ -30,6 +33,14 @@ parent_dir = dirname(dirname(abspath(__file__)))
 load_dotenv(os.path.join(parent_dir, '.env'))
 app.secret_key = os.getenv('SECRET_KEY')
 
+# Shared between requests so that organizers seeding several brackets don't
+# each have to wait on gaR PR.
+garpr_rankings_cache = rankings_cache.RankingsCache()
+
+# The last seeding applied to each tournament, so organizers can slot in late
+# registrants without reseeding everybody.
+tourney_seeding_history = seeding_history.SeedingHistory()
+
 
 @app.before_request
 def make_session_persistent():
@@ -103,15 +114,20 @@ def main():
 
         tourney_url = request.args.get('tourney_url', '')
         shuffle = request.args.get('shuffle', 'on')
+        new_participants_only = request.args.get('new_participants_only',
+                                                 'off')
 
         return render_template('index.html',
                                tourney_url=tourney_url,
-                               shuffle=shuffle)
+                               shuffle=shuffle,
+                               new_participants_only=new_participants_only)
 
     elif request.method == 'POST':
         params = {
             'tourney_url': request.form.get('tourney_url'),
             'shuffle': request.form.get('shuffle', 'off'),
+            'new_participants_only': request.form.get('new_participants_only',
+                                                      'off'),
         }
 
         is_valid_name, err = valid_tourney_url(params['tourney_url'])
@@ -120,12 +136,21 @@ def main():
             flash(err, 'danger')
             return redirect(url_for('main', **params))
 
-        challonge.set_credentials(session['username'], session['api_key'])
+        util_challonge.set_credentials(session['username'], session['api_key'])
+        timings = {}
         try:
             sorted_players, unknown_players = garpr_seeds_challonge.\
                 seed_tournament(params['tourney_url'],
                                 region=session['region'],
-                                shuffle=params['shuffle'])
+                                shuffle=params['shuffle'],
+                                cache=garpr_rankings_cache,
+                                history=tourney_seeding_history,
+                                new_participants_only=(
+                                    params['new_participants_only'] == 'on'),
+                                timings=timings)
+            app.logger.info('Seeded %s in %s', params['tourney_url'], ', '.join(
+                '{}: {:.3f}s'.format(stage, timings[stage])
+                for stage in garpr_seeds_challonge.STAGES))
 
         except ValueError as e:
             flash(str(e), 'warning')
@@ -141,7 +166,8 @@ def main():
 
         try:
             garpr_seeds_challonge.update_seeds(params['tourney_url'],
-                                               sorted_players)
+                                               sorted_players,
+                                               tourney_seeding_history)
         except HTTPError as e:
             app.logger.info(e)
             flash("Couldn't access {} with the API, are you sure you have "
@@ -157,7 +183,8 @@ def main():
 
         flash(unknown_html + 'Your tournament has been seeded! Check it out '
               '{} to make adjustments. Feel free to run '
-              'this again if you add more players.'
+              'this again with "Only seed new players" if you add more '
+              'players.'
               .format(link('here', params['tourney_url'] + '/participants')),
                       'success')
         return redirect(url_for('main', **params))
@@ -195,7 +222,7 @@ def amateur():
             flash(err, 'danger')
             return redirect(url_for('amateur', **params))
 
-        challonge.set_credentials(session['username'], session['api_key'])
+        util_challonge.set_credentials(session['username'], session['api_key'])
 
         try:
             amateur_tourney_url = create_amateur_bracket(